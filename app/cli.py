@@ -0,0 +1,129 @@
+"""
+Comandos de mantenimiento.
+
+Uso:
+  python -m app.cli importar papeletas.csv [--lote 2000]
+  python -m app.cli reporte --desde 2024-01 --hasta 2025-12 [--agrupar area] [--csv salida.csv]
+  python -m app.cli auditar-solapes [--csv solapes.csv]
+  python -m app.cli snapshot papeletas.sdpscol
+"""
+
+import argparse
+import csv
+import json
+from app.database import SessionLocal, create_tables
+# Importar los modelos para que create_tables los reconozca
+from app.models import papeleta_model, usuario_model, idempotencia_model, secuencia_model
+
+
+def cmd_importar(args):
+    from app.controllers import importacion_controller
+
+    db = SessionLocal()
+    try:
+        with open(args.archivo, "rb") as archivo:
+            if args.archivo.lower().endswith(".xlsx"):
+                filas = importacion_controller.leer_filas_excel(archivo)
+            else:
+                filas = importacion_controller.leer_filas_csv(archivo)
+            resumen = importacion_controller.importar_papeletas(filas, db, args.lote)
+    finally:
+        db.close()
+    print(json.dumps(resumen, indent=2, ensure_ascii=False, default=str))
+
+
+def cmd_reporte(args):
+    from app.controllers import reporte_controller
+
+    from app.core.procesos import pool_procesos
+
+    try:
+        desde, hasta = reporte_controller.parsear_mes(args.desde), reporte_controller.parsear_mes(args.hasta)
+    except ValueError as e:
+        raise SystemExit(f"error: {e}")
+
+    db = SessionLocal()
+    pool_procesos.iniciar()
+    try:
+        reporte = reporte_controller.reporte_horas_fuera(args.agrupar, desde, hasta, db)
+    finally:
+        pool_procesos.detener()
+        db.close()
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as salida:
+            escritor = csv.DictWriter(salida, fieldnames=["grupo", "anio", "mes", "horas", "papeletas", "sin_retorno"])
+            escritor.writeheader()
+            escritor.writerows(reporte["filas"])
+        print(f"{len(reporte['filas'])} filas escritas en {args.csv} ({reporte['total_horas']} horas)")
+    else:
+        print(json.dumps(reporte, indent=2, ensure_ascii=False))
+
+
+def cmd_auditar_solapes(args):
+    from app.controllers import auditoria_controller
+
+    db = SessionLocal()
+    total = 0
+    salida = open(args.csv, "w", newline="", encoding="utf-8") if args.csv else None
+    try:
+        escritor = None
+        for solape in auditoria_controller.auditar_solapes(db):
+            total += 1
+            if salida is None:
+                print(json.dumps(solape, ensure_ascii=False))
+                continue
+            if escritor is None:
+                escritor = csv.DictWriter(salida, fieldnames=list(solape))
+                escritor.writeheader()
+            escritor.writerow(solape)
+    finally:
+        db.close()
+        if salida is not None:
+            salida.close()
+    print(f"{total} solapes encontrados")
+
+
+def cmd_snapshot(args):
+    from app.controllers import snapshot_controller
+
+    db = SessionLocal()
+    try:
+        resumen = snapshot_controller.exportar_snapshot(args.archivo, db, args.lote)
+    finally:
+        db.close()
+    print(f"{resumen['filas']} papeletas, {resumen['bytes']} bytes en {args.archivo} ({resumen['segundos']} s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+
+    importar = subcomandos.add_parser("importar", help="Importar papeletas desde CSV/XLSX")
+    importar.add_argument("archivo", help="Ruta del archivo .csv o .xlsx")
+    importar.add_argument("--lote", type=int, default=2000, help="Filas por lote")
+    importar.set_defaults(func=cmd_importar)
+
+    reporte = subcomandos.add_parser("reporte", help="Horas fuera de oficina por mes")
+    reporte.add_argument("--desde", required=True, help="Mes inicial AAAA-MM")
+    reporte.add_argument("--hasta", required=True, help="Mes final AAAA-MM")
+    reporte.add_argument("--agrupar", default="area", choices=["dni", "area", "regimen"])
+    reporte.add_argument("--csv", help="Escribir el resultado en un CSV")
+    reporte.set_defaults(func=cmd_reporte)
+
+    auditar = subcomandos.add_parser("auditar-solapes", help="Buscar papeletas con horarios superpuestos")
+    auditar.add_argument("--csv", help="Escribir los solapes en un CSV")
+    auditar.set_defaults(func=cmd_auditar_solapes)
+
+    snapshot = subcomandos.add_parser("snapshot", help="Exportar papeletas a un archivo columnar comprimido")
+    snapshot.add_argument("archivo", help="Ruta del archivo .sdpscol")
+    snapshot.add_argument("--lote", type=int, default=50_000, help="Filas leídas por bloque")
+    snapshot.set_defaults(func=cmd_snapshot)
+
+    args = parser.parse_args()
+    create_tables()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,33 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import update, select, func, or_
+from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
-from app.models.usuario_model import Usuario
+from app.models.usuario_model import Usuario, RolUsuario
 from app.models.papeleta_model import Papeleta
+from app.database import insert_dialecto, violacion_unica
 from app.schemas.usuario_schema import UsuarioCreate, UsuarioResponse, UsuarioUpdate
-from typing import List
+from app.core.concurrencia import etag
+from app.core import eventos
+from app.core.singleflight import SingleFlight
+from app.core.config import COALESCING_CACHE_SECONDS
+from typing import List, Optional
+
+# Tamaño de página del listado de usuarios cuando se indica solo `pagina`
+TAMANO_PAGINA_USUARIOS = 100
+
+coalescer_stats = SingleFlight("stats_dashboard", ttl=COALESCING_CACHE_SECONDS)
 
 def obtener_estadisticas_dashboard(db: Session):
-    """Obtener estadísticas para el dashboard de administrador"""
-    
+    """
+    Obtener estadísticas para el dashboard de administrador.
+    Las solicitudes simultáneas comparten una sola ejecución de los conteos, salvo
+    las de un cliente que acaba de escribir (sesión con info["consistente"])
+    """
+    return coalescer_stats.ejecutar(
+        "stats", lambda: _contar_estadisticas(db), compartir=not db.info.get("consistente")
+    )
+
+def _contar_estadisticas(db: Session):
     # Contar total de usuarios
     total_usuarios = db.query(Usuario).count()
     
@@ -19,58 +39,92 @@ def obtener_estadisticas_dashboard(db: Session):
         "total_papeletas": total_papeletas
     }
 
-def crear_usuario(usuario_data: UsuarioCreate, db: Session):
-    """Crear un nuevo usuario"""
-    
-    # Verificar si ya existe un usuario con el mismo username o DNI
-    existing_user = db.query(Usuario).filter(
-        (Usuario.usuario == usuario_data.usuario) | 
-        (Usuario.dni == usuario_data.dni)
-    ).first()
-    
-    if existing_user:
-        if existing_user.usuario == usuario_data.usuario:
-            raise ValueError("Ya existe un usuario con ese nombre de usuario")
-        else:
-            raise ValueError("Ya existe un usuario con ese DNI")
-    
-    # Crear el nuevo usuario
-    nuevo_usuario = Usuario(
-        nombre_completo=usuario_data.nombre_completo,
-        usuario=usuario_data.usuario,
-        dni=usuario_data.dni,
-        rol=usuario_data.rol
+def crear_usuario(usuario_data: UsuarioCreate, db: Session) -> UsuarioResponse:
+    """
+    Crear un nuevo usuario en una sola sentencia: INSERT ... ON CONFLICT DO NOTHING
+    RETURNING. Si no devuelve fila hubo conflicto de usuario o DNI; solo entonces
+    se consulta cuál de los dos para el mensaje
+    """
+    stmt = (
+        insert_dialecto(db)(Usuario)
+        .values(
+            nombre_completo=usuario_data.nombre_completo,
+            usuario=usuario_data.usuario,
+            dni=usuario_data.dni,
+            rol=usuario_data.rol
+        )
+        .on_conflict_do_nothing()
+        .returning(Usuario)
     )
-    
+
     try:
-        db.add(nuevo_usuario)
+        nuevo_usuario = db.scalars(stmt).one_or_none()
+        if nuevo_usuario is None:
+            db.rollback()
+            if db.query(Usuario.id).filter(Usuario.usuario == usuario_data.usuario).first():
+                raise ValueError("Ya existe un usuario con ese nombre de usuario")
+            raise ValueError("Ya existe un usuario con ese DNI")
+        respuesta = UsuarioResponse.model_validate(nuevo_usuario)
         db.commit()
-        db.refresh(nuevo_usuario)
-        return {"message": "Usuario creado correctamente"}
+    except ValueError:
+        raise
     except Exception as e:
         db.rollback()
         raise ValueError(f"Error al crear usuario: {str(e)}")
 
-def obtener_usuario_por_id_simple(usuario: str, dni: str, db: Session):
-    """Obtener usuario recién creado por usuario y DNI"""
-    user = db.query(Usuario).filter(
-        Usuario.usuario == usuario,
-        Usuario.dni == dni
-    ).first()
-    return user
-
-def obtener_todos_usuarios(db: Session):
-    """Obtener todos los usuarios"""
-    usuarios = db.query(Usuario).all()
-    return [
-        {
-            "id": usuario.id,
-            "nombre_completo": usuario.nombre_completo,
-            "usuario": usuario.usuario,
-            "dni": usuario.dni,
-            "rol": usuario.rol
-        } for usuario in usuarios
+    eventos.publicar("stats", {"total_usuarios": 1})
+    return respuesta
+
+def obtener_todos_usuarios(
+    db: Session,
+    pagina: Optional[int] = None,
+    tamano: Optional[int] = None,
+    rol: Optional[RolUsuario] = None,
+    nombre: Optional[str] = None
+):
+    """
+    Listar usuarios, opcionalmente por rol y por nombre (contiene, sin distinguir
+    mayúsculas). Sin `pagina` ni `tamano` devuelve todos, como antes de paginar;
+    con cualquiera de los dos pagina (por defecto página 1 de TAMANO_PAGINA_USUARIOS).
+    Devuelve (filas, total); el total sale de una ventana count(*) OVER () en la
+    misma consulta
+    """
+    filtros = []
+    if rol is not None:
+        filtros.append(Usuario.rol == rol)
+    if nombre:
+        patron = "%" + nombre.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        filtros.append(or_(
+            Usuario.nombre_completo.ilike(patron, escape="\\"),
+            Usuario.usuario.ilike(patron, escape="\\")
+        ))
+
+    consulta = (
+        select(
+            Usuario.id, Usuario.usuario, Usuario.dni, Usuario.rol,
+            func.count().over().label("total")
+        )
+        .where(*filtros)
+        .order_by(Usuario.id)
+    )
+    if pagina is not None or tamano is not None:
+        pagina, tamano = pagina or 1, tamano or TAMANO_PAGINA_USUARIOS
+        consulta = consulta.offset((pagina - 1) * tamano).limit(tamano)
+    filas = db.execute(consulta).all()
+
+    if filas:
+        total = filas[0].total
+    elif pagina and pagina > 1:
+        # Página fuera de rango: la ventana no trae filas, contar aparte
+        total = db.scalar(select(func.count(Usuario.id)).where(*filtros))
+    else:
+        total = 0
+
+    usuarios = [
+        {"id": f.id, "usuario": f.usuario, "dni": f.dni, "rol": f.rol}
+        for f in filas
     ]
+    return usuarios, total
 
 def obtener_usuario_por_id(usuario_id: int, db: Session):
     """Obtener un usuario específico por ID"""
@@ -87,65 +141,73 @@ def obtener_usuario_por_id(usuario_id: int, db: Session):
         nombre_completo=usuario.nombre_completo,
         usuario=usuario.usuario,
         dni=usuario.dni,
-        rol=usuario.rol
+        rol=usuario.rol,
+        version=usuario.version
     )
 
-def actualizar_usuario(usuario_id: int, usuario_data: UsuarioUpdate, db: Session):
-    """Actualizar un usuario por ID"""
-    # Buscar el usuario a actualizar
-    usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
-    
-    if not usuario:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Usuario no encontrado"
-        )
-    
-    # Verificar si los nuevos datos entran en conflicto con otros usuarios
-    if usuario_data.usuario or usuario_data.dni:
-        # Buscar conflictos excluyendo el usuario actual
-        conflictos = db.query(Usuario).filter(
-            Usuario.id != usuario_id
-        )
-        
-        if usuario_data.usuario:
-            conflictos = conflictos.filter(Usuario.usuario == usuario_data.usuario)
-            if conflictos.first():
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Ya existe otro usuario con ese nombre de usuario"
-                )
-        
-        if usuario_data.dni:
-            conflictos = db.query(Usuario).filter(
-                Usuario.id != usuario_id,
-                Usuario.dni == usuario_data.dni
-            )
-            if conflictos.first():
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Ya existe otro usuario con ese DNI"
-                )
-    
+def actualizar_usuario(usuario_id: int, usuario_data: UsuarioUpdate, db: Session, version_esperada: Optional[int] = None):
+    """
+    Actualizar un usuario por ID con un único UPDATE ... RETURNING.
+    Si se indica `version_esperada` (If-Match) solo se aplica sobre esa versión
+    """
     # Actualizar solo los campos que se proporcionaron
     update_data = usuario_data.model_dump(exclude_unset=True)
-    
-    for field, value in update_data.items():
-        setattr(usuario, field, value)
-    
-    db.commit()
-    db.refresh(usuario)
-    
-    return {
+
+    stmt = update(Usuario).where(Usuario.id == usuario_id)
+    if version_esperada is not None:
+        stmt = stmt.where(Usuario.version == version_esperada)
+    stmt = (
+        stmt.values(**update_data, version=Usuario.version + 1 if update_data else Usuario.version)
+        .returning(Usuario)
+        .execution_options(synchronize_session=False)
+    )
+
+    try:
+        usuario = db.execute(stmt).scalar_one_or_none()
+    except IntegrityError as e:
+        db.rollback()
+        # Los datos nuevos entran en conflicto con otro usuario (restricciones UNIQUE)
+        if violacion_unica(e, Usuario.__tablename__, "usuario"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Ya existe otro usuario con ese nombre de usuario"
+            )
+        if violacion_unica(e, Usuario.__tablename__, "dni"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Ya existe otro usuario con ese DNI"
+            )
+        raise
+
+    if usuario is None:
+        db.rollback()
+        version_actual = db.query(Usuario.version).filter(Usuario.id == usuario_id).scalar()
+        if version_actual is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Usuario no encontrado"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="El usuario fue modificado por otro administrador",
+            headers={"ETag": etag(version_actual)}
+        )
+
+    # Serializar antes del commit para no volver a leer la fila
+    respuesta = {
         "message": "Usuario actualizado correctamente",
         "usuario": {
             "id": usuario.id,
             "nombre_completo": usuario.nombre_completo,
             "usuario": usuario.usuario,
             "dni": usuario.dni,
-            "rol": usuario.rol
+            "rol": usuario.rol,
+            "version": usuario.version
         }
     }
+    db.commit()
+
+    return respuesta
 
 def eliminar_usuario(usuario_id: int, db: Session):
     """Eliminar un usuario por ID"""
@@ -168,5 +230,6 @@ def eliminar_usuario(usuario_id: int, db: Session):
     
     db.delete(usuario)
     db.commit()
+    eventos.publicar("stats", {"total_usuarios": -1})
     
     return {"message": "Usuario eliminado correctamente"}
\ No newline at end of file
@@ -0,0 +1,46 @@
+from typing import Iterator
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models.papeleta_model import Papeleta
+from app.controllers.papeleta_controller import FIN_DEL_DIA
+
+TAMANO_BLOQUE = 10_000
+
+
+def auditar_solapes(db: Session) -> Iterator[dict]:
+    """
+    Encuentra papeletas del mismo DNI y fecha con horarios superpuestos en toda la tabla.
+
+    Ordena por (dni, fecha, hora_salida) y recorre una sola vez (sort-and-sweep,
+    O(n log n)) recordando, por cada día, la papeleta que termina más tarde: si la
+    siguiente sale antes de esa hora, se solapan. Lee la tabla en bloques.
+    """
+    consulta = select(
+        Papeleta.id, Papeleta.codigo, Papeleta.dni, Papeleta.fecha,
+        Papeleta.hora_salida, Papeleta.hora_retorno
+    ).order_by(Papeleta.dni, Papeleta.fecha, Papeleta.hora_salida, Papeleta.id)
+
+    dia_actual = None
+    mas_tardia = None  # (hora de fin, fila) de la papeleta que termina más tarde en el día
+    resultado = db.execute(consulta.execution_options(stream_results=True, yield_per=TAMANO_BLOQUE))
+    for fila in resultado:
+        fin = fila.hora_retorno or FIN_DEL_DIA
+        if (fila.dni, fila.fecha) != dia_actual:
+            dia_actual = (fila.dni, fila.fecha)
+            mas_tardia = (fin, fila)
+            continue
+
+        if fila.hora_salida < mas_tardia[0]:
+            otra = mas_tardia[1]
+            yield {
+                "dni": fila.dni,
+                "fecha": fila.fecha.isoformat(),
+                "papeleta_id": fila.id,
+                "codigo": fila.codigo,
+                "hora_salida": fila.hora_salida.isoformat(),
+                "solapa_con_id": otra.id,
+                "solapa_con_codigo": otra.codigo,
+                "solapa_con_retorno": otra.hora_retorno.isoformat() if otra.hora_retorno else None
+            }
+        if fin > mas_tardia[0]:
+            mas_tardia = (fin, fila)
@@ -0,0 +1,115 @@
+import io
+import re
+import zipfile
+from datetime import date
+from typing import Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models.papeleta_model import Papeleta
+from app.core import documentos
+from app.core.documentos import cache, datos_documento, huella
+from app.core.procesos import pool_procesos
+
+# Por debajo de esto no compensa enviar el trabajo al pool de procesos
+MIN_PARA_PROCESOS = 20
+
+COLUMNAS_DOCUMENTO = [getattr(Papeleta, c) for c in documentos.CAMPOS_DOCUMENTO]
+
+
+def _validar_formato(formato: str):
+    if formato not in documentos.FORMATOS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"formato debe ser uno de: {', '.join(documentos.FORMATOS)}"
+        )
+
+
+def _nombre_seguro(codigo: str) -> str:
+    """El código va en Content-Disposition y en el zip: solo caracteres inocuos"""
+    return re.sub(r"[^\w.-]", "_", codigo)
+
+
+def _leer(ruta):
+    """Contenido de un archivo de la caché, o None si otro worker lo borró"""
+    try:
+        with open(ruta, "rb") as archivo:
+            return archivo.read()
+    except FileNotFoundError:
+        return None
+
+
+def obtener_documento(papeleta_id: int, formato: str, db: Session) -> Tuple[bytes, str, str]:
+    """
+    Documento de una papeleta: se renderiza solo si no está en caché con la
+    huella actual. Devuelve (contenido, media_type, nombre_archivo)
+    """
+    _validar_formato(formato)
+    papeleta = db.execute(
+        select(*COLUMNAS_DOCUMENTO).where(Papeleta.id == papeleta_id)
+    ).first()
+    if papeleta is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Papeleta no encontrada"
+        )
+
+    datos = datos_documento(papeleta)
+    huella_ = huella(datos)
+    ruta = cache.obtener(papeleta_id, huella_, formato)
+    contenido = _leer(ruta) if ruta else None
+    if contenido is None:
+        contenido = documentos.renderizar(formato, datos)
+        cache.guardar(papeleta_id, huella_, formato, contenido)
+    return contenido, documentos.FORMATOS[formato], f"papeleta-{_nombre_seguro(datos['codigo'])}.{formato}"
+
+
+def documentos_del_dia(fecha: date, formato: str, db: Session) -> Tuple[bytes, str, str]:
+    """
+    Todas las papeletas de un día para imprimir: HTML en un solo documento (una
+    papeleta por página) o un .zip con un PDF por papeleta.
+    Las que no están en caché se renderizan en un pool de procesos y se guardan
+    """
+    _validar_formato(formato)
+    filas = db.execute(
+        select(Papeleta.id, *COLUMNAS_DOCUMENTO)
+        .where(Papeleta.fecha == fecha)
+        .order_by(Papeleta.hora_salida, Papeleta.id)
+    ).all()
+
+    entradas = []  # (id, datos, huella, contenido o None)
+    for fila in filas:
+        datos = datos_documento(fila)
+        huella_ = huella(datos)
+        ruta = cache.obtener(fila.id, huella_, formato)
+        entradas.append((fila.id, datos, huella_, _leer(ruta) if ruta else None))
+
+    pendientes = [e for e in entradas if e[3] is None]
+    if len(pendientes) >= MIN_PARA_PROCESOS and pool_procesos.disponible:
+        renderizados = pool_procesos.map(
+            documentos.renderizar,
+            [formato] * len(pendientes),
+            [e[1] for e in pendientes],
+            chunksize=max(1, len(pendientes) // (pool_procesos.procesos * 4))
+        )
+    else:
+        renderizados = [documentos.renderizar(formato, e[1]) for e in pendientes]
+    nuevos = {}
+    for e, contenido in zip(pendientes, renderizados):
+        cache.guardar(e[0], e[2], formato, contenido)
+        nuevos[e[0]] = contenido
+
+    contenidos = [
+        (datos["codigo"], contenido if contenido is not None else nuevos[papeleta_id])
+        for papeleta_id, datos, _, contenido in entradas
+    ]
+
+    if formato == "html":
+        cuerpo = documentos.unir_html(documentos.seccion_de_html(c) for _, c in contenidos)
+        return cuerpo, documentos.FORMATOS["html"], f"papeletas-{fecha.isoformat()}.html"
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archivo_zip:
+        for codigo, contenido in contenidos:
+            archivo_zip.writestr(f"papeleta-{_nombre_seguro(codigo)}.pdf", contenido)
+    return buffer.getvalue(), "application/zip", f"papeletas-{fecha.isoformat()}.zip"
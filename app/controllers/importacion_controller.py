@@ -0,0 +1,245 @@
+import csv
+import io
+from datetime import datetime
+from typing import Iterable, Iterator, List
+from pydantic import ValidationError
+from sqlalchemy import text, bindparam, select, tuple_, DateTime
+from sqlalchemy.orm import Session
+from app.models.papeleta_model import Papeleta, marca_cambio
+from app.schemas.papeleta_schema import PapeletaCreate
+from app.core import eventos
+from app.core.codigos import asignador
+from app.controllers.papeleta_controller import se_solapan, bloquear_horarios
+
+COLUMNAS = [
+    "nombre", "dni", "codigo", "area", "cargo", "motivo", "oficina_entidad",
+    "fundamentacion", "fecha", "hora_salida", "hora_retorno", "regimen"
+]
+TABLA_STAGING = "papeletas_importacion"
+TAMANO_LOTE = 2000
+# Los detalles de errores y conflictos se recortan para que el resumen tenga tamaño acotado
+MAX_DETALLES = 100
+
+
+def leer_filas_csv(archivo) -> Iterator[dict]:
+    """Lee un CSV binario fila a fila (la primera fila son los nombres de columna)"""
+    texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+    try:
+        yield from csv.DictReader(texto)
+    finally:
+        texto.detach()
+
+
+def leer_filas_excel(archivo) -> Iterator[dict]:
+    """
+    Lee la primera hoja de un .xlsx en modo streaming (requiere openpyxl).
+    No es un generador: el ImportError se lanza al llamarla, no al iterar
+    """
+    from openpyxl import load_workbook
+
+    def filas_libro():
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            filas = libro.worksheets[0].iter_rows(values_only=True)
+            encabezados = [str(c).strip() if c is not None else "" for c in next(filas, [])]
+            for fila in filas:
+                yield dict(zip(encabezados, fila))
+        finally:
+            libro.close()
+
+    return filas_libro()
+
+
+def _lotes(filas: Iterable[dict], tamano: int) -> Iterator[List[dict]]:
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _validar(fila: dict):
+    # Celdas vacías equivalen a valores ausentes (hora_retorno es opcional)
+    datos = {k: (v.strip() if isinstance(v, str) else v) for k, v in fila.items() if k in COLUMNAS}
+    datos = {k: v for k, v in datos.items() if v not in ("", None)}
+    return PapeletaCreate(**datos)
+
+
+def _crear_staging(conn):
+    tabla = Papeleta.__table__
+    columnas = ", ".join(
+        f"{nombre} {tabla.c[nombre].type.compile(dialect=conn.dialect)}" for nombre in COLUMNAS
+    )
+    conn.execute(text(f"CREATE TEMPORARY TABLE IF NOT EXISTS {TABLA_STAGING} (fila INTEGER, {columnas})"))
+    conn.execute(text(f"DELETE FROM {TABLA_STAGING}"))
+
+
+def _cargar_staging(conn, registros: List[tuple]):
+    """PostgreSQL: COPY desde un buffer CSV en memoria. Otros motores: executemany"""
+    if conn.dialect.name == "postgresql":
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        for registro in registros:
+            escritor.writerow(["" if v is None else v for v in registro])
+        buffer.seek(0)
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {TABLA_STAGING} (fila, {', '.join(COLUMNAS)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+        finally:
+            cursor.close()
+    else:
+        # Tipar los parámetros para que fechas y horas se guarden igual que vía ORM
+        tabla = Papeleta.__table__
+        marcadores = ", ".join(f":{c}" for c in ["fila"] + COLUMNAS)
+        sentencia = text(
+            f"INSERT INTO {TABLA_STAGING} (fila, {', '.join(COLUMNAS)}) VALUES ({marcadores})"
+        ).bindparams(*[bindparam(c, type_=tabla.c[c].type) for c in COLUMNAS])
+        conn.execute(sentencia, [dict(zip(["fila"] + COLUMNAS, r)) for r in registros])
+
+
+def _horarios_existentes(db: Session, claves: set) -> dict:
+    """(dni, fecha) -> [(salida, retorno)] de las papeletas guardadas de esos empleados y días"""
+    horarios = {}
+    if not claves:
+        return horarios
+    filas = db.execute(
+        select(Papeleta.dni, Papeleta.fecha, Papeleta.hora_salida, Papeleta.hora_retorno)
+        .where(tuple_(Papeleta.dni, Papeleta.fecha).in_(list(claves)))
+    )
+    for dni, fecha, salida, retorno in filas:
+        horarios.setdefault((dni, fecha), []).append((salida, retorno))
+    return horarios
+
+
+def _codigos_existentes(db: Session, codigos: set) -> set:
+    """Los códigos indicados que ya están guardados"""
+    if not codigos:
+        return set()
+    return set(db.scalars(select(Papeleta.codigo).where(Papeleta.codigo.in_(list(codigos)))))
+
+
+def _fusionar_staging(conn) -> set:
+    """Inserta las filas de staging en papeletas; devuelve los códigos insertados"""
+    columnas = ", ".join(COLUMNAS)
+    cambio = marca_cambio().compile(dialect=conn.dialect)
+    # "WHERE true" evita que SQLite interprete ON CONFLICT como parte del SELECT
+    resultado = conn.execute(
+        text(
+            f"INSERT INTO papeletas ({columnas}, fecha_creacion, fecha_actualizacion, version, cambio) "
+            f"SELECT {columnas}, :ahora, :ahora, 1, {cambio} FROM {TABLA_STAGING} WHERE true ORDER BY fila "
+            f"ON CONFLICT (codigo) DO NOTHING RETURNING codigo"
+        ).bindparams(bindparam("ahora", type_=DateTime)),
+        {"ahora": datetime.now()}
+    )
+    return {fila[0] for fila in resultado}
+
+
+def importar_papeletas(filas: Iterable[dict], db: Session, tamano_lote: int = TAMANO_LOTE):
+    """
+    Importa papeletas por lotes: valida con las reglas de PapeletaCreate, carga
+    las válidas en una tabla temporal y las fusiona en `papeletas` con un solo
+    INSERT ... ON CONFLICT por lote. Solo un lote está en memoria a la vez.
+
+    Como en la creación individual, se descarta la fila cuyo horario se cruza
+    con una papeleta ya guardada (incluidas las de lotes anteriores) o con una
+    fila aceptada antes en el mismo lote
+    """
+    resumen = {
+        "total_filas": 0,
+        "insertadas": 0,
+        "invalidas": 0,
+        "conflictos": 0,
+        "lotes": 0,
+        "errores": [],
+        "conflictos_detalle": []
+    }
+
+    numero_fila = 1  # La fila 1 son los encabezados
+    for lote in _lotes(filas, tamano_lote):
+        validas = []
+        for fila in lote:
+            numero_fila += 1
+            resumen["total_filas"] += 1
+            try:
+                validas.append((numero_fila, _validar(fila)))
+            except ValidationError as e:
+                resumen["invalidas"] += 1
+                if len(resumen["errores"]) < MAX_DETALLES:
+                    resumen["errores"].append({
+                        "fila": numero_fila,
+                        "errores": [
+                            {"field": ".".join(str(x) for x in err["loc"]), "message": err["msg"]}
+                            for err in e.errors()
+                        ]
+                    })
+
+        # Una sola consulta por lote para los horarios ya ocupados, con los
+        # (dni, fecha) bloqueados hasta el commit del lote
+        claves = {(p.dni, p.fecha) for _, p in validas}
+        bloquear_horarios(claves, db)
+        horarios = _horarios_existentes(db, claves)
+        # Los códigos ya guardados se descartan antes de ocupar su horario: si no, una
+        # fila que el ON CONFLICT no inserta haría rechazar por solape a las siguientes
+        existentes = _codigos_existentes(db, {p.codigo for _, p in validas if p.codigo is not None})
+        registros = []
+        codigos_lote = {}
+        for fila_num, papeleta in validas:
+            if papeleta.codigo is not None:
+                if papeleta.codigo in existentes:
+                    _registrar_conflicto(resumen, fila_num, papeleta, "codigo_existente")
+                    continue
+                if papeleta.codigo in codigos_lote:
+                    _registrar_conflicto(resumen, fila_num, papeleta, "duplicado_en_archivo")
+                    continue
+            ocupados = horarios.setdefault((papeleta.dni, papeleta.fecha), [])
+            if any(se_solapan(papeleta.hora_salida, papeleta.hora_retorno, salida, retorno)
+                   for salida, retorno in ocupados):
+                _registrar_conflicto(resumen, fila_num, papeleta, "solape")
+                continue
+            if papeleta.codigo is None:
+                papeleta.codigo = asignador.siguiente()
+            ocupados.append((papeleta.hora_salida, papeleta.hora_retorno))
+            codigos_lote[papeleta.codigo] = (fila_num, papeleta)
+            registros.append((fila_num, *(getattr(papeleta, c) for c in COLUMNAS)))
+
+        if registros:
+            # La tabla temporal es por conexión y tras cada commit la sesión puede usar otra
+            conn = db.connection()
+            _crear_staging(conn)
+            _cargar_staging(conn, registros)
+            insertados = _fusionar_staging(conn)
+            conn.execute(text(f"DELETE FROM {TABLA_STAGING}"))
+            db.commit()
+
+            resumen["insertadas"] += len(insertados)
+            # Solo si otra transacción guardó el código después de consultarlo
+            for codigo, (fila, papeleta) in codigos_lote.items():
+                if codigo not in insertados:
+                    _registrar_conflicto(resumen, fila, papeleta, "codigo_existente")
+        else:
+            # Liberar los bloqueos del lote aunque no haya nada que insertar
+            db.rollback()
+        resumen["lotes"] += 1
+
+    if resumen["insertadas"]:
+        # Un solo evento para toda la importación; los clientes recargan el listado
+        eventos.publicar("papeletas.importadas", {"cantidad": resumen["insertadas"]})
+        eventos.publicar("stats", {"total_papeletas": resumen["insertadas"]})
+
+    return resumen
+
+
+def _registrar_conflicto(resumen: dict, fila: int, papeleta, motivo: str):
+    """El detalle identifica la fila por DNI y fecha; el código solo si venía en el archivo"""
+    resumen["conflictos"] += 1
+    if len(resumen["conflictos_detalle"]) < MAX_DETALLES:
+        detalle = {"fila": fila, "dni": papeleta.dni, "fecha": papeleta.fecha.isoformat(), "motivo": motivo}
+        if papeleta.codigo is not None:
+            detalle["codigo"] = papeleta.codigo
+        resumen["conflictos_detalle"].append(detalle)
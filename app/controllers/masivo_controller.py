@@ -0,0 +1,167 @@
+import time
+from datetime import datetime
+from fastapi import HTTPException, status
+from sqlalchemy import select, update, delete, insert, func
+from sqlalchemy.orm import Session
+from app.models.papeleta_model import Papeleta, PapeletaEliminada
+from app.schemas.papeleta_schema import FiltroPapeletas, CambiosMasivos
+from app.core import eventos
+from app.core.documentos import cache as cache_documentos
+from app.core.config import MASIVO_TAMANO_LOTE
+
+CAMPOS_IGUALDAD = ("dni", "area", "cargo", "regimen", "oficina_entidad", "motivo")
+
+
+def _condiciones(filtro: FiltroPapeletas) -> list:
+    """WHERE del filtro. Un filtro vacío alcanzaría a toda la tabla: se rechaza"""
+    condiciones = []
+    if filtro.ids is not None:
+        condiciones.append(Papeleta.id.in_(filtro.ids))
+    for campo in CAMPOS_IGUALDAD:
+        valor = getattr(filtro, campo)
+        if valor is not None:
+            condiciones.append(getattr(Papeleta, campo) == valor)
+    if filtro.fecha_desde is not None:
+        condiciones.append(Papeleta.fecha >= filtro.fecha_desde)
+    if filtro.fecha_hasta is not None:
+        condiciones.append(Papeleta.fecha <= filtro.fecha_hasta)
+
+    if not condiciones:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El filtro debe incluir al menos un criterio"
+        )
+    return condiciones
+
+
+def _contar(condiciones: list, db: Session) -> int:
+    return db.scalar(select(func.count(Papeleta.id)).where(*condiciones))
+
+
+def _lotes(condiciones: list, db: Session, tamano_lote: int, aplicar):
+    """
+    Recorre las coincidencias por rangos de id (keyset) y ejecuta
+    `aplicar(condiciones_del_lote)` una vez por lote, con commit en cada uno para
+    que ninguna transacción retenga bloqueos sobre miles de filas. Genera los ids
+    afectados de cada lote ya confirmado; si un lote falla, los anteriores quedan
+    aplicados
+    """
+    ultimo_id = 0
+    while True:
+        # Límite superior del lote: el id número `tamano_lote` a partir del último
+        tope = db.scalar(
+            select(Papeleta.id)
+            .where(*condiciones, Papeleta.id > ultimo_id)
+            .order_by(Papeleta.id)
+            .offset(tamano_lote - 1)
+            .limit(1)
+        )
+        rango = [Papeleta.id > ultimo_id]
+        if tope is not None:
+            rango.append(Papeleta.id <= tope)
+
+        try:
+            ids = aplicar(condiciones + rango)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        yield ids
+
+        if tope is None:
+            return
+        ultimo_id = tope
+
+
+def actualizar_papeletas_masivo(filtro: FiltroPapeletas, cambios: CambiosMasivos, dry_run: bool, db: Session,
+                                tamano_lote: int = MASIVO_TAMANO_LOTE):
+    """
+    Aplica `cambios` a todas las papeletas del filtro con UPDATE ... RETURNING
+    por lotes. Cada fila incrementa su versión, así que un If-Match posterior
+    con la versión anterior recibe 412
+    """
+    condiciones = _condiciones(filtro)
+    valores = cambios.model_dump(exclude_unset=True)
+    if not valores:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No se indicó ningún campo a modificar"
+        )
+
+    inicio = time.perf_counter()
+    if dry_run:
+        return _resumen("actualizacion", True, inicio, coincidencias=_contar(condiciones, db))
+
+    def aplicar(condiciones_lote):
+        return db.scalars(
+            update(Papeleta)
+            .where(*condiciones_lote)
+            .values(**valores, version=Papeleta.version + 1, fecha_actualizacion=datetime.now())
+            .returning(Papeleta.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+    afectadas = lotes = 0
+    for ids in _lotes(condiciones, db, tamano_lote, aplicar):
+        lotes += 1
+        afectadas += len(ids)
+        if ids:
+            cache_documentos.invalidar_varias(ids)
+            eventos.publicar("papeletas.actualizadas", {**_rango(ids), "cambios": valores})
+    return _resumen("actualizacion", False, inicio, afectadas=afectadas, lotes=lotes)
+
+
+def eliminar_papeletas_masivo(filtro: FiltroPapeletas, dry_run: bool, db: Session,
+                              tamano_lote: int = MASIVO_TAMANO_LOTE):
+    """
+    Elimina todas las papeletas del filtro con DELETE ... RETURNING por lotes,
+    registrando cada id en papeletas_eliminadas para la sincronización incremental
+    """
+    condiciones = _condiciones(filtro)
+    inicio = time.perf_counter()
+    if dry_run:
+        return _resumen("eliminacion", True, inicio, coincidencias=_contar(condiciones, db))
+
+    def aplicar(condiciones_lote):
+        ids = db.scalars(
+            delete(Papeleta)
+            .where(*condiciones_lote)
+            .returning(Papeleta.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if ids:
+            ahora = datetime.now()
+            db.execute(insert(PapeletaEliminada), [
+                {"papeleta_id": papeleta_id, "fecha_eliminacion": ahora} for papeleta_id in ids
+            ])
+        return ids
+
+    afectadas = lotes = 0
+    for ids in _lotes(condiciones, db, tamano_lote, aplicar):
+        lotes += 1
+        afectadas += len(ids)
+        if ids:
+            cache_documentos.invalidar_varias(ids)
+            eventos.publicar("papeletas.eliminadas", _rango(ids))
+            eventos.publicar("stats", {"total_papeletas": -len(ids)})
+    return _resumen("eliminacion", False, inicio, afectadas=afectadas, lotes=lotes)
+
+
+def _rango(ids: list) -> dict:
+    """
+    Un lote puede tener miles de ids: el evento lleva solo el rango que cubre y
+    cuántas filas cambiaron; los clientes recargan ese rango (o usan la
+    sincronización incremental)
+    """
+    return {"desde_id": min(ids), "hasta_id": max(ids), "cantidad": len(ids)}
+
+
+def _resumen(operacion: str, dry_run: bool, inicio: float, coincidencias=None, afectadas=0, lotes=0):
+    return {
+        "operacion": operacion,
+        "dry_run": dry_run,
+        "coincidencias": coincidencias,
+        "afectadas": afectadas,
+        "lotes": lotes,
+        "segundos": round(time.perf_counter() - inicio, 3)
+    }
@@ -1,23 +1,90 @@
 from sqlalchemy.orm import Session
-from datetime import datetime
+from sqlalchemy import update, delete, tuple_, text
+from datetime import datetime, timedelta, time, date
 from fastapi import HTTPException, status
 from fastapi.responses import JSONResponse
 from sqlalchemy.exc import IntegrityError
-from app.models.papeleta_model import Papeleta
-from app.schemas.papeleta_schema import PapeletaCreate, PapeletaResponse, PapeletaUpdate
-from typing import List
+from app.models.papeleta_model import Papeleta, PapeletaEliminada
+from app.database import violacion_unica
+from app.schemas.papeleta_schema import PapeletaCreate, PapeletaResponse, PapeletaUpdate, CambiosPapeletasResponse, PATRON_CODIGO_SERVIDOR
+from app.core.config import SYNC_RETENCION_DIAS, SYNC_LIMPIEZA_SECONDS
+from app.core.concurrencia import etag
+from app.core import eventos
+from app.core.codigos import asignador
+from app.core.documentos import cache as cache_documentos
+from app.core.singleflight import SingleFlight
+from app.core.config import COALESCING_CACHE_SECONDS
+from typing import List, Optional
+import base64
+import json
+
+coalescer_empleado = SingleFlight("empleado_por_dni", ttl=COALESCING_CACHE_SECONDS)
+
+# Una papeleta sin hora de retorno ocupa el resto del día
+FIN_DEL_DIA = time(23, 59, 59, 999999)
+CAMPOS_HORARIO = {"dni", "fecha", "hora_salida", "hora_retorno"}
+
+def se_solapan(salida_a: time, retorno_a: Optional[time], salida_b: time, retorno_b: Optional[time]) -> bool:
+    """Intervalos semiabiertos [salida, retorno): tocarse en un extremo no es solape"""
+    return salida_a < (retorno_b or FIN_DEL_DIA) and salida_b < (retorno_a or FIN_DEL_DIA)
+
+def buscar_solape(dni: str, fecha: date, hora_salida: time, hora_retorno: Optional[time], db: Session, excluir_id: Optional[int] = None):
+    """
+    Papeleta del mismo DNI y fecha cuyo horario se cruza con el indicado.
+    Usa el índice (dni, fecha), así que solo lee las papeletas de ese día
+    """
+    consulta = db.query(Papeleta.id, Papeleta.codigo, Papeleta.hora_salida, Papeleta.hora_retorno).filter(
+        Papeleta.dni == dni,
+        Papeleta.fecha == fecha
+    )
+    if excluir_id is not None:
+        consulta = consulta.filter(Papeleta.id != excluir_id)
+
+    for otra in consulta:
+        if se_solapan(hora_salida, hora_retorno, otra.hora_salida, otra.hora_retorno):
+            return otra
+    return None
+
+def bloquear_horarios(claves, db: Session):
+    """
+    Serializa, hasta el fin de la transacción, las escrituras de cada (dni, fecha)
+    de `claves`: sin esto dos solicitudes simultáneas pasan ambas `buscar_solape`
+    e insertan horarios cruzados. En PostgreSQL son advisory locks de transacción,
+    tomados en orden para que dos lotes no se bloqueen mutuamente; SQLite ya
+    serializa a los escritores y no los necesita
+    """
+    if not claves or db.get_bind().dialect.name != "postgresql":
+        return
+    db.execute(
+        text(
+            "SELECT pg_advisory_xact_lock(h) FROM ("
+            "SELECT DISTINCT hashtextextended(c, 0) AS h FROM unnest(CAST(:claves AS text[])) AS c ORDER BY h"
+            ") AS bloqueos"
+        ),
+        {"claves": [f"papeleta-horario:{dni}:{fecha.isoformat()}" for dni, fecha in claves]}
+    )
+
+def _respuesta_solape(otra) -> JSONResponse:
+    return JSONResponse(status_code=409, content={"error": {"field": "hora_salida", "code": "overlap", "message": f"El empleado ya tiene una papeleta en ese horario ({otra.codigo})"}}, media_type="application/json")
 
 def crear_papeleta(data: PapeletaCreate, db: Session):
-    """Crear una nueva papeleta"""
-    # Verificar que no exista ya una papeleta con el mismo código
-    existing = db.query(Papeleta).filter(Papeleta.codigo == data.codigo).first()
-    if existing:
-        return JSONResponse(status_code=409, content={"error": {"field": "codigo", "code": "conflict", "message": "Código de papeleta ya existe"}}, media_type="application/json")
+    """
+    Crear una nueva papeleta. Si no se envía código lo asigna el servidor.
+    La unicidad del código la garantiza la restricción UNIQUE (IntegrityError -> 409)
+    """
+    # El mismo empleado no puede tener dos salidas superpuestas el mismo día
+    bloquear_horarios([(data.dni, data.fecha)], db)
+    otra = buscar_solape(data.dni, data.fecha, data.hora_salida, data.hora_retorno, db)
+    if otra:
+        db.rollback()
+        return _respuesta_solape(otra)
+
+    codigo = data.codigo or asignador.siguiente()
 
     nueva_papeleta = Papeleta(
         nombre=data.nombre,
         dni=data.dni,
-        codigo=data.codigo,
+        codigo=codigo,
         area=data.area,
         cargo=data.cargo,
         motivo=data.motivo,
@@ -31,10 +98,17 @@ def crear_papeleta(data: PapeletaCreate, db: Session):
     
     try:
         db.add(nueva_papeleta)
+        db.flush()
+        # Serializar antes del commit para no volver a leer la fila
+        evento = PapeletaResponse.from_orm(nueva_papeleta).model_dump(mode="json")
         db.commit()
-        return {"message": "Papeleta registrada correctamente"}
+        eventos.publicar("papeleta.creada", evento)
+        eventos.publicar("stats", {"total_papeletas": 1})
+        return {"message": "Papeleta registrada correctamente", "id": evento["id"], "codigo": codigo}
     except IntegrityError as ie:
         db.rollback()
+        if not violacion_unica(ie, Papeleta.__tablename__, "codigo"):
+            return JSONResponse(status_code=500, content={"error": {"field": None, "code": "internal_error", "message": "Error creando papeleta"}}, media_type="application/json")
         return JSONResponse(status_code=409, content={"error": {"field": "codigo", "code": "conflict", "message": "Código de papeleta ya existe"}}, media_type="application/json")
     except Exception as e:
         db.rollback()
@@ -58,7 +132,16 @@ def obtener_papeleta_por_id(papeleta_id: int, db: Session) -> PapeletaResponse:
     return PapeletaResponse.from_orm(papeleta)
 
 def obtener_datos_empleado_por_dni(dni: str, db: Session):
-    """Obtener los datos más recientes de un empleado por DNI"""
+    """
+    Obtener los datos más recientes de un empleado por DNI.
+    Las consultas simultáneas del mismo DNI comparten una sola ejecución, salvo
+    las de un cliente que acaba de escribir (sesión con info["consistente"])
+    """
+    return coalescer_empleado.ejecutar(
+        dni, lambda: _datos_empleado_por_dni(dni, db), compartir=not db.info.get("consistente")
+    )
+
+def _datos_empleado_por_dni(dni: str, db: Session):
     # Buscar la papeleta más reciente de este DNI
     papeleta_reciente = db.query(Papeleta).filter(
         Papeleta.dni == dni
@@ -81,38 +164,80 @@ def obtener_datos_empleado_por_dni(dni: str, db: Session):
         }
     }
 
-def actualizar_papeleta(papeleta_id: int, data: PapeletaUpdate, db: Session):
-    """Actualizar una papeleta existente"""
-    papeleta = db.query(Papeleta).filter(Papeleta.id == papeleta_id).first()
-    
-    if not papeleta:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Papeleta no encontrada"
+def actualizar_papeleta(papeleta_id: int, data: PapeletaUpdate, db: Session, version_esperada: Optional[int] = None):
+    """
+    Actualizar una papeleta existente con un único UPDATE ... RETURNING.
+    Si se indica `version_esperada` (If-Match) solo se aplica sobre esa versión
+    """
+    # Actualizar solo los campos proporcionados
+    update_data = data.dict(exclude_unset=True)
+
+    # Un código con el formato del servidor solo puede ser el que la papeleta ya tiene
+    if update_data.get("codigo") and PATRON_CODIGO_SERVIDOR.match(update_data["codigo"]):
+        codigo_actual = db.query(Papeleta.codigo).filter(Papeleta.id == papeleta_id).scalar()
+        if codigo_actual is not None and codigo_actual != update_data["codigo"]:
+            return JSONResponse(status_code=422, content={"error": {"field": "codigo", "code": "reserved", "message": "Ese formato de código lo asigna el servidor"}}, media_type="application/json")
+        del update_data["codigo"]
+
+    # Validar solapes solo si cambia el horario (requiere leer el horario actual)
+    if CAMPOS_HORARIO & update_data.keys():
+        actual = db.query(
+            Papeleta.dni, Papeleta.fecha, Papeleta.hora_salida, Papeleta.hora_retorno
+        ).filter(Papeleta.id == papeleta_id).first()
+        if actual is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Papeleta no encontrada"
+            )
+        horario = {**actual._asdict(), **{k: v for k, v in update_data.items() if k in CAMPOS_HORARIO}}
+        bloquear_horarios([(horario["dni"], horario["fecha"])], db)
+        otra = buscar_solape(
+            horario["dni"], horario["fecha"], horario["hora_salida"], horario["hora_retorno"],
+            db, excluir_id=papeleta_id
         )
-    
-    try:
-        # Actualizar solo los campos proporcionados
-        update_data = data.dict(exclude_unset=True)
+        if otra:
+            db.rollback()
+            return _respuesta_solape(otra)
+
+    stmt = update(Papeleta).where(Papeleta.id == papeleta_id)
+    if version_esperada is not None:
+        stmt = stmt.where(Papeleta.version == version_esperada)
+    if update_data:
+        stmt = stmt.values(**update_data, version=Papeleta.version + 1)
+    else:
+        # Sin cambios: no alterar versión ni fecha de actualización
+        stmt = stmt.values(version=Papeleta.version, fecha_actualizacion=Papeleta.fecha_actualizacion, cambio=Papeleta.cambio)
+    stmt = stmt.returning(Papeleta).execution_options(synchronize_session=False)
 
-        # Si intentan cambiar el código, validar unicidad antes del commit
-        if 'codigo' in update_data:
-            nuevo_codigo = update_data['codigo']
-            conflict = db.query(Papeleta).filter(Papeleta.codigo == nuevo_codigo, Papeleta.id != papeleta_id).first()
-            if conflict:
-                return JSONResponse(status_code=409, content={"error": {"field": "codigo", "code": "conflict", "message": "Código de papeleta ya existe"}}, media_type="application/json")
+    try:
+        papeleta = db.execute(stmt).scalar_one_or_none()
 
-        for field, value in update_data.items():
-            setattr(papeleta, field, value)
+        if papeleta is None:
+            db.rollback()
+            version_actual = db.query(Papeleta.version).filter(Papeleta.id == papeleta_id).scalar()
+            if version_actual is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Papeleta no encontrada"
+                )
+            return JSONResponse(status_code=412, content={"error": {"field": "version", "code": "precondition_failed", "message": "La papeleta fue modificada por otro usuario"}}, headers={"ETag": etag(version_actual)}, media_type="application/json")
 
+        # Serializar antes del commit para no volver a leer la fila
+        respuesta = PapeletaResponse.from_orm(papeleta)
         db.commit()
-        db.refresh(papeleta)
+        # La huella nueva ya no coincide con los documentos previos: liberar el disco
+        cache_documentos.invalidar(papeleta_id)
+        eventos.publicar("papeleta.actualizada", respuesta.model_dump(mode="json"))
 
-        return {"message": "Papeleta actualizada correctamente", "papeleta": PapeletaResponse.from_orm(papeleta)}
+        return {"message": "Papeleta actualizada correctamente", "papeleta": respuesta}
 
-    except IntegrityError:
+    except HTTPException:
+        raise
+    except IntegrityError as ie:
         db.rollback()
-        # Race condition: another request pudo haber creado el mismo código
+        if not violacion_unica(ie, Papeleta.__tablename__, "codigo"):
+            return JSONResponse(status_code=500, content={"error": {"field": None, "code": "internal_error", "message": "Error al actualizar papeleta"}}, media_type="application/json")
+        # Código duplicado (restricción UNIQUE), incluida la carrera entre dos solicitudes
         return JSONResponse(status_code=409, content={"error": {"field": "codigo", "code": "conflict", "message": "Código de papeleta ya existe"}}, media_type="application/json")
     except Exception:
         db.rollback()
@@ -129,6 +254,114 @@ def eliminar_papeleta(papeleta_id: int, db: Session):
         )
     
     db.delete(papeleta)
+    db.add(PapeletaEliminada(papeleta_id=papeleta_id))
     db.commit()
+    cache_documentos.invalidar(papeleta_id)
+    eventos.publicar("papeleta.eliminada", {"id": papeleta_id})
+    eventos.publicar("stats", {"total_papeletas": -1})
     
     return {"message": "Papeleta eliminada correctamente"}
+
+INICIO_SYNC = (0, 0)
+
+# Próxima purga de registros de eliminación vencidos en este worker
+_proxima_limpieza_sync = datetime.min
+
+def _codificar_token(emitido: float, cursor_cambios, cursor_eliminadas) -> str:
+    datos = {"t": int(emitido), "c": list(cursor_cambios), "e": list(cursor_eliminadas)}
+    return base64.urlsafe_b64encode(json.dumps(datos, separators=(",", ":")).encode()).decode()
+
+def _decodificar_token(token: Optional[str]):
+    """(emitido, cursor_cambios, cursor_eliminadas); emitido es None sin token"""
+    if not token:
+        return None, INICIO_SYNC, INICIO_SYNC
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(token.encode()))
+        if "t" not in datos:
+            # Token de un formato anterior: su cursor ya no es comparable
+            raise _token_vencido()
+        return (
+            float(datos["t"]),
+            (int(datos["c"][0]), int(datos["c"][1])),
+            (int(datos["e"][0]), int(datos["e"][1]))
+        )
+    except (ValueError, KeyError, TypeError, IndexError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Token de sincronización inválido"
+        )
+
+def _token_vencido() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_410_GONE,
+        detail="Token de sincronización vencido: sincronice desde cero (sin since)"
+    )
+
+def _horizonte_cambios(db: Session) -> Optional[int]:
+    """
+    En PostgreSQL, el id de la transacción abierta más antigua: todo cambio con
+    un número menor ya terminó. En otros motores no hace falta (None)
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    return db.scalar(text("SELECT txid_snapshot_xmin(txid_current_snapshot())"))
+
+def _purgar_eliminadas(db: Session):
+    """Borra registros de eliminación más antiguos que la retención, como máximo una vez cada SYNC_LIMPIEZA_SECONDS"""
+    global _proxima_limpieza_sync
+    ahora = datetime.now()
+    if ahora < _proxima_limpieza_sync:
+        return
+    _proxima_limpieza_sync = ahora + timedelta(seconds=SYNC_LIMPIEZA_SECONDS)
+    db.execute(delete(PapeletaEliminada).where(
+        PapeletaEliminada.fecha_eliminacion < ahora - timedelta(days=SYNC_RETENCION_DIAS)
+    ))
+    db.commit()
+
+def obtener_cambios_papeletas(since: Optional[str], limite: int, db: Session) -> CambiosPapeletasResponse:
+    """
+    Papeletas creadas/modificadas y eliminadas después del token `since`.
+
+    El token lleva un cursor (cambio, id) por cada lista (ver marca_cambio) y el
+    instante hasta el que el cliente está al día; sin token se devuelve todo
+    desde el inicio, paginado de a `limite`. Si ese instante es anterior a la
+    retención de eliminaciones (SYNC_RETENCION_DIAS) responde 410
+    """
+    emitido, cursor_cambios, cursor_eliminadas = _decodificar_token(since)
+    ahora = datetime.now().timestamp()
+    if emitido is not None and ahora - emitido > SYNC_RETENCION_DIAS * 86400:
+        raise _token_vencido()
+    _purgar_eliminadas(db)
+
+    horizonte = _horizonte_cambios(db)
+
+    consulta = db.query(Papeleta).filter(tuple_(Papeleta.cambio, Papeleta.id) > tuple_(*cursor_cambios))
+    if horizonte is not None:
+        consulta = consulta.filter(Papeleta.cambio < horizonte)
+    papeletas = consulta.order_by(Papeleta.cambio, Papeleta.id).limit(limite + 1).all()
+
+    consulta = db.query(PapeletaEliminada.id, PapeletaEliminada.papeleta_id, PapeletaEliminada.cambio).filter(
+        tuple_(PapeletaEliminada.cambio, PapeletaEliminada.id) > tuple_(*cursor_eliminadas)
+    )
+    if horizonte is not None:
+        consulta = consulta.filter(PapeletaEliminada.cambio < horizonte)
+    eliminadas = consulta.order_by(PapeletaEliminada.cambio, PapeletaEliminada.id).limit(limite + 1).all()
+
+    hay_mas = len(papeletas) > limite or len(eliminadas) > limite
+    papeletas, eliminadas = papeletas[:limite], eliminadas[:limite]
+
+    if papeletas:
+        cursor_cambios = (papeletas[-1].cambio, papeletas[-1].id)
+    if eliminadas:
+        cursor_eliminadas = (eliminadas[-1].cambio, eliminadas[-1].id)
+
+    # Mientras queden páginas el cliente sigue al día solo hasta el token anterior
+    if not hay_mas or emitido is None:
+        emitido = ahora
+
+    return CambiosPapeletasResponse(
+        cambios=[PapeletaResponse.from_orm(p) for p in papeletas],
+        eliminadas=[e.papeleta_id for e in eliminadas],
+        token=_codificar_token(emitido, cursor_cambios, cursor_eliminadas),
+        hay_mas=hay_mas
+    )
@@ -0,0 +1,230 @@
+import threading
+from datetime import date, datetime
+from functools import partial
+from typing import Dict, List, Tuple
+import numpy as np
+from fastapi import HTTPException, status
+from sqlalchemy import create_engine, select, func, cast, extract, Integer
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+from app.models.papeleta_model import Papeleta
+from app.core.procesos import pool_procesos
+
+AGRUPACIONES = {
+    "dni": Papeleta.dni,
+    "area": Papeleta.area,
+    "regimen": Papeleta.regimen
+}
+TAMANO_BLOQUE = 50_000
+
+# (agrupacion, anio_mes) -> (huella, filas). Solo meses cerrados
+_cache_meses: Dict[Tuple[str, int], Tuple[tuple, List[dict]]] = {}
+_cache_lock = threading.Lock()
+
+# Engines de los procesos del pool, por réplica sí/no (ver _engine_de_proceso)
+_engines_proceso = {}
+
+
+def _segundos_del_dia(columna):
+    return (
+        cast(extract("hour", columna), Integer) * 3600
+        + cast(extract("minute", columna), Integer) * 60
+        + cast(extract("second", columna), Integer)
+    )
+
+
+def _anio_mes(columna):
+    return cast(extract("year", columna), Integer) * 100 + cast(extract("month", columna), Integer)
+
+
+def parsear_mes(valor: str) -> int:
+    """'2025-03' -> 202503. ValueError si no tiene ese formato"""
+    try:
+        anio, mes = (int(x) for x in valor.split("-"))
+        if not 1 <= mes <= 12:
+            raise ValueError
+    except ValueError:
+        raise ValueError(f"Mes inválido '{valor}', use el formato AAAA-MM")
+    return anio * 100 + mes
+
+
+def _rango_fechas(desde: int, hasta: int) -> Tuple[date, date]:
+    fin_anio, fin_mes = divmod(hasta, 100)
+    siguiente = date(fin_anio + fin_mes // 12, fin_mes % 12 + 1, 1)
+    return date(desde // 100, desde % 100, 1), siguiente
+
+
+def _meses(desde: int, hasta: int) -> List[int]:
+    meses = []
+    actual = desde
+    while actual <= hasta:
+        meses.append(actual)
+        anio, mes = divmod(actual, 100)
+        actual = (anio + 1) * 100 + 1 if mes == 12 else actual + 1
+    return meses
+
+
+def _agregar_bloque(grupos, meses, salida, retorno, acumulado):
+    """Suma duraciones por (grupo, mes) con operaciones vectorizadas"""
+    tiene_retorno = retorno >= 0
+    duracion = np.where(tiene_retorno, retorno - salida, 0)
+    # Un retorno anterior a la salida es un dato inconsistente: no suma horas
+    duracion = np.clip(duracion, 0, None)
+
+    codigos_grupo, inverso_grupo = np.unique(grupos, return_inverse=True)
+    clave = inverso_grupo.astype(np.int64) * 1_000_000 + meses
+    claves, inverso = np.unique(clave, return_inverse=True)
+
+    segundos = np.bincount(inverso, weights=duracion)
+    cantidad = np.bincount(inverso)
+    sin_retorno = np.bincount(inverso, weights=~tiene_retorno)
+
+    for i, k in enumerate(claves):
+        llave = (codigos_grupo[k // 1_000_000], int(k % 1_000_000))
+        previo = acumulado.get(llave, (0.0, 0, 0))
+        acumulado[llave] = (
+            previo[0] + segundos[i],
+            previo[1] + int(cantidad[i]),
+            previo[2] + int(sin_retorno[i])
+        )
+
+
+def _engine_de_proceso(replica: bool):
+    """
+    Engine de un proceso del pool: sin pool de conexiones (una a la vez, que se
+    cierra al terminar el tramo), contra la réplica si la request leía de ella.
+    No usa el engine de app.database, cuyo QueuePool no está contado en el
+    presupuesto de conexiones de gunicorn.conf.py
+    """
+    engine = _engines_proceso.get(replica)
+    if engine is None:
+        from app.database import DATABASE_URL, DATABASE_REPLICA_URL
+        url = DATABASE_REPLICA_URL if replica and DATABASE_REPLICA_URL else DATABASE_URL
+        engine = _engines_proceso[replica] = create_engine(url, poolclass=NullPool)
+    return engine
+
+
+def calcular_rango(agrupacion: str, desde: int, hasta: int, db: Session = None, replica: bool = False) -> Dict[int, List[dict]]:
+    """
+    Lee solo las columnas necesarias en bloques (stream) y agrega por grupo y mes.
+    Devuelve {anio_mes: [filas]}. Sin `db` abre su propia sesión (procesos del
+    pool), en la réplica si `replica`
+    """
+    propia = db is None
+    if propia:
+        db = Session(bind=_engine_de_proceso(replica))
+
+    inicio, fin = _rango_fechas(desde, hasta)
+    consulta = select(
+        AGRUPACIONES[agrupacion],
+        _anio_mes(Papeleta.fecha),
+        _segundos_del_dia(Papeleta.hora_salida),
+        func.coalesce(_segundos_del_dia(Papeleta.hora_retorno), -1)
+    ).where(Papeleta.fecha >= inicio, Papeleta.fecha < fin)
+
+    acumulado = {}
+    try:
+        resultado = db.execute(consulta.execution_options(stream_results=True, yield_per=TAMANO_BLOQUE))
+        for filas in resultado.partitions(TAMANO_BLOQUE):
+            columnas = list(zip(*filas))
+            _agregar_bloque(
+                np.array(columnas[0], dtype=object),
+                np.array(columnas[1], dtype=np.int64),
+                np.array(columnas[2], dtype=np.int64),
+                np.array(columnas[3], dtype=np.int64),
+                acumulado
+            )
+    finally:
+        if propia:
+            db.close()
+
+    por_mes = {mes: [] for mes in _meses(desde, hasta)}
+    for (grupo, mes), (segundos, cantidad, sin_retorno) in sorted(acumulado.items()):
+        por_mes[mes].append({
+            "grupo": grupo,
+            "anio": mes // 100,
+            "mes": mes % 100,
+            "horas": round(segundos / 3600, 2),
+            "papeletas": cantidad,
+            "sin_retorno": sin_retorno
+        })
+    return por_mes
+
+
+def _huellas(desde: int, hasta: int, db: Session) -> Dict[int, tuple]:
+    """(cantidad, última actualización) por mes: si cambia, el mes cacheado ya no vale"""
+    inicio, fin = _rango_fechas(desde, hasta)
+    mes = _anio_mes(Papeleta.fecha)
+    filas = db.execute(
+        select(mes, func.count(), func.max(Papeleta.fecha_actualizacion))
+        .where(Papeleta.fecha >= inicio, Papeleta.fecha < fin)
+        .group_by(mes)
+    ).all()
+    return {m: (c, u) for m, c, u in filas}
+
+
+def _tramos_por_anio(meses: List[int]) -> List[Tuple[int, int]]:
+    """Un tramo (desde, hasta) por año con meses pendientes"""
+    anios = {}
+    for mes in meses:
+        anios.setdefault(mes // 100, []).append(mes)
+    return [(min(m), max(m)) for _, m in sorted(anios.items())]
+
+
+def reporte_horas_fuera(agrupacion: str, desde: int, hasta: int, db: Session):
+    """
+    Horas fuera de oficina (hora_retorno - hora_salida) por grupo y mes.
+
+    Los meses cerrados se guardan en caché y se reutilizan mientras su huella
+    (cantidad y última actualización) no cambie. Los meses a calcular que abarcan
+    varios años se reparten en un pool de procesos, un año por proceso.
+    """
+    if agrupacion not in AGRUPACIONES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"agrupar debe ser uno de: {', '.join(AGRUPACIONES)}"
+        )
+    if desde > hasta:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'desde' no puede ser posterior a 'hasta'"
+        )
+
+    ahora = datetime.now()
+    mes_actual = ahora.year * 100 + ahora.month
+    huellas = _huellas(desde, hasta, db)
+
+    resultado = {}
+    pendientes = []
+    with _cache_lock:
+        for mes in _meses(desde, hasta):
+            cacheado = _cache_meses.get((agrupacion, mes))
+            if cacheado is not None and cacheado[0] == huellas.get(mes):
+                resultado[mes] = cacheado[1]
+            else:
+                pendientes.append(mes)
+
+    tramos = _tramos_por_anio(pendientes)
+    if len(tramos) > 1 and pool_procesos.disponible:
+        tarea = partial(calcular_rango, replica=bool(db.info.get("replica")))
+        parciales = pool_procesos.map(tarea, [agrupacion] * len(tramos), *zip(*tramos))
+        calculado = {k: v for parcial in parciales for k, v in parcial.items()}
+    else:
+        calculado = {}
+        for inicio, fin in tramos:
+            calculado.update(calcular_rango(agrupacion, inicio, fin, db))
+
+    with _cache_lock:
+        for mes in pendientes:
+            resultado[mes] = calculado.get(mes, [])
+            if mes < mes_actual:
+                _cache_meses[(agrupacion, mes)] = (huellas.get(mes), resultado[mes])
+
+    filas = [fila for mes in sorted(resultado) for fila in resultado[mes]]
+    return {
+        "agrupacion": agrupacion,
+        "desde": f"{desde // 100}-{desde % 100:02d}",
+        "hasta": f"{hasta // 100}-{hasta % 100:02d}",
+        "total_horas": round(sum(f["horas"] for f in filas), 2),
+        "filas": filas
+    }
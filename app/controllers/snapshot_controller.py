@@ -0,0 +1,62 @@
+import time
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models.papeleta_model import Papeleta
+from app.core.snapshot import EscritorSnapshot, dias, segundos, microsegundos
+
+TAMANO_BLOQUE = 50_000
+
+# columna -> (tipo, dtype) en el snapshot
+ESQUEMA = {
+    "id": ("numerica", "<i8"),
+    "codigo": ("texto", None),
+    "nombre": ("texto", None),
+    "dni": ("fija", "S8"),
+    "area": ("diccionario", None),
+    "cargo": ("diccionario", None),
+    "regimen": ("diccionario", None),
+    "oficina_entidad": ("diccionario", None),
+    "motivo": ("texto", None),
+    "fundamentacion": ("texto", None),
+    "fecha": ("numerica", "<i4"),
+    "hora_salida": ("numerica", "<i4"),
+    "hora_retorno": ("numerica", "<i4"),
+    "fecha_creacion": ("numerica", "<i8"),
+    "fecha_actualizacion": ("numerica", "<i8"),
+    "version": ("numerica", "<i4"),
+}
+
+CONVERSIONES = {
+    "fecha": dias,
+    "hora_salida": segundos,
+    "hora_retorno": segundos,
+    "fecha_creacion": microsegundos,
+    "fecha_actualizacion": microsegundos,
+}
+
+
+def exportar_snapshot(ruta: str, db: Session, tamano_bloque: int = TAMANO_BLOQUE) -> dict:
+    """
+    Escribe todas las papeletas en un snapshot columnar (app.core.snapshot).
+    Lee tuplas en bloques (stream) por la conexión, sin pasar por el ORM, y
+    convierte cada columna de una vez
+    """
+    inicio = time.perf_counter()
+    escritor = EscritorSnapshot(ruta, ESQUEMA)
+    consulta = select(*[getattr(Papeleta, c) for c in ESQUEMA]).order_by(Papeleta.id)
+
+    resultado = db.connection().execute(consulta.execution_options(stream_results=True, yield_per=tamano_bloque))
+    for filas in resultado.partitions(tamano_bloque):
+        bloque = {}
+        for nombre, valores in zip(ESQUEMA, zip(*filas)):
+            conversion = CONVERSIONES.get(nombre)
+            bloque[nombre] = conversion(valores) if conversion else valores
+        escritor.agregar(bloque)
+
+    resumen = escritor.cerrar({
+        "tabla": Papeleta.__tablename__,
+        "generado": datetime.now().isoformat(timespec="seconds")
+    })
+    resumen["segundos"] = round(time.perf_counter() - inicio, 2)
+    return resumen
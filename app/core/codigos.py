@@ -0,0 +1,69 @@
+import threading
+from datetime import datetime
+from sqlalchemy import update, insert
+from sqlalchemy.exc import IntegrityError
+from app.database import engine
+from app.models.secuencia_model import SecuenciaCodigo
+from app.models.papeleta_model import Papeleta
+from app.core.config import CODIGO_PREFIJO, CODIGO_TAMANO_BLOQUE
+
+
+class AsignadorCodigos:
+    """
+    Genera códigos de papeleta únicos sin consultar la base de datos en cada alta.
+
+    Cada worker reserva bloques de `tamano_bloque` números con un solo
+    UPDATE ... RETURNING (hi-lo) y los entrega desde memoria. Los números de un
+    bloque que no se usan antes de reiniciar el worker quedan como huecos.
+    """
+
+    DIGITOS = 6
+
+    def __init__(self, prefijo: str = CODIGO_PREFIJO, tamano_bloque: int = CODIGO_TAMANO_BLOQUE):
+        # Falla al arrancar y no en la primera alta: "{prefijo}-AAAA-NNNNNN" debe caber en la columna
+        maximo = Papeleta.codigo.type.length
+        largo = len(f"{prefijo}-0000-") + self.DIGITOS
+        if largo > maximo:
+            raise ValueError(
+                f"CODIGO_PREFIJO '{prefijo}' es demasiado largo: los códigos tendrían {largo} "
+                f"caracteres y el máximo es {maximo}"
+            )
+        self.prefijo = prefijo
+        self.tamano_bloque = tamano_bloque
+        self._bloques = {}  # prefijo completo -> [siguiente, último del bloque]
+        self._lock = threading.Lock()
+
+    def siguiente(self) -> str:
+        prefijo = f"{self.prefijo}-{datetime.now().year}-"
+        with self._lock:
+            bloque = self._bloques.get(prefijo)
+            if bloque is None or bloque[0] > bloque[1]:
+                bloque = self._reservar(prefijo)
+                self._bloques = {prefijo: bloque}  # Los bloques de años anteriores ya no se usan
+            numero = bloque[0]
+            bloque[0] += 1
+        return f"{prefijo}{numero:0{self.DIGITOS}d}"
+
+    def _reservar(self, prefijo: str) -> list:
+        # Conexión propia: la reserva se confirma aunque la transacción del request falle
+        with engine.begin() as conn:
+            ultimo = conn.execute(
+                update(SecuenciaCodigo)
+                .where(SecuenciaCodigo.prefijo == prefijo)
+                .values(ultimo_reservado=SecuenciaCodigo.ultimo_reservado + self.tamano_bloque)
+                .returning(SecuenciaCodigo.ultimo_reservado)
+            ).scalar()
+
+        if ultimo is None:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(SecuenciaCodigo).values(prefijo=prefijo, ultimo_reservado=self.tamano_bloque))
+                ultimo = self.tamano_bloque
+            except IntegrityError:
+                # Otro worker creó la secuencia al mismo tiempo
+                return self._reservar(prefijo)
+
+        return [ultimo - self.tamano_bloque + 1, ultimo]
+
+
+asignador = AsignadorCodigos()
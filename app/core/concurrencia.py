@@ -0,0 +1,22 @@
+from typing import Optional
+
+
+def etag(version: int) -> str:
+    """ETag fuerte a partir de la columna `version`"""
+    return f'"{version}"'
+
+
+def version_desde_if_match(if_match: Optional[str]) -> Optional[int]:
+    """
+    Convierte la cabecera If-Match en la versión esperada.
+    None significa sin condición (cabecera ausente o "*"); -1 nunca coincide.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    valor = if_match.split(",")[0].strip()
+    if valor.startswith("W/"):
+        valor = valor[2:]
+    try:
+        return int(valor.strip('"'))
+    except ValueError:
+        return -1
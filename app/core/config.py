@@ -1,4 +1,88 @@
 import os
+import secrets
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
+
+# Pool de conexiones por proceso (cada worker de gunicorn tiene su propio pool)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Máximo de conexiones que acepta el servidor PostgreSQL (max_connections)
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "100"))
+
+# Hilos por worker para endpoints síncronos: no tiene sentido tener más hilos
+# que conexiones disponibles en el pool, el resto solo esperaría en pool_timeout
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+
+# Readiness (/health/ready)
+HEALTH_CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", "2"))
+HEALTH_DB_TIMEOUT_SECONDS = int(os.getenv("HEALTH_DB_TIMEOUT_SECONDS", "3"))
+HEALTH_MAX_DB_LATENCY_MS = float(os.getenv("HEALTH_MAX_DB_LATENCY_MS", "500"))
+HEALTH_MAX_POOL_USAGE = float(os.getenv("HEALTH_MAX_POOL_USAGE", "0.9"))
+
+# Rate limiting (token bucket). Con el backend en memoria el límite es por worker
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_LOGIN_POR_MINUTO = int(os.getenv("RATE_LIMIT_LOGIN_POR_MINUTO", "10"))
+RATE_LIMIT_ESCRITURA_POR_MINUTO = int(os.getenv("RATE_LIMIT_ESCRITURA_POR_MINUTO", "120"))
+# Backend compartido entre workers/instancias (requiere el paquete `redis`)
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+
+# Réplica de lectura: se deja de usar si su retraso supera este umbral
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5"))
+# Tiempo máximo para conectarse a la réplica y medir su retraso; si se excede, se da por no disponible
+REPLICA_PROBE_TIMEOUT_SECONDS = float(os.getenv("REPLICA_PROBE_TIMEOUT_SECONDS", "2"))
+# Tras una escritura, las lecturas del mismo cliente van al primario durante este tiempo
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+# Clave HMAC de la marca de última escritura. Con gunicorn --preload todos los
+# workers heredan la generada al arrancar; con varias instancias debe fijarse
+CONSISTENCIA_SECRETO = os.getenv("CONSISTENCIA_SECRETO") or secrets.token_hex(32)
+
+# Idempotency-Key en creación de papeletas
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_LRU_SIZE = int(os.getenv("IDEMPOTENCY_LRU_SIZE", "10000"))
+IDEMPOTENCY_CLEANUP_SECONDS = int(os.getenv("IDEMPOTENCY_CLEANUP_SECONDS", "300"))
+# Una clave en curso queda reservada este tiempo (si el worker muere, se libera sola)
+IDEMPOTENCY_RESERVA_SECONDS = int(os.getenv("IDEMPOTENCY_RESERVA_SECONDS", "60"))
+# Cuánto espera un reintento concurrente la respuesta de la original antes del 409
+IDEMPOTENCY_ESPERA_SECONDS = float(os.getenv("IDEMPOTENCY_ESPERA_SECONDS", "5"))
+
+# Eventos en tiempo real (SSE). En PostgreSQL se propagan entre workers/instancias con
+# LISTEN/NOTIFY (una conexión más por worker); sin eso cada worker solo ve sus propias escrituras
+EVENTOS_PG_NOTIFY = os.getenv("EVENTOS_PG_NOTIFY", "true").lower() == "true"
+EVENTOS_HEARTBEAT_SECONDS = float(os.getenv("EVENTOS_HEARTBEAT_SECONDS", "15"))
+
+# Sincronización incremental: los registros de eliminación se conservan este tiempo;
+# un token más antiguo recibe 410 y el cliente debe sincronizar desde cero
+SYNC_RETENCION_DIAS = int(os.getenv("SYNC_RETENCION_DIAS", "30"))
+SYNC_LIMPIEZA_SECONDS = int(os.getenv("SYNC_LIMPIEZA_SECONDS", "3600"))
+
+# Códigos de papeleta generados por el servidor: <PREFIJO>-<año>-<secuencia>
+CODIGO_PREFIJO = os.getenv("CODIGO_PREFIJO", "PAP")
+# Códigos que cada worker reserva por viaje a la base de datos (hi-lo)
+CODIGO_TAMANO_BLOQUE = int(os.getenv("CODIGO_TAMANO_BLOQUE", "100"))
+
+# Procesos del pool de CPU de cada worker (reportes e impresión por lotes); 1 = sin pool
+PROCESOS_POOL = int(os.getenv("PROCESOS_POOL", str(min(4, os.cpu_count() or 1))))
+
+# Coalescencia de lecturas idénticas concurrentes (single-flight) y micro-caché opcional
+COALESCING_CACHE_SECONDS = float(os.getenv("COALESCING_CACHE_SECONDS", "1"))
+
+# Logs estructurados (JSON en stdout, escritos por un hilo de fondo)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Registros pendientes de escribir; si se llena se descartan en vez de bloquear
+LOG_COLA_MAX = int(os.getenv("LOG_COLA_MAX", "10000"))
+# Muestreo del log de peticiones por prefijo de ruta: "/health=0.01,/api/rrhh/papeletas=0.1"
+LOG_MUESTREO = os.getenv("LOG_MUESTREO", "/health=0.01")
+# Peticiones más lentas que esto se registran siempre, aunque su ruta esté muestreada
+LOG_LENTO_MS = float(os.getenv("LOG_LENTO_MS", "1000"))
+
+# Documentos imprimibles de papeletas (PDF/HTML) cacheados en disco, compartidos por los workers
+DOCUMENTOS_DIR = os.getenv("DOCUMENTOS_DIR", os.path.join(tempfile.gettempdir(), "sdps-documentos"))
+DOCUMENTOS_CACHE_MB = int(os.getenv("DOCUMENTOS_CACHE_MB", "200"))
+
+# Actualización/eliminación masiva de papeletas: filas por transacción, para no bloquear por mucho tiempo
+MASIVO_TAMANO_LOTE = int(os.getenv("MASIVO_TAMANO_LOTE", "1000"))
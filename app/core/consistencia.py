@@ -0,0 +1,67 @@
+"""
+Read-your-writes con réplica de lectura.
+
+Cada respuesta exitosa a una escritura lleva una marca firmada con el instante
+en que terminó (cabecera `X-Ultima-Escritura` y cookie del mismo nombre). El
+cliente la reenvía en sus lecturas y cualquier worker o instancia puede
+verificarla sin estado compartido: mientras no hayan pasado
+REPLICA_STICKY_SECONDS, la lectura va al primario.
+"""
+
+import hashlib
+import hmac
+import time
+from typing import Optional
+
+from app.core.config import CONSISTENCIA_SECRETO, REPLICA_STICKY_SECONDS
+from app.database import METODOS_ESCRITURA
+
+CABECERA = "X-Ultima-Escritura"
+COOKIE = "ultima_escritura"
+
+
+def _firma(valor: str) -> str:
+    return hmac.new(CONSISTENCIA_SECRETO.encode(), valor.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def crear_marca(instante: Optional[float] = None) -> str:
+    ms = str(int((time.time() if instante is None else instante) * 1000))
+    return f"{ms}.{_firma(ms)}"
+
+
+def instante_de_marca(marca: Optional[str]) -> Optional[float]:
+    """Instante de la escritura si la marca es auténtica, si no None"""
+    if not marca:
+        return None
+    ms, _, firma = marca.strip().partition(".")
+    if not ms.isdigit() or not hmac.compare_digest(firma, _firma(ms)):
+        return None
+    return int(ms) / 1000
+
+
+def escritura_reciente(headers, cookies) -> bool:
+    instante = instante_de_marca(headers.get(CABECERA) or cookies.get(COOKIE))
+    return instante is not None and 0 <= time.time() - instante < REPLICA_STICKY_SECONDS
+
+
+class MarcaEscrituraMiddleware:
+    """Agrega la marca firmada a las respuestas 2xx/3xx de POST, PUT, PATCH y DELETE"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in METODOS_ESCRITURA:
+            return await self.app(scope, receive, send)
+
+        async def send_con_marca(mensaje):
+            if mensaje["type"] == "http.response.start" and mensaje["status"] < 400:
+                marca = crear_marca().encode()
+                mensaje["headers"] = list(mensaje.get("headers", [])) + [
+                    (CABECERA.lower().encode(), marca),
+                    (b"set-cookie", b"%s=%s; Max-Age=%d; Path=/; HttpOnly; SameSite=Lax"
+                     % (COOKIE.encode(), marca, int(REPLICA_STICKY_SECONDS) + 1)),
+                ]
+            await send(mensaje)
+
+        await self.app(scope, receive, send_con_marca)
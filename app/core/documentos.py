@@ -0,0 +1,323 @@
+"""
+Documento imprimible de una papeleta (HTML o PDF) y su caché en disco.
+
+Los renderizadores son funciones puras sobre un dict de campos, sin acceso a la
+base de datos, para poder ejecutarlos en procesos del pool. El PDF se escribe a
+mano (A4, Helvetica con WinAnsiEncoding), sin dependencias; una fundamentación
+larga continúa en páginas siguientes y las firmas van en la última.
+
+Los archivos se guardan como `{papeleta_id}-{huella}.{ext}`, donde la huella es
+el hash de los campos que se imprimen: una papeleta modificada tiene otra huella,
+así que nunca se sirve un documento desactualizado.
+"""
+
+import hashlib
+import html
+import json
+import os
+import tempfile
+import textwrap
+import threading
+from typing import Optional
+
+from app.core.config import DOCUMENTOS_DIR, DOCUMENTOS_CACHE_MB
+
+# Cambiarla invalida todos los documentos cacheados al modificar las plantillas
+VERSION_PLANTILLA = "2"
+
+FORMATOS = {"pdf": "application/pdf", "html": "text/html; charset=utf-8"}
+
+ENTIDAD = "Municipalidad Distrital de San Miguel"
+
+CAMPOS_DOCUMENTO = (
+    "codigo", "nombre", "dni", "area", "cargo", "regimen", "motivo",
+    "oficina_entidad", "fundamentacion", "fecha", "hora_salida", "hora_retorno"
+)
+
+FIRMAS = ("Firma del trabajador", "Jefe inmediato", "V°B° Recursos Humanos")
+
+
+def datos_documento(papeleta) -> dict:
+    """Campos imprimibles de una fila Papeleta, ya como texto"""
+    return {
+        "codigo": papeleta.codigo,
+        "nombre": papeleta.nombre,
+        "dni": papeleta.dni,
+        "area": papeleta.area,
+        "cargo": papeleta.cargo,
+        "regimen": papeleta.regimen,
+        "motivo": papeleta.motivo,
+        "oficina_entidad": papeleta.oficina_entidad,
+        "fundamentacion": papeleta.fundamentacion,
+        "fecha": papeleta.fecha.strftime("%d/%m/%Y"),
+        "hora_salida": papeleta.hora_salida.strftime("%H:%M"),
+        "hora_retorno": papeleta.hora_retorno.strftime("%H:%M") if papeleta.hora_retorno else None
+    }
+
+
+def huella(datos: dict) -> str:
+    contenido = json.dumps([VERSION_PLANTILLA, datos], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode()).hexdigest()[:16]
+
+
+def _filas(datos: dict):
+    return [
+        ("Código", datos["codigo"]),
+        ("Apellidos y nombres", datos["nombre"]),
+        ("DNI", datos["dni"]),
+        ("Área", datos["area"]),
+        ("Cargo", datos["cargo"]),
+        ("Régimen laboral", datos["regimen"]),
+        ("Fecha", datos["fecha"]),
+        ("Hora de salida", datos["hora_salida"]),
+        ("Hora de retorno", datos["hora_retorno"] or "Sin retorno"),
+        ("Motivo", datos["motivo"]),
+        ("Oficina / entidad de destino", datos["oficina_entidad"]),
+    ]
+
+
+# --- HTML ---------------------------------------------------------------------
+
+CABECERA_HTML = (
+    "<!DOCTYPE html>\n<html lang=\"es\"><head><meta charset=\"utf-8\"><title>Papeletas de salida</title>"
+    "<style>"
+    "body{font-family:Arial,Helvetica,sans-serif;font-size:12px;margin:0}"
+    ".papeleta{padding:24px 32px;page-break-after:always}"
+    "h1{font-size:16px;text-align:center;margin:0 0 4px}"
+    "h2{font-size:13px;text-align:center;margin:0 0 16px;font-weight:normal}"
+    "table{width:100%;border-collapse:collapse}"
+    "th{text-align:left;width:35%;padding:4px;border:1px solid #999;background:#f2f2f2}"
+    "td{padding:4px;border:1px solid #999}"
+    ".fundamentacion{margin-top:12px;white-space:pre-wrap}"
+    ".firmas{display:flex;justify-content:space-between;margin-top:64px}"
+    ".firmas div{width:30%;border-top:1px solid #000;text-align:center;padding-top:4px}"
+    "</style></head><body>\n"
+)
+PIE_HTML = "</body></html>\n"
+
+
+def _seccion_html(datos: dict) -> str:
+    filas = "".join(
+        f"<tr><th>{html.escape(etiqueta)}</th><td>{html.escape(valor)}</td></tr>"
+        for etiqueta, valor in _filas(datos)
+    )
+    firmas = "".join(f"<div>{html.escape(f)}</div>" for f in FIRMAS)
+    return (
+        f"<section class=\"papeleta\"><h1>{html.escape(ENTIDAD)}</h1>"
+        f"<h2>PAPELETA DE SALIDA N° {html.escape(datos['codigo'])}</h2>"
+        f"<table>{filas}</table>"
+        f"<div class=\"fundamentacion\"><strong>Fundamentación:</strong> {html.escape(datos['fundamentacion'])}</div>"
+        f"<div class=\"firmas\">{firmas}</div></section>\n"
+    )
+
+
+def renderizar_html(datos: dict) -> bytes:
+    return (CABECERA_HTML + _seccion_html(datos) + PIE_HTML).encode("utf-8")
+
+
+def seccion_de_html(contenido: bytes) -> bytes:
+    """Quita cabecera y pie de un documento HTML para unir varios en uno"""
+    return contenido[len(CABECERA_HTML.encode("utf-8")):-len(PIE_HTML.encode("utf-8"))]
+
+
+def unir_html(secciones) -> bytes:
+    return CABECERA_HTML.encode("utf-8") + b"".join(secciones) + PIE_HTML.encode("utf-8")
+
+
+# --- PDF ----------------------------------------------------------------------
+
+ANCHO_A4, ALTO_A4 = 595, 842
+MARGEN = 56
+
+
+def _texto_pdf(valor: str) -> bytes:
+    codificado = valor.encode("cp1252", errors="replace")
+    return codificado.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+class _Pagina:
+    def __init__(self):
+        self.ops = []
+        self.y = ALTO_A4 - MARGEN
+
+    def texto(self, x, y, valor, fuente=b"F1", tamano=10):
+        self.ops.append(b"BT /%s %d Tf %d %d Td (%s) Tj ET" % (fuente, tamano, x, y, _texto_pdf(valor)))
+
+    def contenido(self) -> bytes:
+        return b"\n".join(self.ops)
+
+
+def _paginas(datos: dict) -> list:
+    """Contenido de cada página del PDF"""
+    titulo = f"PAPELETA DE SALIDA N° {datos['codigo']}"
+    pagina = _Pagina()
+    paginas = [pagina]
+
+    def nueva_pagina():
+        nonlocal pagina
+        pagina = _Pagina()
+        paginas.append(pagina)
+        pagina.texto(MARGEN, pagina.y, f"{titulo} (continuación)", b"F2", 12)
+        pagina.y -= 30
+
+    pagina.texto(MARGEN, pagina.y, ENTIDAD, b"F2", 14)
+    pagina.y -= 22
+    pagina.texto(MARGEN, pagina.y, titulo, b"F2", 12)
+    pagina.y -= 30
+    for etiqueta, valor in _filas(datos):
+        pagina.texto(MARGEN, pagina.y, f"{etiqueta}:", b"F2")
+        lineas = textwrap.wrap(valor, 60) or [""]
+        for linea in lineas:
+            pagina.texto(MARGEN + 170, pagina.y, linea)
+            pagina.y -= 16
+        pagina.y -= 2
+
+    pagina.y -= 8
+    pagina.texto(MARGEN, pagina.y, "Fundamentación:", b"F2")
+    pagina.y -= 16
+    for linea in textwrap.wrap(datos["fundamentacion"], 95):
+        if pagina.y < MARGEN:
+            nueva_pagina()
+        pagina.texto(MARGEN, pagina.y, linea)
+        pagina.y -= 14
+
+    # Líneas de firma, con su leyenda debajo; si no caben, en una página más
+    if pagina.y - 60 - 14 < MARGEN:
+        nueva_pagina()
+    y = min(pagina.y - 60, 160)
+    ancho = (ANCHO_A4 - 2 * MARGEN - 40) // 3
+    for i, firma in enumerate(FIRMAS):
+        x = MARGEN + i * (ancho + 20)
+        pagina.ops.append(b"%d %d m %d %d l S" % (x, y, x + ancho, y))
+        pagina.texto(x, y - 14, firma, tamano=9)
+    return [p.contenido() for p in paginas]
+
+
+def renderizar_pdf(datos: dict) -> bytes:
+    paginas = _paginas(datos)
+    # 1 catálogo, 2 árbol de páginas, 3-4 fuentes, luego (página, contenido) por cada una
+    kids = b" ".join(b"%d 0 R" % (5 + 2 * i) for i in range(len(paginas)))
+    objetos = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(paginas)),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+    ]
+    for i, contenido in enumerate(paginas):
+        objetos.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>" % (ANCHO_A4, ALTO_A4, 6 + 2 * i)
+        )
+        objetos.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(contenido), contenido))
+    salida = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    posiciones = []
+    for numero, cuerpo in enumerate(objetos, start=1):
+        posiciones.append(len(salida))
+        salida += b"%d 0 obj\n%s\nendobj\n" % (numero, cuerpo)
+    inicio_xref = len(salida)
+    salida += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    for posicion in posiciones:
+        salida += b"%010d 00000 n \n" % posicion
+    salida += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objetos) + 1, inicio_xref)
+    return bytes(salida)
+
+
+def renderizar(formato: str, datos: dict) -> bytes:
+    return renderizar_pdf(datos) if formato == "pdf" else renderizar_html(datos)
+
+
+# --- Caché en disco -----------------------------------------------------------
+
+class CacheDocumentos:
+    """
+    Documentos renderizados en un directorio compartido por los workers.
+    Al leer se actualiza la fecha de acceso (mtime); al superar el tamaño máximo
+    se borran los menos usados hasta bajar al 90 %
+    """
+
+    def __init__(self, directorio: str = DOCUMENTOS_DIR, max_bytes: int = DOCUMENTOS_CACHE_MB * 1024 * 1024):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes: Optional[int] = None  # estimado; se recalcula al desalojar
+        self.aciertos = 0
+        self.fallos = 0
+
+    def ruta(self, papeleta_id: int, huella_: str, formato: str) -> str:
+        return os.path.join(self.directorio, f"{papeleta_id}-{huella_}.{formato}")
+
+    def obtener(self, papeleta_id: int, huella_: str, formato: str) -> Optional[str]:
+        ruta = self.ruta(papeleta_id, huella_, formato)
+        try:
+            os.utime(ruta)
+        except FileNotFoundError:
+            self.fallos += 1
+            return None
+        self.aciertos += 1
+        return ruta
+
+    def guardar(self, papeleta_id: int, huella_: str, formato: str, contenido: bytes) -> str:
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta = self.ruta(papeleta_id, huella_, formato)
+        # Escritura atómica: otro worker nunca lee un archivo a medias
+        fd, temporal = tempfile.mkstemp(dir=self.directorio, suffix=".tmp")
+        with os.fdopen(fd, "wb") as archivo:
+            archivo.write(contenido)
+        os.replace(temporal, ruta)
+
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._tamano_total()
+            else:
+                self._bytes += len(contenido)
+            if self._bytes > self.max_bytes:
+                self._desalojar()
+        return ruta
+
+    def invalidar(self, papeleta_id: int):
+        """Borra todas las versiones y formatos de una papeleta"""
+        self.invalidar_varias([papeleta_id])
+
+    def invalidar_varias(self, papeleta_ids):
+        """Como `invalidar`, recorriendo el directorio una sola vez"""
+        ids = {str(i) for i in papeleta_ids}
+        if not ids:
+            return
+        try:
+            nombres = os.listdir(self.directorio)
+        except FileNotFoundError:
+            return
+        for nombre in nombres:
+            if nombre.partition("-")[0] in ids:
+                try:
+                    os.remove(os.path.join(self.directorio, nombre))
+                except FileNotFoundError:
+                    pass
+
+    def _archivos(self):
+        for entrada in os.scandir(self.directorio):
+            if entrada.is_file() and not entrada.name.endswith(".tmp"):
+                try:
+                    yield entrada.path, entrada.stat()
+                except FileNotFoundError:
+                    continue
+
+    def _tamano_total(self) -> int:
+        return sum(info.st_size for _, info in self._archivos())
+
+    def _desalojar(self):
+        archivos = sorted(self._archivos(), key=lambda a: a[1].st_mtime)
+        total = sum(info.st_size for _, info in archivos)
+        objetivo = self.max_bytes * 0.9
+        for ruta, info in archivos:
+            if total <= objetivo:
+                break
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+            total -= info.st_size
+        self._bytes = total
+
+
+cache = CacheDocumentos()
@@ -0,0 +1,248 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from collections import deque
+from typing import Optional
+from app.core.config import EVENTOS_PG_NOTIFY, EVENTOS_HEARTBEAT_SECONDS
+
+CANAL_NOTIFY = "sdps_eventos"
+SECUENCIA_IDS = "sdps_eventos_id"
+
+logger = logging.getLogger(__name__)
+
+
+class BrokerEventos:
+    """
+    Difusión de eventos dentro del proceso. `publicar` se puede llamar desde los
+    hilos del threadpool; cada suscriptor SSE recibe los eventos en su propia cola
+    del event loop. Guarda los últimos eventos para reanudar con Last-Event-ID.
+
+    Con el puente LISTEN/NOTIFY activo los ids los asigna una secuencia de
+    PostgreSQL y todos los workers (incluido el que publica) entregan los eventos
+    al recibirlos del canal, en el mismo orden, así que un Last-Event-ID sirve en
+    cualquier worker y sobrevive a sus reinicios. Sin puente, los ids locales
+    parten del reloj en microsegundos para que un worker reiniciado no los repita.
+    """
+
+    def __init__(self, tamano_cola: int = 256, historial: int = 256):
+        self.tamano_cola = tamano_cola
+        self._suscriptores = set()
+        self._historial = deque(maxlen=historial)
+        self._ids = itertools.count(time.time_ns() // 1000)
+        self._lock = threading.Lock()
+        self.puente = None
+
+    def suscribir(self) -> asyncio.Queue:
+        cola = asyncio.Queue(maxsize=self.tamano_cola)
+        with self._lock:
+            self._suscriptores.add((asyncio.get_running_loop(), cola))
+        return cola
+
+    def cancelar(self, cola: asyncio.Queue):
+        with self._lock:
+            self._suscriptores = {s for s in self._suscriptores if s[1] is not cola}
+
+    def desde(self, ultimo_id: Optional[str]):
+        """
+        Eventos del historial posteriores a `ultimo_id`. Si ese evento sigue en el
+        historial se reanuda justo después de él (el orden de entrega, que con el
+        puente es el mismo en todos los workers); si ya salió del historial se
+        antepone un resync porque pudieron perderse eventos
+        """
+        try:
+            ultimo = int(ultimo_id)
+        except (TypeError, ValueError):
+            return []
+        with self._lock:
+            eventos = list(self._historial)
+        for posicion, evento in enumerate(eventos):
+            if evento["id"] == ultimo:
+                return eventos[posicion + 1:]
+        posteriores = [e for e in eventos if e["id"] > ultimo]
+        if len(eventos) == self._historial.maxlen and len(posteriores) == len(eventos):
+            return [{"id": eventos[-1]["id"], "tipo": "resync", "datos": {}}]
+        return posteriores
+
+    def publicar(self, tipo: str, datos: dict, propagar: bool = True, id_evento: Optional[int] = None):
+        if propagar and self.puente is not None:
+            # Se entrega cuando vuelve por el canal, ya con el id global
+            self.puente.enviar(tipo, datos)
+            return
+
+        with self._lock:
+            evento = {"id": next(self._ids) if id_evento is None else id_evento, "tipo": tipo, "datos": datos}
+            self._historial.append(evento)
+            suscriptores = list(self._suscriptores)
+
+        for loop, cola in suscriptores:
+            try:
+                loop.call_soon_threadsafe(self._entregar, cola, evento)
+            except RuntimeError:
+                # El loop del suscriptor ya se cerró
+                self.cancelar(cola)
+
+    @staticmethod
+    def _entregar(cola: asyncio.Queue, evento: dict):
+        if cola.full():
+            # Cliente lento: se descartan los pendientes y se le pide recargar
+            while not cola.empty():
+                cola.get_nowait()
+            evento = {"id": evento["id"], "tipo": "resync", "datos": {}}
+        cola.put_nowait(evento)
+
+
+broker = BrokerEventos()
+
+
+def publicar(tipo: str, datos: dict):
+    broker.publicar(tipo, datos)
+
+
+def formatear_sse(evento: dict) -> str:
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {json.dumps(evento['datos'], default=str)}\n\n"
+
+
+async def stream_eventos(request, ultimo_id: Optional[str] = None):
+    """Generador SSE: reenvía eventos perdidos, luego los nuevos, con heartbeat periódico"""
+    cola = broker.suscribir()
+    try:
+        yield "retry: 3000\n\n"
+        for evento in broker.desde(ultimo_id):
+            yield formatear_sse(evento)
+        while True:
+            try:
+                evento = await asyncio.wait_for(cola.get(), timeout=EVENTOS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": ping\n\n"
+                continue
+            yield formatear_sse(evento)
+    finally:
+        broker.cancelar(cola)
+
+
+class PuenteNotify:
+    """
+    Reenvía eventos entre workers e instancias con LISTEN/NOTIFY de PostgreSQL.
+    Un hilo por worker mantiene una conexión propia (fuera del pool) que escucha
+    el canal y envía los NOTIFY pendientes, así el request no espera por ellos.
+
+    Cada NOTIFY toma su id de la secuencia SECUENCIA_IDS en la misma sentencia.
+    El worker que publica también escucha su propio NOTIFY y entrega el evento
+    recién entonces, con el mismo id y en el mismo orden que los demás.
+    """
+
+    def __init__(self, engine, broker: BrokerEventos):
+        self.engine = engine
+        self.broker = broker
+        self._salientes = queue.Queue(maxsize=10000)
+        self._detener = threading.Event()
+        self._hilo = None
+        # Despierta al hilo en cuanto hay algo que enviar, sin esperar al select
+        self._despertar_r, self._despertar_w = os.pipe()
+        os.set_blocking(self._despertar_r, False)
+        os.set_blocking(self._despertar_w, False)
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._ejecutar, name="puente-notify", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        self._despertar()
+
+    def _despertar(self):
+        try:
+            os.write(self._despertar_w, b"\0")
+        except (BlockingIOError, OSError):
+            pass  # Ya hay un aviso pendiente (o el pipe se cerró)
+
+    # NOTIFY admite payloads de hasta 8000 bytes; se reserva lugar para el id
+    MAX_PAYLOAD = 7900
+
+    def enviar(self, tipo: str, datos: dict):
+        datos_json = json.dumps(datos, default=str)
+        if len(datos_json.encode()) + len(tipo) > self.MAX_PAYLOAD:
+            # No cabe: los clientes recargan en lugar de recibir un evento incompleto
+            logger.warning("Evento demasiado grande para NOTIFY, se envía resync", extra={"tipo": tipo})
+            tipo, datos_json = "resync", json.dumps({"motivo": tipo})
+        try:
+            self._salientes.put_nowait((tipo, datos_json))
+        except queue.Full:
+            logger.warning("Cola de NOTIFY llena, evento descartado", extra={"tipo": tipo})
+            return
+        self._despertar()
+
+    def _conectar(self):
+        cargs, cparams = self.engine.dialect.create_connect_args(self.engine.url)
+        conn = self.engine.dialect.loaded_dbapi.connect(*cargs, **cparams)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE SEQUENCE IF NOT EXISTS {SECUENCIA_IDS}")
+            cur.execute(f"LISTEN {CANAL_NOTIFY}")
+        return conn
+
+    def _ejecutar(self):
+        conn = None
+        while not self._detener.is_set():
+            try:
+                if conn is None:
+                    conn = self._conectar()
+                self._enviar_pendientes(conn)
+                listos = select.select([conn, self._despertar_r], [], [], 1.0)[0]
+                if self._despertar_r in listos:
+                    try:
+                        os.read(self._despertar_r, 4096)
+                    except BlockingIOError:
+                        pass
+                if conn in listos:
+                    conn.poll()
+                    while conn.notifies:
+                        self._recibir(conn.notifies.pop(0).payload)
+            except Exception:
+                # Conexión caída: reintentar tras una pausa
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                conn = None
+                self._detener.wait(2)
+        if conn is not None:
+            conn.close()
+
+    def _enviar_pendientes(self, conn):
+        with conn.cursor() as cur:
+            while True:
+                try:
+                    tipo, datos_json = self._salientes.get_nowait()
+                except queue.Empty:
+                    return
+                cur.execute(
+                    "SELECT pg_notify(%s, json_build_object("
+                    f"'id', nextval('{SECUENCIA_IDS}'), 'tipo', %s::text, 'datos', %s::json)::text)",
+                    (CANAL_NOTIFY, tipo, datos_json)
+                )
+
+    def _recibir(self, payload: str):
+        mensaje = json.loads(payload)
+        self.broker.publicar(mensaje["tipo"], mensaje["datos"], propagar=False, id_evento=mensaje.get("id"))
+
+
+def iniciar_puente(engine):
+    if EVENTOS_PG_NOTIFY and engine.dialect.name == "postgresql" and broker.puente is None:
+        broker.puente = PuenteNotify(engine, broker)
+        broker.puente.iniciar()
+
+
+def detener_puente():
+    if broker.puente is not None:
+        broker.puente.detener()
+        broker.puente = None
@@ -0,0 +1,110 @@
+import time
+import anyio
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+from app.database import engine
+from app.core.config import (
+    HEALTH_CACHE_SECONDS, HEALTH_DB_TIMEOUT_SECONDS,
+    HEALTH_MAX_DB_LATENCY_MS, HEALTH_MAX_POOL_USAGE
+)
+
+
+def estado_pool():
+    """Uso actual del pool de conexiones de este worker"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"en_uso": None, "capacidad": None, "uso": 0.0}
+
+    capacidad = pool.size() + max(pool._max_overflow, 0)
+    en_uso = pool.checkedout()
+    return {
+        "en_uso": en_uso,
+        "capacidad": capacidad,
+        "uso": round(en_uso / capacidad, 3) if capacidad else 0.0
+    }
+
+
+class ProbeBaseDatos:
+    """
+    Ejecuta SELECT 1 como máximo una vez cada `ttl` segundos por worker.
+
+    Usa un engine propio con una sola conexión persistente, para que la medición
+    no dependa de que el pool de la aplicación tenga conexiones libres, y su
+    propio hilo (limitador de 1), fuera del threadpool de los endpoints: con ese
+    threadpool saturado la sonda sigue respondiendo y puede devolver 503.
+    """
+
+    def __init__(self, ttl: float = HEALTH_CACHE_SECONDS, timeout: float = HEALTH_DB_TIMEOUT_SECONDS):
+        self.ttl = ttl
+        self.timeout = timeout
+        self._resultado = None
+        self._expira = 0.0
+        # Se crean dentro del event loop (anyio los asocia al backend en uso)
+        self._lock = None
+        self._limitador = None
+        if engine.dialect.name == "postgresql":
+            self._engine = create_engine(
+                engine.url, pool_size=1, max_overflow=0, pool_timeout=timeout,
+                pool_pre_ping=True, pool_recycle=300,
+                connect_args={
+                    "connect_timeout": int(timeout),
+                    "options": f"-c statement_timeout={int(timeout * 1000)}"
+                }
+            )
+        else:
+            self._engine = create_engine(engine.url)
+
+    def _medir(self):
+        inicio = time.perf_counter()
+        try:
+            with self._engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return {"ok": True, "latencia_ms": round((time.perf_counter() - inicio) * 1000, 2)}
+        except Exception as e:
+            return {"ok": False, "latencia_ms": None, "error": type(e).__name__}
+
+    async def resultado(self):
+        if self._resultado is not None and time.monotonic() < self._expira:
+            return self._resultado
+
+        if self._lock is None:
+            self._lock = anyio.Lock()
+            self._limitador = anyio.CapacityLimiter(1)
+
+        # Solo una sonda a la vez; las demás esperan y reutilizan su resultado
+        async with self._lock:
+            if self._resultado is None or time.monotonic() >= self._expira:
+                resultado = {"ok": False, "latencia_ms": None, "error": "timeout"}
+                # Si la consulta no vuelve a tiempo se abandona el hilo; la
+                # siguiente sonda esperará al limitador y también dará timeout
+                with anyio.move_on_after(self.timeout):
+                    resultado = await anyio.to_thread.run_sync(
+                        self._medir, cancellable=True, limiter=self._limitador
+                    )
+                self._resultado = resultado
+                self._expira = time.monotonic() + self.ttl
+            return self._resultado
+
+
+probe_db = ProbeBaseDatos()
+
+
+async def verificar_disponibilidad():
+    """Devuelve (listo, detalle) según la latencia de la BD y la saturación del pool"""
+    db = await probe_db.resultado()
+    pool = estado_pool()
+
+    motivos = []
+    if not db["ok"]:
+        motivos.append("base_de_datos_inaccesible")
+    elif db["latencia_ms"] > HEALTH_MAX_DB_LATENCY_MS:
+        motivos.append("latencia_base_de_datos")
+    if pool["uso"] >= HEALTH_MAX_POOL_USAGE:
+        motivos.append("pool_saturado")
+
+    return not motivos, {
+        "status": "ready" if not motivos else "unavailable",
+        "motivos": motivos,
+        "base_de_datos": db,
+        "pool": pool
+    }
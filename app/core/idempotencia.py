@@ -0,0 +1,211 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+from app.models.idempotencia_model import ClaveIdempotencia
+from app.database import insert_dialecto
+from app.core.config import (
+    IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_LRU_SIZE, IDEMPOTENCY_CLEANUP_SECONDS,
+    IDEMPOTENCY_RESERVA_SECONDS, IDEMPOTENCY_ESPERA_SECONDS
+)
+
+MAX_LONGITUD_CLAVE = 255
+
+# codigo_estado de una clave reservada cuya operación aún no terminó
+EN_CURSO = 0
+
+INTERVALO_ESPERA = 0.1
+
+
+def hash_solicitud(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(jsonable_encoder(payload), sort_keys=True).encode()).hexdigest()
+
+
+class AlmacenIdempotencia:
+    """
+    Respuestas ya entregadas por clave: LRU en memoria por worker delante de la
+    tabla `claves_idempotencia`, compartida por todos los workers.
+
+    Antes de ejecutar la operación la clave se reserva con una fila EN_CURSO
+    (INSERT ... ON CONFLICT DO NOTHING): solo una solicitud gana la reserva y
+    las demás esperan su respuesta
+    """
+
+    def __init__(self, capacidad: int = IDEMPOTENCY_LRU_SIZE, ttl: int = IDEMPOTENCY_TTL_SECONDS,
+                 reserva: int = IDEMPOTENCY_RESERVA_SECONDS):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self.reserva = reserva
+        self._lru = OrderedDict()  # clave -> (expira_monotonic, hash, estado, cuerpo)
+        self._lock = threading.Lock()
+        self._proxima_limpieza = 0.0
+
+    def obtener(self, clave: str, db: Session):
+        """(hash, estado, cuerpo) de la clave vigente, con estado EN_CURSO si aún no terminó"""
+        with self._lock:
+            entrada = self._lru.get(clave)
+            if entrada is not None:
+                if entrada[0] > time.monotonic():
+                    self._lru.move_to_end(clave)
+                    return entrada[1:]
+                del self._lru[clave]
+
+        fila = db.query(ClaveIdempotencia).filter(
+            ClaveIdempotencia.clave == clave,
+            ClaveIdempotencia.expira > datetime.now()
+        ).first()
+        if fila is None:
+            return None
+
+        if fila.codigo_estado != EN_CURSO:
+            restante = (fila.expira - datetime.now()).total_seconds()
+            self._recordar(clave, restante, fila.hash_solicitud, fila.codigo_estado, fila.cuerpo)
+        return fila.hash_solicitud, fila.codigo_estado, fila.cuerpo
+
+    def reservar(self, clave: str, hash_: str, db: Session) -> bool:
+        """True si esta solicitud obtuvo la clave y debe ejecutar la operación"""
+        ahora = datetime.now()
+        # Una fila vencida (incluida una reserva abandonada) no debe bloquear la clave
+        db.execute(delete(ClaveIdempotencia).where(
+            ClaveIdempotencia.clave == clave,
+            ClaveIdempotencia.expira <= ahora
+        ))
+        resultado = db.execute(
+            insert_dialecto(db)(ClaveIdempotencia).values(
+                clave=clave,
+                hash_solicitud=hash_,
+                codigo_estado=EN_CURSO,
+                cuerpo="",
+                fecha_creacion=ahora,
+                expira=ahora + timedelta(seconds=self.reserva)
+            ).on_conflict_do_nothing(index_elements=[ClaveIdempotencia.clave])
+        )
+        db.commit()
+        return resultado.rowcount == 1
+
+    def guardar(self, clave: str, hash_: str, estado: int, cuerpo: str, db: Session):
+        self._recordar(clave, self.ttl, hash_, estado, cuerpo)
+        db.execute(
+            update(ClaveIdempotencia)
+            .where(ClaveIdempotencia.clave == clave)
+            .values(codigo_estado=estado, cuerpo=cuerpo, expira=datetime.now() + timedelta(seconds=self.ttl))
+        )
+        db.commit()
+        self._limpiar_si_corresponde(db)
+
+    def liberar(self, clave: str, db: Session):
+        """Quita la reserva para que un reintento vuelva a ejecutar la operación"""
+        db.rollback()
+        db.execute(delete(ClaveIdempotencia).where(
+            ClaveIdempotencia.clave == clave,
+            ClaveIdempotencia.codigo_estado == EN_CURSO
+        ))
+        db.commit()
+
+    def esperar(self, clave: str, db: Session, segundos: float):
+        """
+        Espera a que termine la solicitud que tiene la clave reservada. Devuelve
+        lo mismo que `obtener`, o la entrada EN_CURSO si se agotó el tiempo
+        """
+        limite = time.monotonic() + segundos
+        while True:
+            # Sin transacción abierta no se retiene la conexión mientras se duerme
+            db.rollback()
+            guardada = self.obtener(clave, db)
+            if guardada is None or guardada[1] != EN_CURSO or time.monotonic() >= limite:
+                db.rollback()
+                return guardada
+            time.sleep(INTERVALO_ESPERA)
+
+    def _recordar(self, clave, segundos, hash_, estado, cuerpo):
+        with self._lock:
+            self._lru[clave] = (time.monotonic() + segundos, hash_, estado, cuerpo)
+            self._lru.move_to_end(clave)
+            while len(self._lru) > self.capacidad:
+                self._lru.popitem(last=False)
+
+    def _limpiar_si_corresponde(self, db: Session):
+        """Borra claves vencidas como máximo una vez cada IDEMPOTENCY_CLEANUP_SECONDS por worker"""
+        ahora = time.monotonic()
+        if ahora < self._proxima_limpieza:
+            return
+        self._proxima_limpieza = ahora + IDEMPOTENCY_CLEANUP_SECONDS
+        db.query(ClaveIdempotencia).filter(ClaveIdempotencia.expira <= datetime.now()).delete(synchronize_session=False)
+        db.commit()
+
+
+almacen = AlmacenIdempotencia()
+
+
+def _error(estado: int, codigo: str, mensaje: str, headers: Optional[dict] = None) -> JSONResponse:
+    return JSONResponse(status_code=estado, content={"error": {"field": "Idempotency-Key", "code": codigo, "message": mensaje}}, headers=headers, media_type="application/json")
+
+
+def _respuesta_guardada(guardada, hash_: str) -> JSONResponse:
+    hash_guardado, estado, cuerpo = guardada
+    if hash_guardado != hash_:
+        return _error(422, "idempotency_key_reused", "La Idempotency-Key ya se usó con otra solicitud")
+    if estado == EN_CURSO:
+        return _error(
+            409, "idempotency_key_in_progress", "Una solicitud con esta Idempotency-Key aún se está procesando",
+            headers={"Retry-After": "1"}
+        )
+    return JSONResponse(status_code=estado, content=json.loads(cuerpo), headers={"Idempotent-Replayed": "true"})
+
+
+def ejecutar_idempotente(clave: Optional[str], alcance: str, payload: dict, db: Session, operacion: Callable,
+                         espera: float = IDEMPOTENCY_ESPERA_SECONDS):
+    """
+    Ejecuta `operacion` una sola vez por clave. Un reintento con la misma clave
+    devuelve la respuesta guardada sin volver a ejecutarla; si llega mientras la
+    original sigue en curso, espera hasta `espera` segundos su respuesta y si no,
+    recibe 409
+    """
+    if clave is None:
+        return operacion()
+
+    if len(clave) > MAX_LONGITUD_CLAVE:
+        return _error(400, "invalid", "Idempotency-Key demasiado larga")
+
+    clave_completa = f"{alcance}:{clave}"
+    hash_ = hash_solicitud(payload)
+
+    guardada = almacen.obtener(clave_completa, db)
+    if guardada is not None and guardada[1] != EN_CURSO:
+        return _respuesta_guardada(guardada, hash_)
+
+    while not almacen.reservar(clave_completa, hash_, db):
+        guardada = almacen.obtener(clave_completa, db)
+        if guardada is None:
+            # La otra solicitud falló y liberó la clave: se vuelve a intentar la reserva
+            continue
+        if guardada[0] == hash_ and guardada[1] == EN_CURSO:
+            guardada = almacen.esperar(clave_completa, db, espera)
+            if guardada is None:
+                continue
+        return _respuesta_guardada(guardada, hash_)
+
+    try:
+        resultado = operacion()
+    except BaseException:
+        almacen.liberar(clave_completa, db)
+        raise
+
+    if isinstance(resultado, JSONResponse):
+        estado, cuerpo = resultado.status_code, resultado.body.decode()
+    else:
+        estado, cuerpo = 200, json.dumps(jsonable_encoder(resultado))
+
+    # Los errores internos no se guardan: el reintento debe volver a intentarlo
+    if estado < 500:
+        almacen.guardar(clave_completa, hash_, estado, cuerpo, db)
+    else:
+        almacen.liberar(clave_completa, db)
+    return resultado
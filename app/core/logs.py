@@ -0,0 +1,226 @@
+"""
+Logs estructurados en JSON.
+
+Los hilos de las peticiones solo encolan el registro (QueueHandler); un hilo de
+fondo por proceso (QueueListener) lo formatea y lo escribe en stdout, así la
+serialización y la E/S no compiten con el trabajo de las peticiones.
+
+`CorrelacionMiddleware` asigna a cada petición un X-Request-ID (el del cliente o
+uno nuevo), lo deja disponible para todos los logs de esa petición y registra una
+línea por petición, muestreada en las rutas de mucho volumen.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from app.core.config import LOG_LEVEL, LOG_COLA_MAX, LOG_MUESTREO, LOG_LENTO_MS
+
+request_id_actual: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+logger_peticiones = logging.getLogger("app.peticiones")
+
+# Atributos propios de LogRecord; el resto (extra=...) se vuelca como campos del JSON
+_ATRIBUTOS_RECORD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+
+class FormateadorJSON(logging.Formatter):
+    """Una línea JSON por registro. Los campos de `extra` se incluyen tal cual"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+            "pid": record.process
+        }
+        if getattr(record, "request_id", None):
+            datos["request_id"] = record.request_id
+        for clave, valor in record.__dict__.items():
+            if clave not in _ATRIBUTOS_RECORD:
+                datos[clave] = valor
+        if record.exc_info:
+            datos["excepcion"] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class ColaHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que no bloquea ni formatea en el hilo que registra: anota el
+    request_id del contexto actual y, si la cola está llena, descarta y cuenta
+    """
+
+    def __init__(self, cola):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def prepare(self, record):
+        # Resolver el mensaje ahora: los argumentos pueden cambiar después
+        record.msg = record.getMessage()
+        record.args = None
+        record.request_id = request_id_actual.get()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+_lock = threading.Lock()
+_pid: Optional[int] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[ColaHandler] = None
+
+
+def configurar_logging(destino=None):
+    """
+    Instala el handler con cola en el logger raíz y arranca el hilo escritor.
+    Idempotente por proceso: tras un fork (workers de gunicorn con preload_app)
+    el hilo del padre no existe en el hijo, así que se vuelve a arrancar con una
+    cola nueva
+    """
+    global _pid, _listener, _handler
+    with _lock:
+        if _pid == os.getpid():
+            return
+        salida = logging.StreamHandler(destino or sys.stdout)
+        salida.setFormatter(FormateadorJSON())
+
+        _handler = ColaHandler(queue.Queue(maxsize=LOG_COLA_MAX))
+        raiz = logging.getLogger()
+        for previo in list(raiz.handlers):
+            if isinstance(previo, ColaHandler):
+                raiz.removeHandler(previo)
+        raiz.addHandler(_handler)
+        raiz.setLevel(LOG_LEVEL)
+
+        # El listener heredado del padre no tiene hilo en este proceso: no se detiene
+        _listener = logging.handlers.QueueListener(_handler.queue, salida, respect_handler_level=True)
+        _listener.start()
+        _pid = os.getpid()
+
+
+def detener_logging():
+    """Vacía la cola y detiene el hilo escritor (al salir del proceso)"""
+    global _pid
+    with _lock:
+        if _listener is not None and _pid == os.getpid():
+            _listener.stop()
+            _pid = None
+
+
+def _tras_fork():
+    # El hilo escritor y los locks del padre no sirven en el hijo
+    global _lock
+    _lock = threading.Lock()
+    if _pid is not None:
+        configurar_logging()
+
+
+atexit.register(detener_logging)
+os.register_at_fork(after_in_child=_tras_fork)
+
+
+def registros_descartados() -> int:
+    return _handler.descartados if _handler is not None else 0
+
+
+def _parsear_muestreo(texto: str) -> List[Tuple[str, float]]:
+    """'/health=0.01,/api/rrhh/papeletas=0.1' -> [(prefijo, tasa)], el prefijo más largo primero"""
+    reglas = []
+    for parte in texto.split(","):
+        if "=" not in parte:
+            continue
+        prefijo, tasa = parte.rsplit("=", 1)
+        try:
+            reglas.append((prefijo.strip(), min(1.0, max(0.0, float(tasa)))))
+        except ValueError:
+            continue
+    return sorted(reglas, key=lambda r: len(r[0]), reverse=True)
+
+
+def _request_id_valido(valor: bytes) -> Optional[str]:
+    if not valor or len(valor) > 128:
+        return None
+    texto = valor.decode("latin-1")
+    return texto if texto.isprintable() else None
+
+
+class CorrelacionMiddleware:
+    """
+    Middleware ASGI: propaga X-Request-ID y registra método, ruta, estado y
+    duración de cada petición. Los errores y las peticiones lentas se registran
+    siempre; el resto según la tasa de muestreo de su ruta
+    """
+
+    CABECERA = b"x-request-id"
+
+    def __init__(self, app, muestreo: str = LOG_MUESTREO, lento_ms: float = LOG_LENTO_MS):
+        self.app = app
+        self.reglas = _parsear_muestreo(muestreo)
+        self.lento_ms = lento_ms
+
+    def _tasa(self, ruta: str) -> float:
+        for prefijo, tasa in self.reglas:
+            if ruta.startswith(prefijo):
+                return tasa
+        return 1.0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for nombre, valor in scope["headers"]:
+            if nombre == self.CABECERA:
+                request_id = _request_id_valido(valor)
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_actual.set(request_id)
+
+        estado = 500
+        inicio = time.perf_counter()
+
+        async def send_con_id(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+                mensaje["headers"] = list(mensaje.get("headers", [])) + [(self.CABECERA, request_id.encode("latin-1"))]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, send_con_id)
+        except Exception:
+            logger_peticiones.exception(
+                "petición fallida",
+                extra={"metodo": scope["method"], "ruta": scope["path"]}
+            )
+            raise
+        finally:
+            duracion_ms = (time.perf_counter() - inicio) * 1000
+            if estado >= 500 or duracion_ms >= self.lento_ms or random.random() < self._tasa(scope["path"]):
+                logger_peticiones.log(
+                    logging.WARNING if estado >= 500 else logging.INFO,
+                    "petición",
+                    extra={
+                        "metodo": scope["method"],
+                        "ruta": scope["path"],
+                        "estado": estado,
+                        "duracion_ms": round(duracion_ms, 2)
+                    }
+                )
+            request_id_actual.reset(token)
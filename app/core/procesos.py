@@ -0,0 +1,64 @@
+"""
+Pool de procesos compartido por el worker para el trabajo de CPU (reportes,
+renderizado de documentos).
+
+Se crea una sola vez en el arranque de la aplicación y se cierra al apagarla;
+los procesos se lanzan al primer uso y se reutilizan entre requests. Usa
+"spawn": hacer fork de un worker con hilos activos no es seguro.
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from app.core.config import PROCESOS_POOL
+
+logger = logging.getLogger(__name__)
+
+
+class PoolProcesos:
+    def __init__(self, procesos: int = PROCESOS_POOL):
+        self.procesos = procesos
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def disponible(self) -> bool:
+        """False si no se inició (p. ej. scripts) o si está configurado con un solo proceso"""
+        return self._pool is not None
+
+    def iniciar(self):
+        with self._lock:
+            if self._pool is None and self.procesos > 1:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+
+    def detener(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def map(self, funcion, *iterables, chunksize: int = 1) -> list:
+        pool = self._pool
+        if pool is None:
+            return list(map(funcion, *iterables))
+        try:
+            return list(pool.map(funcion, *iterables, chunksize=chunksize))
+        except BrokenProcessPool:
+            # Un proceso murió (p. ej. por memoria): se reemplaza el pool para los siguientes
+            logger.exception("Pool de procesos roto, se recrea")
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            self.iniciar()
+            raise
+
+
+pool_procesos = PoolProcesos()
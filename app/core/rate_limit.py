@@ -0,0 +1,270 @@
+import json
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+from fastapi import HTTPException, Request
+from starlette.responses import JSONResponse
+from app.core.config import (
+    RATE_LIMIT_ENABLED, RATE_LIMIT_LOGIN_POR_MINUTO,
+    RATE_LIMIT_ESCRITURA_POR_MINUTO, RATE_LIMIT_REDIS_URL
+)
+from app.database import METODOS_ESCRITURA
+
+
+class Politica:
+    """Token bucket de `capacidad` fichas que se recarga a capacidad/periodo fichas por segundo"""
+
+    def __init__(self, nombre: str, metodos: set, ruta: str, capacidad: int, periodo: float, alcance: str):
+        self.nombre = nombre
+        self.metodos = metodos
+        self.ruta = ruta
+        self.capacidad = capacidad
+        self.tasa = capacidad / periodo
+        # "ip": dirección del cliente, antes de tocar la base de datos
+        # "ip-usuario": dirección + `usuario` del cuerpo del login (sin verificar)
+        # "autenticado": dirección + usuario ya autenticado (ver `limitar_autenticado`)
+        self.alcance = alcance
+
+    def aplica(self, metodo: str, ruta: str) -> bool:
+        if metodo not in self.metodos:
+            return False
+        if self.ruta.endswith("/"):
+            return ruta.startswith(self.ruta)
+        return ruta == self.ruta
+
+
+POLITICAS = [
+    # Login: cada intento cuesta una consulta a `usuarios`
+    Politica("login-ip", {"POST"}, "/api/auth/login", RATE_LIMIT_LOGIN_POR_MINUTO * 2, 60, "ip"),
+    # Con la IP en la clave, nadie puede bloquear el login de otro usuario desde otra dirección
+    Politica("login-usuario", {"POST"}, "/api/auth/login", RATE_LIMIT_LOGIN_POR_MINUTO, 60, "ip-usuario"),
+    # Escrituras autenticadas
+    Politica("escritura-usuario", METODOS_ESCRITURA, "/api/", RATE_LIMIT_ESCRITURA_POR_MINUTO, 60, "autenticado"),
+    Politica("escritura-ip", METODOS_ESCRITURA, "/api/", RATE_LIMIT_ESCRITURA_POR_MINUTO * 2, 60, "ip"),
+]
+
+
+class RateLimitBackend:
+    """Interfaz de almacenamiento de buckets"""
+
+    def consumir(self, clave: str, capacidad: int, tasa: float, costo: float = 1.0) -> float:
+        """Consume `costo` fichas. Devuelve 0 si se permitió o los segundos a esperar"""
+        raise NotImplementedError
+
+
+class InMemoryBackend(RateLimitBackend):
+    """
+    Buckets en memoria del proceso (un límite independiente por worker).
+
+    Cada bucket guarda su propia capacidad y tasa, y se mantienen ordenados por
+    último uso: cada llamada revisa unos pocos de los más antiguos y descarta los
+    que ya estarían llenos, de modo que la limpieza cuesta O(1) por solicitud
+    """
+
+    PURGA_POR_LLAMADA = 8
+
+    def __init__(self, max_claves: int = 100_000):
+        self.max_claves = max_claves
+        self._buckets = OrderedDict()  # clave -> (fichas, ultimo, capacidad, tasa)
+        self._lock = threading.Lock()
+
+    def consumir(self, clave, capacidad, tasa, costo=1.0):
+        ahora = time.monotonic()
+        with self._lock:
+            estado = self._buckets.pop(clave, None)
+            fichas, ultimo = (estado[0], estado[1]) if estado else (capacidad, ahora)
+            fichas = min(capacidad, fichas + (ahora - ultimo) * tasa)
+            espera = 0.0
+            if fichas >= costo:
+                fichas -= costo
+            else:
+                espera = (costo - fichas) / tasa
+            self._purgar(ahora)
+            self._buckets[clave] = (fichas, ahora, capacidad, tasa)
+            return espera
+
+    def _purgar(self, ahora):
+        # Un bucket que ya se habría recargado por completo equivale a no tenerlo
+        for _ in range(self.PURGA_POR_LLAMADA):
+            if not self._buckets:
+                return
+            clave, (fichas, ultimo, capacidad, tasa) = next(iter(self._buckets.items()))
+            if fichas + (ahora - ultimo) * tasa < capacidad:
+                break
+            del self._buckets[clave]
+        # Tope duro de memoria: se descartan los de uso más antiguo
+        while len(self._buckets) >= self.max_claves:
+            self._buckets.popitem(last=False)
+
+
+class RedisBackend(RateLimitBackend):
+    """
+    Buckets compartidos entre workers e instancias.
+
+    `cliente` solo necesita un método `eval(script, numkeys, *args)` compatible con
+    redis-py, por lo que en pruebas puede sustituirse por un objeto local.
+    """
+
+    SCRIPT = """
+local capacidad = tonumber(ARGV[1])
+local tasa = tonumber(ARGV[2])
+local costo = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local ahora = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local estado = redis.call('HMGET', KEYS[1], 'fichas', 'ts')
+local fichas = tonumber(estado[1]) or capacidad
+local ultimo = tonumber(estado[2]) or ahora
+fichas = math.min(capacidad, fichas + (ahora - ultimo) * tasa)
+local espera = 0
+if fichas >= costo then
+  fichas = fichas - costo
+else
+  espera = (costo - fichas) / tasa
+end
+redis.call('HSET', KEYS[1], 'fichas', fichas, 'ts', ahora)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacidad / tasa) + 1)
+return tostring(espera)
+"""
+
+    def __init__(self, cliente, prefijo: str = "sdps:rl:"):
+        self.cliente = cliente
+        self.prefijo = prefijo
+
+    def consumir(self, clave, capacidad, tasa, costo=1.0):
+        return float(self.cliente.eval(self.SCRIPT, 1, self.prefijo + clave, capacidad, tasa, costo))
+
+
+def crear_backend() -> RateLimitBackend:
+    if RATE_LIMIT_REDIS_URL:
+        import redis
+        return RedisBackend(redis.Redis.from_url(RATE_LIMIT_REDIS_URL))
+    return InMemoryBackend()
+
+
+def _usuario_desde_login(cuerpo: bytes) -> Optional[str]:
+    try:
+        usuario = json.loads(cuerpo).get("usuario")
+    except (ValueError, AttributeError):
+        return None
+    return usuario if isinstance(usuario, str) else None
+
+
+def _ip(scope) -> str:
+    return scope["client"][0] if scope.get("client") else "desconocida"
+
+
+def _respuesta_429(espera: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"error": {"field": None, "code": "rate_limited", "message": "Demasiadas solicitudes, intente más tarde"}},
+        headers={"Retry-After": str(math.ceil(espera))}
+    )
+
+
+class RateLimitMiddleware:
+    """
+    Middleware ASGI que aplica `POLITICAS` antes de llegar a los endpoints,
+    de modo que una solicitud rechazada no consume conexiones de base de datos.
+    Las políticas "autenticado" no se aplican aquí sino en `limitar_autenticado`,
+    una vez validado el token
+    """
+
+    MAX_CUERPO_LOGIN = 4096
+
+    def __init__(self, app, backend: Optional[RateLimitBackend] = None, politicas=None):
+        self.app = app
+        self.backend = backend or crear_backend()
+        self.politicas = politicas if politicas is not None else POLITICAS
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED:
+            return await self.app(scope, receive, send)
+
+        metodo, ruta = scope["method"], scope["path"]
+        aplicables = [p for p in self.politicas if p.aplica(metodo, ruta)]
+        if not aplicables:
+            return await self.app(scope, receive, send)
+
+        if any(p.alcance == "autenticado" for p in aplicables):
+            scope.setdefault("state", {})["rate_limit"] = self
+
+        ip = _ip(scope)
+        usuario = None
+        if any(p.alcance == "ip-usuario" for p in aplicables):
+            cuerpo, receive = await self._leer_cuerpo(receive, self.MAX_CUERPO_LOGIN)
+            usuario = _usuario_desde_login(cuerpo)
+
+        espera = 0.0
+        for politica in aplicables:
+            if politica.alcance == "ip":
+                sujeto = ip
+            elif politica.alcance == "ip-usuario" and usuario is not None:
+                sujeto = f"{ip}:{usuario}"
+            else:
+                continue
+            clave = f"{politica.nombre}:{sujeto}"
+            espera = max(espera, self.backend.consumir(clave, politica.capacidad, politica.tasa))
+
+        if espera > 0:
+            return await _respuesta_429(espera)(scope, receive, send)
+
+        await self.app(scope, receive, send)
+
+    def consumir_autenticado(self, metodo: str, ruta: str, ip: str, usuario_id) -> float:
+        espera = 0.0
+        for politica in self.politicas:
+            if politica.alcance == "autenticado" and politica.aplica(metodo, ruta):
+                clave = f"{politica.nombre}:{ip}:{usuario_id}"
+                espera = max(espera, self.backend.consumir(clave, politica.capacidad, politica.tasa))
+        return espera
+
+    @staticmethod
+    async def _leer_cuerpo(receive, limite: int):
+        """
+        Lee mensajes del cuerpo hasta completarlo o pasar de `limite` bytes, sin
+        bufferizar el resto. Devuelve (cuerpo, receive): el nuevo `receive` vuelve
+        a entregar lo leído y luego continúa con el original. Si el cuerpo está
+        incompleto o supera el límite, `cuerpo` es b""
+        """
+        mensajes = deque()
+        leidos = 0
+        completo = False
+        while leidos <= limite:
+            mensaje = await receive()
+            mensajes.append(mensaje)
+            if mensaje["type"] != "http.request":
+                break
+            leidos += len(mensaje.get("body", b""))
+            if not mensaje.get("more_body", False):
+                completo = leidos <= limite
+                break
+        cuerpo = b"".join(m.get("body", b"") for m in mensajes) if completo else b""
+
+        async def replay():
+            if mensajes:
+                return mensajes.popleft()
+            return await receive()
+
+        return cuerpo, replay
+
+
+def limitar_autenticado(request: Request, usuario) -> None:
+    """
+    Aplica las políticas "autenticado" a un usuario cuyo token ya se validó.
+    La clave combina la dirección del cliente con el usuario, así un token
+    inventado no puede agotar el bucket de otro
+    """
+    limitador = getattr(request.state, "rate_limit", None)
+    if limitador is None:
+        return
+    espera = limitador.consumir_autenticado(
+        request.method, request.url.path, _ip(request.scope), usuario.id
+    )
+    if espera > 0:
+        raise HTTPException(
+            status_code=429,
+            detail="Demasiadas solicitudes, intente más tarde",
+            headers={"Retry-After": str(math.ceil(espera))}
+        )
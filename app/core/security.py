@@ -1,21 +1,16 @@
-from fastapi import HTTPException, Depends
+from fastapi import HTTPException, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_db, get_read_db, usar_primario, SessionLocal, METODOS_ESCRITURA
 from app.models.usuario_model import Usuario, RolUsuario
+from app.core.rate_limit import limitar_autenticado
 
 security = HTTPBearer()
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> Usuario:
+def usuario_desde_token(token: str, db: Session) -> Usuario:
     """
-    Obtener usuario actual desde el token Bearer
-    Formato esperado: usuario:dni (sin Bearer, eso lo maneja FastAPI)
+    Validar un token con formato usuario:dni y devolver el usuario
     """
-    token = credentials.credentials
-    
     try:
         # Validar formato del token (usuario:dni)
         if ":" not in token:
@@ -43,6 +38,40 @@ def get_current_user(
             detail="Formato de token inválido. Use: usuario:dni"
         )
 
+def get_current_user(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db),
+    db_lectura: Session = Depends(get_read_db)
+) -> Usuario:
+    """
+    Obtener usuario actual desde el token Bearer
+    Formato esperado: usuario:dni (sin Bearer, eso lo maneja FastAPI)
+
+    Comparte la sesión del endpoint (las dependencias se resuelven una vez por
+    request): las escrituras validan en el primario y las lecturas en la réplica
+    cuando corresponde. La sesión que no se usa no llega a pedir conexión
+    """
+    sesion = db if request.method in METODOS_ESCRITURA else db_lectura
+    user = usuario_desde_token(credentials.credentials, sesion)
+    # Límite por usuario solo con el token ya verificado
+    limitar_autenticado(request, user)
+    return user
+
+def get_current_user_stream(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> Usuario:
+    """
+    Igual que get_current_user pero cierra la sesión al terminar la validación,
+    para respuestas de larga duración (SSE) que no deben retener una conexión
+    """
+    db = SessionLocal(info={"replica": not usar_primario(request)})
+    try:
+        return usuario_desde_token(credentials.credentials, db)
+    finally:
+        db.close()
+
 def require_admin(current_user: Usuario = Depends(get_current_user)) -> Usuario:
     """Validar que el usuario actual sea administrador"""
     if current_user.rol != RolUsuario.administrador:
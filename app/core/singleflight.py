@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Llamada:
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Las solicitudes concurrentes con la misma clave comparten una sola ejecución:
+    la primera ejecuta la consulta y las demás esperan su resultado (o su error).
+
+    Con `ttl` > 0 el resultado se reutiliza además durante ese tiempo (micro-caché).
+    Con `compartir=False` la solicitud ejecuta por su cuenta, sin unirse a una
+    ejecución en curso ni leer la caché (p. ej. un cliente que acaba de escribir).
+    Las métricas por clave cuentan solicitudes, ejecuciones reales, solicitudes
+    colapsadas en una ejecución en curso, aciertos de caché y ejecuciones directas.
+    """
+
+    def __init__(self, nombre: str, ttl: float = 0.0, max_claves: int = 1000):
+        self.nombre = nombre
+        self.ttl = ttl
+        self.max_claves = max_claves
+        self._lock = threading.Lock()
+        self._en_curso: Dict[Hashable, _Llamada] = {}
+        self._cache = OrderedDict()
+        self._metricas = OrderedDict()
+        registro[nombre] = self
+
+    def ejecutar(self, clave: Hashable, funcion: Callable[[], Any], compartir: bool = True):
+        with self._lock:
+            metricas = self._metricas_de(clave)
+            metricas["solicitudes"] += 1
+            if not compartir:
+                metricas["directas"] += 1
+        if not compartir:
+            return funcion()
+
+        with self._lock:
+            en_cache = self._cache.get(clave)
+            if en_cache is not None and en_cache[0] > time.monotonic():
+                metricas["cache"] += 1
+                return en_cache[1]
+
+            llamada = self._en_curso.get(clave)
+            lider = llamada is None
+            if lider:
+                llamada = _Llamada()
+                self._en_curso[clave] = llamada
+                metricas["ejecuciones"] += 1
+            else:
+                metricas["colapsadas"] += 1
+
+        if not lider:
+            llamada.evento.wait()
+            if llamada.error is not None:
+                raise llamada.error
+            return llamada.resultado
+
+        try:
+            llamada.resultado = funcion()
+            return llamada.resultado
+        except BaseException as e:
+            llamada.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._en_curso[clave]
+                if self.ttl > 0 and llamada.error is None:
+                    self._cache[clave] = (time.monotonic() + self.ttl, llamada.resultado)
+                    self._cache.move_to_end(clave)
+                    while len(self._cache) > self.max_claves:
+                        self._cache.popitem(last=False)
+            llamada.evento.set()
+
+    def _metricas_de(self, clave):
+        metricas = self._metricas.get(clave)
+        if metricas is None:
+            metricas = {"solicitudes": 0, "ejecuciones": 0, "colapsadas": 0, "cache": 0, "directas": 0}
+            self._metricas[clave] = metricas
+            # Conservar solo las claves más recientes (p. ej. un DNI por empleado)
+            while len(self._metricas) > self.max_claves:
+                self._metricas.popitem(last=False)
+        else:
+            self._metricas.move_to_end(clave)
+        return metricas
+
+    def metricas(self, top: int = 20):
+        with self._lock:
+            por_clave = [(str(k), dict(v)) for k, v in self._metricas.items()]
+        totales = {"solicitudes": 0, "ejecuciones": 0, "colapsadas": 0, "cache": 0, "directas": 0}
+        for _, m in por_clave:
+            for campo in totales:
+                totales[campo] += m[campo]
+        por_clave.sort(key=lambda item: item[1]["colapsadas"] + item[1]["cache"], reverse=True)
+        return {
+            "ttl": self.ttl,
+            "totales": totales,
+            "claves": [{"clave": k, **m} for k, m in por_clave[:top]]
+        }
+
+
+registro: Dict[str, SingleFlight] = {}
+
+
+def metricas_globales(top: int = 20):
+    return {nombre: sf.metricas(top) for nombre, sf in registro.items()}
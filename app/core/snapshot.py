@@ -0,0 +1,285 @@
+"""
+Formato columnar para snapshots de papeletas (.sdpscol).
+
+    MAGIA | bloque columna 1 | bloque columna 2 | ... | pie JSON | largo del pie (uint64) | MAGIA
+
+Cada bloque empieza alineado a 64 bytes. Tipos de columna:
+
+- "numerica": arreglo little-endian sin comprimir (fechas como días desde
+  1970-01-01, horas como segundos del día con -1 = nulo, marcas de tiempo en
+  microsegundos), legible directamente desde el mmap sin copiar.
+- "diccionario": códigos enteros sin comprimir; los valores distintos van en el pie.
+- "fija": bytes de ancho fijo (DNI), también sin copiar.
+- "texto": offsets sin comprimir y los valores UTF-8 concatenados comprimidos con zlib.
+
+El pie describe filas, columnas (tipo, dtype, posición y largo de cada parte).
+"""
+
+import json
+import mmap
+import os
+import struct
+import zlib
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+MAGIA = b"SDPSCOL1"
+ALINEACION = 64
+VERSION_FORMATO = 1
+
+NULO = -1
+EPOCA = datetime(1970, 1, 1)
+ORDINAL_EPOCA = EPOCA.toordinal()
+UN_MICROSEGUNDO = timedelta(microseconds=1)
+
+
+# Convertir con np.array(..., dtype="datetime64") es varias veces más lento
+def dias(valores) -> np.ndarray:
+    """Fechas -> días desde 1970-01-01"""
+    return np.fromiter(map(date.toordinal, valores), dtype=np.int32, count=len(valores)) - ORDINAL_EPOCA
+
+
+def microsegundos(valores) -> np.ndarray:
+    """Marcas de tiempo sin zona -> microsegundos desde 1970-01-01"""
+    return np.fromiter(((v - EPOCA) // UN_MICROSEGUNDO for v in valores), dtype=np.int64, count=len(valores))
+
+
+def segundos(valores) -> np.ndarray:
+    """Horas -> segundos del día; None -> NULO"""
+    return np.fromiter(
+        (NULO if v is None else v.hour * 3600 + v.minute * 60 + v.second for v in valores),
+        dtype=np.int32, count=len(valores)
+    )
+
+
+class _ColumnaNumerica:
+    tipo = "numerica"
+
+    def __init__(self, dtype: str):
+        self.dtype = np.dtype(dtype)
+        self.partes: List[np.ndarray] = []
+
+    def agregar(self, valores):
+        if isinstance(valores, np.ndarray):
+            self.partes.append(valores.astype(self.dtype, copy=False))
+        else:
+            self.partes.append(np.fromiter(valores, dtype=self.dtype, count=len(valores)))
+
+    def escribir(self, escritor):
+        datos = np.concatenate(self.partes) if self.partes else np.empty(0, self.dtype)
+        return {"dtype": self.dtype.str, "datos": escritor.bloque(datos.tobytes())}
+
+
+class _ColumnaFija(_ColumnaNumerica):
+    tipo = "fija"
+
+    def agregar(self, valores):
+        self.partes.append(np.array(list(map(str.encode, valores)), dtype=self.dtype))
+
+
+class _ColumnaDiccionario:
+    tipo = "diccionario"
+
+    def __init__(self):
+        self.indices: Dict[str, int] = {}
+        self.partes: List[np.ndarray] = []
+
+    def agregar(self, valores):
+        indices = self.indices
+        for valor in set(valores).difference(indices):
+            indices[valor] = len(indices)
+        self.partes.append(np.fromiter(map(indices.__getitem__, valores), dtype=np.uint32, count=len(valores)))
+
+    def escribir(self, escritor):
+        # El tipo más chico que alcance para la cantidad de valores distintos
+        dtype = np.dtype("<u1" if len(self.indices) <= 0xFF else "<u2" if len(self.indices) <= 0xFFFF else "<u4")
+        codigos = np.concatenate(self.partes).astype(dtype) if self.partes else np.empty(0, dtype)
+        return {
+            "dtype": dtype.str,
+            "datos": escritor.bloque(codigos.tobytes()),
+            "diccionario": list(self.indices)
+        }
+
+
+class _ColumnaTexto:
+    tipo = "texto"
+
+    def __init__(self, nivel: int):
+        self.compresor = zlib.compressobj(nivel)
+        self.comprimido: List[bytes] = []
+        self.largos: List[np.ndarray] = []
+
+    def agregar(self, valores):
+        codificados = list(map(str.encode, valores))
+        self.largos.append(np.fromiter(map(len, codificados), dtype=np.int64, count=len(codificados)))
+        self.comprimido.append(self.compresor.compress(b"".join(codificados)))
+
+    def escribir(self, escritor):
+        self.comprimido.append(self.compresor.flush())
+        largos = np.concatenate(self.largos) if self.largos else np.empty(0, np.int64)
+        offsets = np.zeros(len(largos) + 1, dtype=np.int64)
+        np.cumsum(largos, out=offsets[1:])
+        dtype = np.dtype("<u4" if offsets[-1] <= 0xFFFFFFFF else "<u8")
+        return {
+            "dtype": dtype.str,
+            "offsets": escritor.bloque(offsets.astype(dtype).tobytes()),
+            "datos": escritor.bloque(b"".join(self.comprimido)),
+            "bytes_sin_comprimir": int(offsets[-1])
+        }
+
+
+def crear_columna(tipo: str, dtype: Optional[str] = None, nivel: int = 6):
+    if tipo == "numerica":
+        return _ColumnaNumerica(dtype)
+    if tipo == "fija":
+        return _ColumnaFija(dtype)
+    if tipo == "diccionario":
+        return _ColumnaDiccionario()
+    return _ColumnaTexto(nivel)
+
+
+class EscritorSnapshot:
+    """
+    Escribe un snapshot por bloques de filas:
+
+        escritor = EscritorSnapshot(ruta, {"id": ("numerica", "<i8"), "area": ("diccionario", None), ...})
+        escritor.agregar({"id": [...], "area": [...]})  # listas de la misma longitud
+        escritor.cerrar(metadatos)
+
+    Las columnas se acumulan en memoria ya codificadas (los textos comprimidos)
+    y se escriben al cerrar
+    """
+
+    def __init__(self, ruta: str, esquema: Dict[str, tuple], nivel_compresion: int = 6):
+        self.ruta = ruta
+        self.columnas = {
+            nombre: crear_columna(tipo, dtype, nivel_compresion)
+            for nombre, (tipo, dtype) in esquema.items()
+        }
+        self.filas = 0
+        self._archivo = None
+
+    def agregar(self, bloque: Dict[str, list]):
+        n = len(next(iter(bloque.values())))
+        for nombre, columna in self.columnas.items():
+            columna.agregar(bloque[nombre])
+        self.filas += n
+
+    def bloque(self, datos: bytes) -> List[int]:
+        """Escribe `datos` alineado y devuelve [posición, largo]"""
+        relleno = -self._archivo.tell() % ALINEACION
+        self._archivo.write(b"\0" * relleno)
+        posicion = self._archivo.tell()
+        self._archivo.write(datos)
+        return [posicion, len(datos)]
+
+    def cerrar(self, metadatos: Optional[dict] = None) -> dict:
+        temporal = self.ruta + ".tmp"
+        try:
+            with open(temporal, "wb") as self._archivo:
+                self._archivo.write(MAGIA)
+                columnas = {}
+                for nombre, columna in self.columnas.items():
+                    columnas[nombre] = {"tipo": columna.tipo, **columna.escribir(self)}
+                pie = json.dumps({
+                    "version": VERSION_FORMATO,
+                    "filas": self.filas,
+                    "columnas": columnas,
+                    "metadatos": metadatos or {}
+                }, ensure_ascii=False).encode("utf-8")
+                self._archivo.write(pie)
+                self._archivo.write(struct.pack("<Q", len(pie)))
+                self._archivo.write(MAGIA)
+            os.replace(temporal, self.ruta)
+        except BaseException:
+            # Disco lleno, metadatos no serializables...: no dejar el temporal a medias
+            try:
+                os.remove(temporal)
+            except FileNotFoundError:
+                pass
+            raise
+        finally:
+            self._archivo = None
+        return {"filas": self.filas, "bytes": os.path.getsize(self.ruta)}
+
+
+class LectorSnapshot:
+    """
+    Lee un snapshot sobre un mmap del archivo. Las columnas numéricas, de
+    diccionario y fijas se devuelven como vistas numpy del mmap, sin copiar;
+    mientras existan esas vistas el lector no se puede cerrar.
+    """
+
+    def __init__(self, ruta: str):
+        self._archivo = open(ruta, "rb")
+        self._mmap = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        tamano = len(self._mmap)
+        if tamano < 2 * len(MAGIA) + 8 or self._mmap[:len(MAGIA)] != MAGIA or self._mmap[-len(MAGIA):] != MAGIA:
+            self.cerrar()
+            raise ValueError("No es un snapshot de papeletas")
+        (largo_pie,) = struct.unpack_from("<Q", self._mmap, tamano - len(MAGIA) - 8)
+        inicio_pie = tamano - len(MAGIA) - 8 - largo_pie
+        self.pie = json.loads(self._mmap[inicio_pie:inicio_pie + largo_pie])
+        self.filas: int = self.pie["filas"]
+        self.metadatos: dict = self.pie.get("metadatos", {})
+
+    def __len__(self):
+        return self.filas
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self):
+        self._mmap.close()
+        self._archivo.close()
+
+    @property
+    def nombres(self) -> List[str]:
+        return list(self.pie["columnas"])
+
+    def _vista(self, parte, dtype, count=-1) -> np.ndarray:
+        posicion, largo = parte
+        dtype = np.dtype(dtype)
+        return np.frombuffer(self._mmap, dtype=dtype, count=largo // dtype.itemsize if count < 0 else count, offset=posicion)
+
+    def columna(self, nombre: str) -> np.ndarray:
+        """
+        Arreglo crudo de la columna: enteros de columnas numéricas, códigos de
+        las de diccionario, bytes de las fijas. Para textos, sus offsets
+        """
+        info = self.pie["columnas"][nombre]
+        if info["tipo"] == "texto":
+            return self._vista(info["offsets"], info["dtype"])
+        return self._vista(info["datos"], info["dtype"])
+
+    def diccionario(self, nombre: str) -> List[str]:
+        return self.pie["columnas"][nombre]["diccionario"]
+
+    def valores(self, nombre: str) -> np.ndarray:
+        """Valores decodificados (arreglo de objetos para textos y diccionarios)"""
+        info = self.pie["columnas"][nombre]
+        if info["tipo"] == "diccionario":
+            return np.array(info["diccionario"], dtype=object)[self.columna(nombre)]
+        if info["tipo"] == "fija":
+            return np.char.decode(self.columna(nombre), "utf-8")
+        if info["tipo"] == "texto":
+            posicion, largo = info["datos"]
+            datos = zlib.decompress(self._mmap[posicion:posicion + largo])
+            offsets = self.columna(nombre).tolist()
+            return np.array(
+                [datos[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(self.filas)],
+                dtype=object
+            )
+        return self.columna(nombre)
+
+    def filas_dict(self, columnas: Optional[List[str]] = None) -> Iterator[dict]:
+        """Filas como dicts con los valores decodificados (fechas y horas como enteros)"""
+        columnas = columnas or self.nombres
+        decodificadas = {c: self.valores(c).tolist() for c in columnas}
+        for i in range(self.filas):
+            yield {c: decodificadas[c][i] for c in columnas}
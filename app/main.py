@@ -1,14 +1,24 @@
+from app.core.logs import configurar_logging, CorrelacionMiddleware
+# Antes de importar la base de datos, para capturar sus mensajes de arranque
+configurar_logging()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import auth_routes, admin_routes, rrhh_routes
-from app.database import create_tables, create_default_admin
+from app.routes import auth_routes, admin_routes, rrhh_routes, health_routes
+from app.database import create_tables, create_default_admin, engine
+from app.core.config import WORKER_THREADS
+from app.core.rate_limit import RateLimitMiddleware
+from app.core.consistencia import MarcaEscrituraMiddleware
+from app.core.eventos import iniciar_puente, detener_puente
+from app.core.procesos import pool_procesos
 import os
+import anyio
 # Validation error handler
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from starlette.requests import Request
 # Importar los modelos para que SQLAlchemy los reconozca
-from app.models import papeleta_model, usuario_model
+from app.models import papeleta_model, usuario_model, idempotencia_model, secuencia_model
 
 app = FastAPI(
     title="Sistema Digital de Papeletas - Municipalidad de San Miguel",
@@ -18,24 +28,52 @@ app = FastAPI(
     redoc_url="/redoc" if os.getenv("ENVIRONMENT", "development") != "production" else None
 )
 
+# Rechazar con 429 antes de tocar la base de datos (CORS queda por fuera para que
+# el navegador pueda leer la respuesta 429)
+app.add_middleware(RateLimitMiddleware)
+
+# Marca firmada de última escritura para leer del primario después (read-your-writes)
+app.add_middleware(MarcaEscrituraMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Permite peticiones desde cualquier origen
     allow_credentials=False,  # Debe ser False cuando allow_origins=["*"]
     allow_methods=["*"],  # Permitir todos los métodos (GET, POST, PUT, DELETE, etc.)
     allow_headers=["*"],  # Permitir todos los headers
+    expose_headers=["ETag", "X-Total-Count", "X-Request-ID", "X-Ultima-Escritura"],  # Legibles desde el navegador
 )
 
+# El más externo: también las respuestas 429 y los errores llevan X-Request-ID y quedan en el log
+app.add_middleware(CorrelacionMiddleware)
+
 # Crear las tablas al iniciar la aplicación
 @app.on_event("startup")
-def startup_event():
-    create_tables()
-    create_default_admin()
+async def startup_event():
+    # Limitar el threadpool de endpoints síncronos al tamaño del pool de conexiones
+    anyio.to_thread.current_default_thread_limiter().total_tokens = WORKER_THREADS
+
+    # Con gunicorn --preload el proceso maestro ya inicializó la base de datos
+    if os.getenv("SDPS_DB_INICIALIZADA") != "1":
+        await anyio.to_thread.run_sync(create_tables)
+        await anyio.to_thread.run_sync(create_default_admin)
+
+    # Propagar eventos SSE entre workers (EVENTOS_PG_NOTIFY)
+    iniciar_puente(engine)
+
+    # Un pool de procesos por worker para reportes e impresión por lotes
+    pool_procesos.iniciar()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    detener_puente()
+    pool_procesos.detener()
 
 # Incluir las rutas
 app.include_router(auth_routes.router)
 app.include_router(admin_routes.router)
 app.include_router(rrhh_routes.router)
+app.include_router(health_routes.router)
 
 
 @app.exception_handler(RequestValidationError)
@@ -52,7 +90,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 
     return JSONResponse(status_code=422, content={"errors": errors}, media_type="application/json")
 
-# Health check endpoint para Railway
+# Health check endpoint para Railway (equivalente a /health/live)
 @app.get("/health")
 def health_check():
     """Endpoint de health check para Railway"""
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from datetime import datetime
+from app.database import Base
+
+class ClaveIdempotencia(Base):
+    __tablename__ = "claves_idempotencia"
+
+    clave = Column(String(300), primary_key=True)  # "<usuario_id>:<Idempotency-Key>"
+    hash_solicitud = Column(String(64), nullable=False)
+    codigo_estado = Column(Integer, nullable=False)
+    cuerpo = Column(Text, nullable=False)  # Respuesta JSON original
+    fecha_creacion = Column(DateTime, default=datetime.now, nullable=False)
+    expira = Column(DateTime, nullable=False, index=True)  # Para la limpieza por TTL
@@ -1,8 +1,39 @@
-from sqlalchemy import Column, Integer, String, Date, Time, Text, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Date, Time, Text, DateTime
 from sqlalchemy.schema import Index
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.ext.compiler import compiles
 from datetime import datetime
 from app.database import Base
 
+
+class marca_cambio(FunctionElement):
+    """
+    Número de cambio para la sincronización incremental (columna `cambio`).
+
+    PostgreSQL: el id de la transacción que escribe (txid_current()). Las
+    consultas de sincronización solo entregan cambios de transacciones anteriores
+    a la más antigua aún abierta, así el cursor nunca adelanta una escritura
+    que todavía no terminó. Otros motores (SQLite) serializan las escrituras:
+    basta con el máximo ya usado + 1
+    """
+    type = BigInteger()
+    inherit_cache = True
+
+
+@compiles(marca_cambio)
+def _marca_cambio_secuencial(element, compiler, **kw):
+    return (
+        "(SELECT COALESCE(MAX(m), 0) + 1 FROM ("
+        "SELECT MAX(cambio) AS m FROM papeletas "
+        "UNION ALL SELECT MAX(cambio) FROM papeletas_eliminadas) AS marcas)"
+    )
+
+
+@compiles(marca_cambio, "postgresql")
+def _marca_cambio_pg(element, compiler, **kw):
+    return "txid_current()"
+
+
 class Papeleta(Base):
     __tablename__ = "papeletas"
 
@@ -15,13 +46,39 @@ class Papeleta(Base):
     motivo = Column(String(200), nullable=False)
     oficina_entidad = Column(String(100), nullable=False)
     fundamentacion = Column(Text, nullable=False)
-    fecha = Column(Date, nullable=False)
+    fecha = Column(Date, nullable=False, index=True)  # Reportes por rango de fechas
     hora_salida = Column(Time, nullable=False)
     hora_retorno = Column(Time, nullable=True)
     regimen = Column(String(50), nullable=False)
     fecha_creacion = Column(DateTime, default=datetime.now, nullable=False)  # Hora local
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Control de concurrencia optimista
+    # Última escritura (sincronización incremental); las filas previas toman fecha_creacion
+    fecha_actualizacion = Column(
+        DateTime, default=datetime.now, onupdate=datetime.now, nullable=False,
+        info={"relleno": "fecha_creacion"}
+    )
+    # Cursor de la sincronización incremental (ver marca_cambio); las filas previas quedan en 0
+    cambio = Column(BigInteger, default=marca_cambio(), onupdate=marca_cambio(), nullable=False, server_default="0")
 
     # Índice compuesto para búsquedas eficientes por DNI y fecha
     __table_args__ = (
         Index('idx_dni_fecha_creacion', 'dni', 'fecha_creacion'),
+        # Validación de solapes por empleado y día
+        Index('idx_dni_fecha', 'dni', 'fecha'),
+        Index('idx_papeletas_fecha_actualizacion', 'fecha_actualizacion', 'id'),
+        Index('idx_papeletas_cambio', 'cambio', 'id'),
+    )
+
+class PapeletaEliminada(Base):
+    """Registro de papeletas borradas para que los clientes sincronicen las eliminaciones"""
+    __tablename__ = "papeletas_eliminadas"
+
+    id = Column(Integer, primary_key=True)
+    papeleta_id = Column(Integer, nullable=False)
+    fecha_eliminacion = Column(DateTime, default=datetime.now, nullable=False)  # Para la retención
+    cambio = Column(BigInteger, default=marca_cambio(), nullable=False, server_default="0")
+
+    __table_args__ = (
+        Index('idx_papeletas_eliminadas_fecha', 'fecha_eliminacion', 'id'),
+        Index('idx_papeletas_eliminadas_cambio', 'cambio', 'id'),
     )
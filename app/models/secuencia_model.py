@@ -0,0 +1,8 @@
+from sqlalchemy import Column, Integer, String
+from app.database import Base
+
+class SecuenciaCodigo(Base):
+    __tablename__ = "secuencias_codigo"
+
+    prefijo = Column(String(20), primary_key=True)  # Ej. "PAP-2026-"
+    ultimo_reservado = Column(Integer, nullable=False)  # Último número entregado a algún worker
@@ -18,4 +18,5 @@ class Usuario(Base):
     nombre_completo = Column(String(100), nullable=False)
     usuario = Column(String(50), unique=True, nullable=False)
     dni = Column(String(8), unique=True, nullable=False)
-    rol = Column(Enum(RolUsuario, values_callable=lambda obj: [e.value for e in obj]), nullable=False)
+    rol = Column(Enum(RolUsuario, values_callable=lambda obj: [e.value for e in obj]), nullable=False, index=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Control de concurrencia optimista
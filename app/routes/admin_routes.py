@@ -1,20 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Response, Query
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.controllers import admin_controller
+from app.database import get_db, get_read_db
+from app.controllers import admin_controller, snapshot_controller
 from app.schemas.usuario_schema import (
     UsuarioCreate, UsuarioResponse, UsuarioUpdate, 
     UsuarioListResponse, UsuarioCreateResponse
 )
-from app.models.usuario_model import Usuario
+from app.models.usuario_model import Usuario, RolUsuario
 from app.core.security import require_admin
-from typing import List
+from app.core.concurrencia import etag, version_desde_if_match
+from app.core.singleflight import metricas_globales
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+from datetime import datetime
+from typing import List, Optional
+import os
+import tempfile
 
 router = APIRouter(prefix="/api/admin", tags=["Administrador"])
 
 @router.get("/stats")
 def obtener_estadisticas_dashboard(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: Usuario = Depends(require_admin)
 ):
     """
@@ -22,6 +29,38 @@ def obtener_estadisticas_dashboard(
     """
     return admin_controller.obtener_estadisticas_dashboard(db)
 
+@router.get("/metricas/coalescing")
+def obtener_metricas_coalescing(
+    current_user: Usuario = Depends(require_admin)
+):
+    """
+    Solicitudes colapsadas por el single-flight en este worker, por clave
+    """
+    return metricas_globales()
+
+@router.get("/snapshot")
+def descargar_snapshot(
+    db: Session = Depends(get_read_db),
+    current_user: Usuario = Depends(require_admin)
+):
+    """
+    Todas las papeletas en un archivo columnar comprimido (.sdpscol) para
+    análisis y respaldo. Se lee con app.core.snapshot.LectorSnapshot
+    """
+    fd, ruta = tempfile.mkstemp(suffix=".sdpscol")
+    os.close(fd)
+    try:
+        snapshot_controller.exportar_snapshot(ruta, db)
+    except Exception:
+        os.remove(ruta)
+        raise
+    return FileResponse(
+        ruta,
+        media_type="application/octet-stream",
+        filename=f"papeletas-{datetime.now():%Y%m%d-%H%M%S}.sdpscol",
+        background=BackgroundTask(os.remove, ruta)
+    )
+
 @router.post("/crear-usuarios", response_model=UsuarioCreateResponse)
 def crear_usuario(
     data: UsuarioCreate,
@@ -38,13 +77,11 @@ def crear_usuario(
     - rol: rrhh o administrador
     """
     try:
-        result = admin_controller.crear_usuario(data, db)
-        # Obtener el usuario recién creado para devolverlo
-        nuevo_usuario = admin_controller.obtener_usuario_por_id_simple(data.usuario, data.dni, db)
+        nuevo_usuario = admin_controller.crear_usuario(data, db)
         return UsuarioCreateResponse(
             success=True,
             message="Usuario creado exitosamente",
-            usuario=UsuarioResponse.model_validate(nuevo_usuario)
+            usuario=nuevo_usuario
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -53,42 +90,62 @@ def crear_usuario(
 
 @router.get("/usuarios", response_model=List[UsuarioListResponse])
 def obtener_usuarios(
-    db: Session = Depends(get_db),
+    response: Response,
+    pagina: Optional[int] = Query(None, ge=1),
+    tamano: Optional[int] = Query(None, ge=1, le=500),
+    rol: Optional[RolUsuario] = Query(None),
+    nombre: Optional[str] = Query(None, max_length=100, description="Busca en nombre completo y usuario"),
+    db: Session = Depends(get_read_db),
     current_user: Usuario = Depends(require_admin)
 ):
     """
-    Listar todos los usuarios - Para administradores
+    Listar usuarios - Para administradores
     
     Devuelve solo los campos necesarios para el frontend:
     - id, usuario, dni, rol
+    
+    Sin `pagina` ni `tamano` devuelve todos; con alguno de ellos pagina
+    (100 por página si no se indica `tamano`). El total de coincidencias va
+    en la cabecera X-Total-Count
     """
-    usuarios_data = admin_controller.obtener_todos_usuarios(db)
+    usuarios_data, total = admin_controller.obtener_todos_usuarios(db, pagina, tamano, rol, nombre)
+    response.headers["X-Total-Count"] = str(total)
     return usuarios_data
 
 @router.get("/usuarios/{usuario_id}", response_model=UsuarioResponse)
 def obtener_usuario_por_id(
     usuario_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: Session = Depends(get_read_db),
     current_user: Usuario = Depends(require_admin)
 ):
     """
     Obtener un usuario específico por ID (solo administradores)
-    Para pre-cargar datos en formularios de edición
+    Para pre-cargar datos en formularios de edición (ETag = versión para If-Match)
     """
     usuario = admin_controller.obtener_usuario_por_id(usuario_id, db)
+    response.headers["ETag"] = etag(usuario.version)
     return usuario
 
 @router.put("/modificar-usuarios/{usuario_id}")
 def actualizar_usuario(
     usuario_id: int,
     usuario_data: UsuarioUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(require_admin)
 ):
     """
     Actualizar un usuario por ID (solo administradores)
+
+    Con la cabecera If-Match: "<version>" devuelve 412 si otro administrador lo modificó antes
     """
-    return admin_controller.actualizar_usuario(usuario_id, usuario_data, db)
+    result = admin_controller.actualizar_usuario(
+        usuario_id, usuario_data, db, version_desde_if_match(if_match)
+    )
+    response.headers["ETag"] = etag(result["usuario"]["version"])
+    return result
 
 @router.delete("/eliminar-usuarios/{usuario_id}")
 def eliminar_usuario(
@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.core.health import verificar_disponibilidad
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+@router.get("/live")
+def liveness():
+    """
+    Liveness: el proceso responde. No consulta la base de datos
+    """
+    return {"status": "alive", "service": "Backend SDPS"}
+
+@router.get("/ready")
+async def readiness():
+    """
+    Readiness: la base de datos responde a tiempo y el pool no está saturado.
+    Devuelve 503 para que el balanceador deje de enviar tráfico a este worker.
+    Es async: no compite por el threadpool de los endpoints síncronos
+    """
+    listo, detalle = await verificar_disponibilidad()
+    return JSONResponse(status_code=200 if listo else 503, content=detalle)
@@ -1,29 +1,66 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, Response, UploadFile, File, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.controllers import papeleta_controller
-from app.schemas.papeleta_schema import PapeletaCreate, PapeletaResponse, PapeletaUpdate, EmpleadoResponse
+from app.database import get_db, get_read_db
+from app.controllers import papeleta_controller, importacion_controller, reporte_controller, documento_controller, masivo_controller
+from app.schemas.papeleta_schema import (
+    PapeletaCreate, PapeletaResponse, PapeletaUpdate, EmpleadoResponse, CambiosPapeletasResponse,
+    ActualizacionMasivaRequest, EliminacionMasivaRequest, ResultadoMasivoResponse
+)
 from app.models.usuario_model import Usuario
-from app.core.security import require_rrhh, require_admin_or_rrhh, require_rrhh_or_vista
-from typing import List
+from app.core.security import require_rrhh, require_admin_or_rrhh, require_rrhh_or_vista, get_current_user_stream
+from app.core.concurrencia import etag, version_desde_if_match
+from app.core.idempotencia import ejecutar_idempotente
+from app.core.eventos import stream_eventos
+from datetime import date
+from typing import List, Optional
 
 router = APIRouter(prefix="/api/rrhh", tags=["RRHH"])
 
 @router.post("/crear-papeletas")
 def crear_papeleta(
     papeleta_data: PapeletaCreate,
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(require_rrhh)
 ):
     """
     Crear una nueva papeleta (solo RRHH)
+
+    Con la cabecera Idempotency-Key los reintentos del cliente reciben la
+    respuesta original sin volver a crear la papeleta
+    """
+    return ejecutar_idempotente(
+        idempotency_key, str(current_user.id), papeleta_data.model_dump(), db,
+        lambda: papeleta_controller.crear_papeleta(papeleta_data, db)
+    )
+
+@router.post("/importar-papeletas")
+def importar_papeletas(
+    archivo: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(require_rrhh)
+):
+    """
+    Importación masiva de papeletas desde CSV (o .xlsx si openpyxl está instalado)
+
+    La primera fila debe contener los nombres de campo de PapeletaCreate.
+    Devuelve un resumen con filas insertadas, inválidas y códigos en conflicto
     """
-    return papeleta_controller.crear_papeleta(papeleta_data, db)
+    nombre = (archivo.filename or "").lower()
+    if nombre.endswith(".xlsx"):
+        try:
+            filas = importacion_controller.leer_filas_excel(archivo.file)
+        except ImportError:
+            raise HTTPException(status_code=415, detail="Importación de Excel no disponible, use CSV")
+    else:
+        filas = importacion_controller.leer_filas_csv(archivo.file)
+    return importacion_controller.importar_papeletas(filas, db)
 
 @router.get("/empleado/{dni}", response_model=EmpleadoResponse)
 def obtener_datos_empleado_por_dni(
     dni: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: Usuario = Depends(require_rrhh_or_vista)
 ):
     """
@@ -33,7 +70,7 @@ def obtener_datos_empleado_por_dni(
 
 @router.get("/papeletas", response_model=List[PapeletaResponse])
 def obtener_papeletas(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: Usuario = Depends(require_rrhh_or_vista)
 ):
     """
@@ -41,28 +78,112 @@ def obtener_papeletas(
     """
     return papeleta_controller.obtener_todas_papeletas(db)
 
+@router.get("/papeletas/changes", response_model=CambiosPapeletasResponse)
+def obtener_cambios_papeletas(
+    since: Optional[str] = None,
+    limite: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(require_rrhh_or_vista)
+):
+    """
+    Sincronización incremental (RRHH o vista)
+
+    Sin `since` devuelve todas las papeletas; luego el cliente envía el `token`
+    recibido para obtener solo lo creado, modificado o eliminado desde entonces.
+    Mientras `hay_mas` sea true debe repetir la consulta con el nuevo token.
+    Con un token más antiguo que la retención de eliminaciones responde 410 y
+    el cliente debe empezar de nuevo sin `since`.
+    Se lee del primario para que el cursor nunca salte filas aún no replicadas
+    """
+    return papeleta_controller.obtener_cambios_papeletas(since, limite, db)
+
+@router.get("/papeletas/documentos")
+def imprimir_papeletas_del_dia(
+    fecha: date = Query(..., description="Día a imprimir AAAA-MM-DD"),
+    formato: str = Query("pdf", description="pdf (zip con un PDF por papeleta) o html"),
+    db: Session = Depends(get_read_db),
+    current_user: Usuario = Depends(require_rrhh_or_vista)
+):
+    """
+    Papeletas de un día listas para imprimir. Las ya impresas se leen de la caché
+    """
+    contenido, media_type, nombre = documento_controller.documentos_del_dia(fecha, formato, db)
+    return Response(
+        content=contenido,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'}
+    )
+
+@router.get("/reportes/horas-fuera")
+def reporte_horas_fuera(
+    desde: str = Query(..., description="Mes inicial AAAA-MM"),
+    hasta: str = Query(..., description="Mes final AAAA-MM"),
+    agrupar: str = Query("area", description="dni, area o regimen"),
+    db: Session = Depends(get_read_db),
+    current_user: Usuario = Depends(require_rrhh_or_vista)
+):
+    """
+    Total de horas fuera de oficina por mes y por empleado (dni), área o régimen
+    """
+    try:
+        mes_desde, mes_hasta = reporte_controller.parsear_mes(desde), reporte_controller.parsear_mes(hasta)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return reporte_controller.reporte_horas_fuera(agrupar, mes_desde, mes_hasta, db)
+
 @router.get("/papeletas/{papeleta_id}", response_model=PapeletaResponse)
 def obtener_papeleta(
     papeleta_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: Session = Depends(get_read_db),
     current_user: Usuario = Depends(require_rrhh_or_vista)
 ):
     """
     Obtener una papeleta por ID (RRHH o vista)
+
+    La cabecera ETag contiene la versión para usarla en If-Match al actualizar
     """
-    return papeleta_controller.obtener_papeleta_por_id(papeleta_id, db)
+    papeleta = papeleta_controller.obtener_papeleta_por_id(papeleta_id, db)
+    response.headers["ETag"] = etag(papeleta.version)
+    return papeleta
+
+@router.get("/papeletas/{papeleta_id}/documento")
+def obtener_documento_papeleta(
+    papeleta_id: int,
+    formato: str = Query("pdf", description="pdf o html"),
+    db: Session = Depends(get_read_db),
+    current_user: Usuario = Depends(require_rrhh_or_vista)
+):
+    """
+    Papeleta imprimible para firmar (PDF o HTML)
+    """
+    contenido, media_type, nombre = documento_controller.obtener_documento(papeleta_id, formato, db)
+    return Response(
+        content=contenido,
+        media_type=media_type,
+        headers={"Content-Disposition": f'inline; filename="{nombre}"'}
+    )
 
 @router.put("/actualizar/papeletas/{papeleta_id}")
 def actualizar_papeleta(
     papeleta_id: int,
     papeleta_data: PapeletaUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(require_rrhh)
 ):
     """
     Actualizar una papeleta existente (solo RRHH)
+
+    Con la cabecera If-Match: "<version>" devuelve 412 si otro usuario la modificó antes
     """
-    return papeleta_controller.actualizar_papeleta(papeleta_id, papeleta_data, db)
+    result = papeleta_controller.actualizar_papeleta(
+        papeleta_id, papeleta_data, db, version_desde_if_match(if_match)
+    )
+    if isinstance(result, dict):
+        response.headers["ETag"] = etag(result["papeleta"].version)
+    return result
 
 @router.delete("/papeletas/{papeleta_id}")
 def eliminar_papeleta(
@@ -74,3 +195,50 @@ def eliminar_papeleta(
     Eliminar una papeleta (solo RRHH)
     """
     return papeleta_controller.eliminar_papeleta(papeleta_id, db)
+
+@router.post("/papeletas/actualizacion-masiva", response_model=ResultadoMasivoResponse)
+def actualizar_papeletas_masivo(
+    data: ActualizacionMasivaRequest,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(require_admin_or_rrhh)
+):
+    """
+    Corregir en masa las papeletas que coinciden con el filtro (administrador o RRHH)
+
+    Solo nombre, area, cargo, motivo, oficina_entidad, fundamentacion y regimen.
+    Con dry_run devuelve cuántas coincidirían sin modificarlas
+    """
+    return masivo_controller.actualizar_papeletas_masivo(data.filtro, data.cambios, data.dry_run, db)
+
+@router.post("/papeletas/eliminacion-masiva", response_model=ResultadoMasivoResponse)
+def eliminar_papeletas_masivo(
+    data: EliminacionMasivaRequest,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(require_admin_or_rrhh)
+):
+    """
+    Eliminar en masa las papeletas que coinciden con el filtro (administrador o RRHH)
+
+    Con dry_run devuelve cuántas coincidirían sin eliminarlas
+    """
+    return masivo_controller.eliminar_papeletas_masivo(data.filtro, data.dry_run, db)
+
+@router.get("/eventos")
+def eventos_papeletas(
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    current_user: Usuario = Depends(get_current_user_stream)
+):
+    """
+    Flujo Server-Sent Events para dashboards (RRHH, vista y administrador)
+
+    Eventos: papeleta.creada, papeleta.actualizada, papeleta.eliminada,
+    papeletas.importadas, papeletas.actualizadas / papeletas.eliminadas (rango
+    de ids y cantidad de cada lote de una operación masiva), stats (deltas de total_papeletas / total_usuarios) y
+    resync (el cliente perdió eventos, o uno no cupo en NOTIFY, y debe recargar)
+    """
+    return StreamingResponse(
+        stream_eventos(request, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,13 +1,29 @@
 ﻿from pydantic import BaseModel, Field, validator, field_validator
 from datetime import date, time, datetime
-from typing import Optional
+from typing import Optional, List
 import re
 import os
+from app.core.config import CODIGO_PREFIJO
+
+# Formato de los códigos que asigna el servidor (app.core.codigos): un cliente
+# no puede usarlo, o chocaría con un número que el asignador entregará después
+PATRON_CODIGO_SERVIDOR = re.compile(rf"^{re.escape(CODIGO_PREFIJO)}-\d{{4}}-\d+$")
+
+def validar_codigo_cliente(v):
+    if v is not None and PATRON_CODIGO_SERVIDOR.match(v):
+        raise ValueError(f'Los códigos con formato {CODIGO_PREFIJO}-AAAA-NNNNNN los asigna el servidor; omita el código')
+    return v
+
+def validar_no_nulo(v):
+    """Para campos opcionales de columnas NOT NULL: omitirlos vale, enviar null no"""
+    if v is None:
+        raise ValueError('No puede ser nulo')
+    return v
 
 class PapeletaCreate(BaseModel):
     nombre: str = Field(..., min_length=2, max_length=100, description="Nombre completo del empleado")
     dni: str = Field(..., min_length=8, max_length=8, description="DNI de 8 dígitos")
-    codigo: str = Field(..., min_length=1, max_length=20, description="Código del empleado")
+    codigo: Optional[str] = Field(None, min_length=1, max_length=20, description="Código de la papeleta (si se omite lo genera el servidor)")
     area: str = Field(..., min_length=2, max_length=100, description="Área de trabajo")
     cargo: str = Field(..., min_length=2, max_length=100, description="Cargo del empleado")
     motivo: str = Field(..., min_length=5, max_length=200, description="Motivo de la papeleta")
@@ -23,6 +39,8 @@ class PapeletaCreate(BaseModel):
         if not re.match(r'^\d{8}$', v):
             raise ValueError('DNI debe contener exactamente 8 dígitos')
         return v
+
+    _validar_codigo = field_validator('codigo')(validar_codigo_cliente)
     
 
 class PapeletaResponse(BaseModel):
@@ -40,6 +58,8 @@ class PapeletaResponse(BaseModel):
     hora_retorno: Optional[time] = Field(None, description="Hora de retorno (opcional)")
     regimen: str = Field(..., min_length=2, max_length=50, description="Régimen laboral")
     fecha_creacion: datetime
+    fecha_actualizacion: datetime
+    version: int
 
     class Config:
         from_attributes = True
@@ -63,6 +83,12 @@ class PapeletaUpdate(BaseModel):
         if v is not None and not re.match(r'^\d{8}$', v):
             raise ValueError('DNI debe contener exactamente 8 dígitos')
         return v
+
+    # Solo hora_retorno admite null (papeleta sin retorno)
+    _no_nulo = field_validator(
+        'nombre', 'dni', 'codigo', 'area', 'cargo', 'motivo', 'oficina_entidad',
+        'fundamentacion', 'fecha', 'hora_salida', 'regimen'
+    )(validar_no_nulo)
     
 
 class EmpleadoData(BaseModel):
@@ -77,4 +103,56 @@ class EmpleadoResponse(BaseModel):
     message: Optional[str] = None
     data: Optional[EmpleadoData] = None
 
+class CambiosPapeletasResponse(BaseModel):
+    cambios: List[PapeletaResponse]
+    eliminadas: List[int]
+    token: str
+    hay_mas: bool
+
+class FiltroPapeletas(BaseModel):
+    """Criterios de selección para operaciones masivas; se combinan con AND"""
+    ids: Optional[List[int]] = Field(None, max_length=10000, description="IDs concretos")
+    dni: Optional[str] = Field(None, min_length=8, max_length=8)
+    area: Optional[str] = None
+    cargo: Optional[str] = None
+    regimen: Optional[str] = None
+    oficina_entidad: Optional[str] = None
+    motivo: Optional[str] = None
+    fecha_desde: Optional[date] = Field(None, description="Fecha de la papeleta desde (inclusive)")
+    fecha_hasta: Optional[date] = Field(None, description="Fecha de la papeleta hasta (inclusive)")
+
+class CambiosMasivos(BaseModel):
+    """
+    Campos que se pueden corregir en masa. Código, DNI, fecha y horas no:
+    son únicos por papeleta o exigen validar solapes fila por fila
+    """
+    nombre: Optional[str] = Field(None, min_length=2, max_length=100, description="Nombre completo del empleado")
+    area: Optional[str] = Field(None, min_length=2, max_length=100, description="Área de trabajo")
+    cargo: Optional[str] = Field(None, min_length=2, max_length=100, description="Cargo del empleado")
+    motivo: Optional[str] = Field(None, min_length=5, max_length=200, description="Motivo de la papeleta")
+    oficina_entidad: Optional[str] = Field(None, min_length=2, max_length=100, description="Oficina o entidad")
+    fundamentacion: Optional[str] = Field(None, min_length=10, description="Fundamentación detallada")
+    regimen: Optional[str] = Field(None, min_length=2, max_length=50, description="Régimen laboral")
+
+    class Config:
+        extra = "forbid"
+
+    # Todas estas columnas son NOT NULL: un null explícito fallaría a mitad de los lotes
+    _no_nulo = field_validator('*')(validar_no_nulo)
+
+class ActualizacionMasivaRequest(BaseModel):
+    filtro: FiltroPapeletas
+    cambios: CambiosMasivos
+    dry_run: bool = Field(False, description="Solo contar las papeletas que coinciden")
+
+class EliminacionMasivaRequest(BaseModel):
+    filtro: FiltroPapeletas
+    dry_run: bool = Field(False, description="Solo contar las papeletas que coinciden")
 
+class ResultadoMasivoResponse(BaseModel):
+    operacion: str
+    dry_run: bool
+    coincidencias: Optional[int] = None  # solo en dry_run
+    afectadas: int
+    lotes: int
+    segundos: float
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import Optional
 from app.models.usuario_model import RolUsuario
+from app.schemas.papeleta_schema import validar_no_nulo
 
 class UsuarioBase(BaseModel):
     nombre_completo: str
@@ -17,8 +18,11 @@ class UsuarioUpdate(BaseModel):
     dni: Optional[str] = None
     rol: Optional[RolUsuario] = None
 
+    _no_nulo = field_validator('*')(validar_no_nulo)
+
 class UsuarioResponse(UsuarioBase):
     id: int
+    version: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,134 @@
+"""
+Benchmark del costo de los logs en el camino de las peticiones.
+
+Usage:
+  python benchmark_logging.py --threads 8 --records 20000
+  python benchmark_logging.py --output /tmp/bench.log --requests 50000
+
+1. Registra --records líneas desde cada uno de --threads hilos con tres
+   configuraciones: sin handler (nivel desactivado), StreamHandler síncrono con
+   el formateador JSON, y el handler con cola de app.core.logs (hilo escritor de
+   fondo). Muestra el tiempo total y la latencia p50/p99 que ve el hilo que
+   registra, que es lo que paga cada petición.
+2. Mide el sobrecosto por petición de CorrelacionMiddleware sobre una app ASGI
+   vacía, con todas las peticiones registradas (sin muestreo).
+
+Por defecto escribe en os.devnull; use --output con un archivo para incluir E/S real.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import threading
+import time
+
+from app.core.logs import FormateadorJSON, CorrelacionMiddleware, configurar_logging, detener_logging, registros_descartados
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, int(round(p / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+def run_threads(threads, records):
+    logger = logging.getLogger('benchmark')
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker(n):
+        local = []
+        barrier.wait()
+        for i in range(records):
+            start = time.perf_counter()
+            logger.info('papeleta procesada', extra={'hilo': n, 'i': i, 'ruta': '/api/rrhh/papeletas'})
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return time.perf_counter() - start, latencies
+
+
+def report(name, elapsed, latencies):
+    total = len(latencies)
+    print(f'{name:<10} total={elapsed:7.3f}s  {total / elapsed:10.0f} logs/s  '
+          f'p50={percentile(latencies, 50) * 1e6:7.1f}us  p99={percentile(latencies, 99) * 1e6:7.1f}us  '
+          f'mean={statistics.fmean(latencies) * 1e6:7.1f}us')
+
+
+def bench_handlers(args, stream):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    root.setLevel(logging.WARNING)
+    report('sin logs', *run_threads(args.threads, args.records))
+
+    direct = logging.StreamHandler(stream)
+    direct.setFormatter(FormateadorJSON())
+    root.addHandler(direct)
+    root.setLevel(logging.INFO)
+    report('sincrono', *run_threads(args.threads, args.records))
+    root.removeHandler(direct)
+
+    configurar_logging(stream)
+    elapsed, latencies = run_threads(args.threads, args.records)
+    detener_logging()  # incluye esperar a que el hilo escritor vacíe la cola
+    report('cola', elapsed, latencies)
+    if registros_descartados():
+        print(f'           descartados por cola llena: {registros_descartados()}')
+
+
+async def bench_middleware(args):
+    async def app(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'ok'})
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        pass
+
+    scope = {'type': 'http', 'method': 'GET', 'path': '/api/rrhh/papeletas', 'headers': []}
+    results = {}
+    for name, target in (('sin mw', app), ('con mw', CorrelacionMiddleware(app, muestreo=''))):
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            await target(scope, receive, send)
+        results[name] = (time.perf_counter() - start) / args.requests
+        print(f'{name:<10} {results[name] * 1e6:7.1f}us/peticion')
+    print(f'sobrecosto {(results["con mw"] - results["sin mw"]) * 1e6:7.1f}us/peticion')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de logs estructurados')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--records', type=int, default=20000, help='Registros por hilo')
+    parser.add_argument('--requests', type=int, default=20000, help='Peticiones para el middleware')
+    parser.add_argument('--output', default=os.devnull)
+    args = parser.parse_args()
+
+    with open(args.output, 'w') as stream:
+        print(f'== handlers: {args.threads} hilos x {args.records} registros -> {args.output}')
+        bench_handlers(args, stream)
+
+        print(f'\n== middleware: {args.requests} peticiones')
+        configurar_logging(stream)
+        asyncio.run(bench_middleware(args))
+        detener_logging()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark de throughput según el número de workers de gunicorn.
+
+Usage:
+  pip install aiohttp
+  python benchmark_workers.py --workers 1 2 4 8 --duration 15 --concurrency 200
+  python benchmark_workers.py --path /api/rrhh/papeletas --auth "rrhh:12345678"
+
+Para cada número de workers levanta `gunicorn app.main:app -c gunicorn.conf.py`
+con WEB_CONCURRENCY=N en un puerto local, espera a que /health responda, lanza
+carga durante --duration segundos y muestra req/s y latencias p50/p99.
+
+Be careful: use a staging or test DB (DATABASE_URL) when benchmarking DB-backed paths.
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+
+async def wait_ready(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(base_url + '/health') as resp:
+                    if resp.status == 200:
+                        return True
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    return False
+
+
+async def load(base_url, path, auth, concurrency, duration):
+    headers = {'Authorization': f'Bearer {auth}'} if auth else {}
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    connector = aiohttp.TCPConnector(limit=0)
+
+    async with aiohttp.ClientSession(connector=connector, headers=headers) as session:
+        async def client():
+            nonlocal errors
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    async with session.get(base_url + path) as resp:
+                        await resp.read()
+                        if resp.status >= 400:
+                            errors += 1
+                except aiohttp.ClientError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    latencies.sort()
+    n = len(latencies)
+    return {
+        'requests': n,
+        'rps': n / duration,
+        'p50_ms': latencies[n // 2] * 1000 if n else 0,
+        'p99_ms': latencies[int(n * 0.99)] * 1000 if n else 0,
+        'errors': errors,
+    }
+
+
+def run_for_workers(workers, args):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(args.port))
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app.main:app', '-c', 'gunicorn.conf.py'],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f'http://127.0.0.1:{args.port}'
+    try:
+        if not asyncio.run(wait_ready(base_url)):
+            raise RuntimeError(f'gunicorn with {workers} workers did not become ready')
+        return asyncio.run(load(base_url, args.path, args.auth, args.concurrency, args.duration))
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='Worker counts to compare')
+    parser.add_argument('--path', default='/health', help='Path to request (GET)')
+    parser.add_argument('--auth', default=None, help='Auth token content after Bearer (format usuario:dni)')
+    parser.add_argument('--concurrency', type=int, default=100, help='Concurrent clients')
+    parser.add_argument('--duration', type=int, default=10, help='Seconds of load per worker count')
+    parser.add_argument('--port', type=int, default=8765, help='Local port for gunicorn')
+    args = parser.parse_args()
+
+    results = []
+    for workers in args.workers:
+        print(f'Running {args.duration}s with {workers} worker(s)...')
+        results.append((workers, run_for_workers(workers, args)))
+
+    base_rps = results[0][1]['rps'] or 1
+    print('\n--- Results ---')
+    print(f"{'workers':>8} {'req/s':>10} {'scaling':>8} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for workers, r in results:
+        print(f"{workers:>8} {r['rps']:>10.1f} {r['rps'] / base_rps:>7.2f}x {r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
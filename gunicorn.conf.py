@@ -0,0 +1,88 @@
+"""
+Configuración de Gunicorn para producción.
+
+Uso:
+  gunicorn app.main:app -c gunicorn.conf.py
+
+Variables de entorno:
+  PORT                  Puerto de escucha (Railway/Heroku lo definen)
+  WEB_CONCURRENCY       Número de workers (por defecto se calcula a partir de CPU y pool de BD)
+  WORKER_THREADS        Hilos por worker para endpoints síncronos (por defecto pool_size + max_overflow)
+  DB_POOL_SIZE          Conexiones persistentes por worker
+  DB_MAX_OVERFLOW       Conexiones extra por worker en picos
+  DB_MAX_CONNECTIONS    max_connections del servidor PostgreSQL
+  GUNICORN_TIMEOUT      Segundos antes de reiniciar un worker bloqueado
+  FORWARDED_ALLOW_IPS   IPs de proxies de confianza para X-Forwarded-For
+  PROCESOS_POOL         Procesos de CPU por worker (cada uno abre una conexión para reportes)
+  EVENTOS_PG_NOTIFY     Propagar eventos SSE entre workers con LISTEN/NOTIFY (por defecto true)
+"""
+
+import multiprocessing
+import os
+
+from app.core.config import DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_MAX_CONNECTIONS, EVENTOS_PG_NOTIFY, PROCESOS_POOL
+
+# Dejar conexiones libres para migraciones, psql y otros clientes
+CONEXIONES_RESERVADAS = 5
+
+
+def _workers_por_defecto() -> int:
+    """2 x CPU + 1, limitado para que todos los pools quepan en max_connections"""
+    por_cpu = multiprocessing.cpu_count() * 2 + 1
+    conexiones_por_worker = DB_POOL_SIZE + DB_MAX_OVERFLOW
+    if EVENTOS_PG_NOTIFY:
+        conexiones_por_worker += 1  # LISTEN del puente de eventos
+    if PROCESOS_POOL > 1:
+        conexiones_por_worker += PROCESOS_POOL  # una por proceso del pool de CPU (reportes)
+    por_bd = max(1, (DB_MAX_CONNECTIONS - CONEXIONES_RESERVADAS) // conexiones_por_worker)
+    return max(1, min(por_cpu, por_bd))
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", str(_workers_por_defecto())))
+
+# Cargar la app una sola vez en el maestro y compartir memoria con los workers (copy-on-write)
+preload_app = True
+
+# Reinicios controlados
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Reciclar workers periódicamente para contener fugas de memoria; el jitter evita que reinicien todos a la vez
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+# Railway y Heroku terminan TLS en un proxy
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "*")
+
+accesslog = None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    """Crear tablas y admin por defecto una sola vez, antes de levantar los workers"""
+    from app.database import create_tables, create_default_admin, engine
+
+    create_tables()
+    create_default_admin()
+    if server.cfg.workers > 1 and not (EVENTOS_PG_NOTIFY and engine.dialect.name == "postgresql"):
+        server.log.warning(
+            "Eventos SSE sin propagación entre los %d workers (requiere PostgreSQL y "
+            "EVENTOS_PG_NOTIFY=true): cada cliente solo verá los cambios hechos en su worker",
+            server.cfg.workers
+        )
+    # No heredar conexiones abiertas del maestro en los workers
+    engine.dispose()
+    os.environ["SDPS_DB_INICIALIZADA"] = "1"
+
+
+def post_fork(server, worker):
+    """Cada worker abre su propio pool; las conexiones del maestro no se comparten"""
+    from app.database import engine, replica_engine
+
+    engine.dispose(close=False)
+    if replica_engine is not None:
+        replica_engine.dispose(close=False)
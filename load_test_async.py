@@ -7,6 +7,7 @@ Usage:
 
 The script sends POST requests to /api/rrhh/crear-papeletas with random unique `codigo` values
 so DB unique-constraint conflicts are unlikely unless you intentionally reuse codes.
+With --server-codes the `codigo` field is omitted and the server allocates it.
 
 Be careful: run this against staging or a test DB. Monitor DB and app resource usage.
 """
@@ -36,7 +37,7 @@ def gen_fecha():
     return d.isoformat()
 
 # Payload template
-def make_payload():
+def make_payload(server_codes=False):
     nombre = random.choice(['Juan Pérez','María López','Carlos Sánchez','Ana Torres','Luis Gómez'])
     dni = gen_dni()
     codigo = gen_codigo()
@@ -50,7 +51,7 @@ def make_payload():
     hora_retorno = f"{random.randint(11,18):02d}:{random.choice([0,15,30,45]):02d}:00"
     regimen = random.choice(['CAS','PLANTA'])
 
-    return {
+    payload = {
         'nombre': nombre,
         'dni': dni,
         'codigo': codigo,
@@ -64,10 +65,13 @@ def make_payload():
         'hora_retorno': hora_retorno,
         'regimen': regimen
     }
+    if server_codes:
+        del payload['codigo']
+    return payload
 
-async def worker(session, url, auth_header, semaphore, stats):
+async def worker(session, url, auth_header, semaphore, stats, server_codes):
     async with semaphore:
-        payload = make_payload()
+        payload = make_payload(server_codes)
         try:
             async with session.post(url + '/api/rrhh/crear-papeletas', json=payload, headers={'Authorization': f'Bearer {auth_header}', 'Content-Type': 'application/json'}) as resp:
                 text = await resp.text()
@@ -93,13 +97,13 @@ async def worker(session, url, auth_header, semaphore, stats):
                 stats['last_msgs'].append(('exception', str(e)))
                 stats['last_errors'] += 1
 
-async def run(url, concurrency, total, auth):
+async def run(url, concurrency, total, auth, server_codes):
     timeout = aiohttp.ClientTimeout(total=60)
     connector = aiohttp.TCPConnector(limit=0)
     semaphore = asyncio.Semaphore(concurrency)
     stats = {'total':0,'success':0,'conflict':0,'validation':0,'errors':0,'last_errors':0,'last_msgs':[]}
     async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
-        tasks = [worker(session, url, auth, semaphore, stats) for _ in range(total)]
+        tasks = [worker(session, url, auth, semaphore, stats, server_codes) for _ in range(total)]
         # Use tqdm to show progress
         for f in tqdm_asyncio.as_completed(tasks, total=total):
             await f
@@ -121,11 +125,12 @@ def main():
     parser.add_argument('--concurrency', type=int, default=50, help='Number of concurrent requests')
     parser.add_argument('--total', type=int, default=1000, help='Total number of requests to send')
     parser.add_argument('--auth', default='rrhh:12345678', help='Auth token content after Bearer (format usuario:dni)')
+    parser.add_argument('--server-codes', action='store_true', help='Omit codigo and let the server allocate it')
     args = parser.parse_args()
 
     print(f"Target: {args.url}/api/rrhh/crear-papeletas | concurrency={args.concurrency} | total={args.total}")
 
-    asyncio.run(run(args.url, args.concurrency, args.total, args.auth))
+    asyncio.run(run(args.url, args.concurrency, args.total, args.auth, args.server_codes))
 
 if __name__ == '__main__':
     main()
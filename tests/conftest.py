@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Las pruebas usan SQLite local; deben fijarse antes de importar app.database
+os.environ.setdefault("DATABASE_URL", "sqlite:////tmp/sdps-pruebas.db")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
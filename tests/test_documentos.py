@@ -0,0 +1,34 @@
+import re
+
+from app.core.documentos import renderizar_pdf
+
+DATOS = {
+    "codigo": "PAP-2025-000001", "nombre": "Ana Pérez", "dni": "12345678", "area": "TI",
+    "cargo": "Analista", "regimen": "CAS", "motivo": "Comisión de servicio",
+    "oficina_entidad": "SUNAT", "fecha": "05/05/2025", "hora_salida": "09:00", "hora_retorno": None
+}
+
+
+def _paginas(pdf: bytes):
+    return re.findall(rb"stream\n(.*?)\nendstream", pdf, re.S)
+
+
+def test_fundamentacion_corta_en_una_pagina():
+    pdf = renderizar_pdf({**DATOS, "fundamentacion": "Reunión de coordinación"})
+    assert b"/Count 1 " in pdf
+    assert len(_paginas(pdf)) == 1
+
+
+def test_fundamentacion_larga_continua_sin_cortarse():
+    palabras = [f"p{i:04d}" for i in range(3000)]
+    pdf = renderizar_pdf({**DATOS, "fundamentacion": " ".join(palabras)})
+    paginas = _paginas(pdf)
+    assert len(paginas) > 1
+    assert re.search(rb"/Count (\d+)", pdf).group(1) == str(len(paginas)).encode()
+    impresas = b" ".join(re.findall(rb"\((p\d{4}[^)]*)\) Tj", b"\n".join(paginas))).split()
+    assert impresas == [p.encode() for p in palabras]
+    assert b"(continuaci" in paginas[1]
+    assert b"Jefe inmediato" in paginas[-1] and b"Jefe inmediato" not in paginas[0]
+    # Cada offset de la tabla xref apunta a su objeto
+    for posicion in re.findall(rb"(\d{10}) 00000 n", pdf):
+        assert re.match(rb"\d+ 0 obj", pdf[int(posicion):])
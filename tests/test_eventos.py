@@ -0,0 +1,59 @@
+import json
+
+from app.core.eventos import BrokerEventos, PuenteNotify
+
+
+def test_ids_locales_no_se_repiten_tras_reiniciar():
+    anterior = BrokerEventos()
+    anterior.publicar("a", {})
+    reiniciado = BrokerEventos()
+    reiniciado.publicar("b", {})
+    assert reiniciado.desde("0")[0]["id"] > anterior.desde("0")[0]["id"]
+
+
+def test_reanuda_por_posicion_en_el_historial():
+    broker = BrokerEventos()
+    # Con el puente los ids vienen de la secuencia y pueden llegar desordenados
+    for id_evento in (10, 12, 11, 13):
+        broker.publicar("x", {}, propagar=False, id_evento=id_evento)
+    assert [e["id"] for e in broker.desde("12")] == [11, 13]
+    assert [e["id"] for e in broker.desde("9")] == [10, 12, 11, 13]
+
+
+def test_historial_agotado_pide_resync():
+    broker = BrokerEventos(historial=3)
+    for id_evento in range(10, 20):
+        broker.publicar("x", {}, propagar=False, id_evento=id_evento)
+    assert [e["tipo"] for e in broker.desde("5")] == ["resync"]
+    assert [e["id"] for e in broker.desde("17")] == [18, 19]
+
+
+class PuenteLocal(PuenteNotify):
+    """Simula el canal: asigna ids como la secuencia y entrega de inmediato"""
+
+    def __init__(self, broker):
+        super().__init__(None, broker)
+        self.siguiente = 100
+        self.enviados = []
+
+    def _despertar(self):
+        while not self._salientes.empty():
+            tipo, datos_json = self._salientes.get_nowait()
+            self.enviados.append(tipo)
+            self.siguiente += 1
+            self._recibir(json.dumps({"id": self.siguiente, "tipo": tipo, "datos": json.loads(datos_json)}))
+
+
+def test_con_puente_el_id_lo_asigna_el_canal():
+    broker = BrokerEventos()
+    broker.puente = PuenteLocal(broker)
+    broker.publicar("papeleta.creada", {"id": 1})
+    assert broker.desde("0") == [{"id": 101, "tipo": "papeleta.creada", "datos": {"id": 1}}]
+
+
+def test_payload_grande_se_envia_como_resync():
+    broker = BrokerEventos()
+    broker.puente = PuenteLocal(broker)
+    broker.publicar("papeletas.actualizadas", {"ids": list(range(5000))})
+    assert broker.puente.enviados == ["resync"]
+    assert broker.desde("0")[0]["datos"] == {"motivo": "papeletas.actualizadas"}
@@ -0,0 +1,94 @@
+import threading
+import time
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import idempotencia
+from app.core.idempotencia import AlmacenIdempotencia, ejecutar_idempotente
+from app.database import SessionLocal, create_tables
+
+
+@pytest.fixture(autouse=True)
+def almacen(monkeypatch):
+    create_tables()
+    # LRU vacío por prueba: así cada solicitud pasa por la tabla como en otro worker
+    nuevo = AlmacenIdempotencia(capacidad=0)
+    monkeypatch.setattr(idempotencia, "almacen", nuevo)
+    return nuevo
+
+
+def _concurrentes(n, operacion, espera=5.0, clave=None):
+    clave = clave or uuid.uuid4().hex
+    barrera = threading.Barrier(n)
+    resultados = [None] * n
+
+    def solicitud(i):
+        db = SessionLocal()
+        try:
+            barrera.wait()
+            resultados[i] = ejecutar_idempotente(clave, "1", {"x": 1}, db, operacion, espera=espera)
+        finally:
+            db.close()
+
+    hilos = [threading.Thread(target=solicitud, args=(i,)) for i in range(n)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return resultados
+
+
+def test_concurrentes_ejecutan_una_vez():
+    ejecuciones = []
+
+    def operacion():
+        ejecuciones.append(1)
+        time.sleep(0.5)
+        return {"id": 42}
+
+    resultados = _concurrentes(5, operacion)
+    assert len(ejecuciones) == 1
+    originales = [r for r in resultados if isinstance(r, dict)]
+    repetidas = [r for r in resultados if not isinstance(r, dict)]
+    assert originales == [{"id": 42}]
+    assert len(repetidas) == 4
+    for respuesta in repetidas:
+        assert respuesta.status_code == 200
+        assert respuesta.headers["Idempotent-Replayed"] == "true"
+        assert respuesta.body == b'{"id":42}'
+
+
+def test_en_curso_devuelve_409_al_agotar_la_espera():
+    ejecuciones = []
+
+    def operacion():
+        ejecuciones.append(1)
+        time.sleep(1)
+        return {"id": 1}
+
+    resultados = _concurrentes(2, operacion, espera=0.2)
+    assert len(ejecuciones) == 1
+    rechazada = next(r for r in resultados if not isinstance(r, dict))
+    assert rechazada.status_code == 409
+    assert rechazada.headers["Retry-After"] == "1"
+
+
+def test_error_libera_la_clave():
+    clave = uuid.uuid4().hex
+
+    def falla():
+        raise HTTPException(status_code=409, detail="solape")
+
+    db = SessionLocal()
+    try:
+        with pytest.raises(HTTPException):
+            ejecutar_idempotente(clave, "1", {"x": 1}, db, falla)
+        assert ejecutar_idempotente(clave, "1", {"x": 1}, db, lambda: {"id": 7}) == {"id": 7}
+        repetida = ejecutar_idempotente(clave, "1", {"x": 1}, db, lambda: {"id": 8})
+        assert repetida.body == b'{"id":7}'
+        otra = ejecutar_idempotente(clave, "1", {"x": 2}, db, lambda: {"id": 9})
+        assert otra.status_code == 422
+    finally:
+        db.close()
@@ -0,0 +1,36 @@
+import sqlite3
+
+from app.database import violacion_unica
+
+
+class _Diag:
+    def __init__(self, detalle):
+        self.message_detail = detalle
+
+
+class _ErrorPg(Exception):
+    def __init__(self, pgcode, detalle):
+        self.pgcode = pgcode
+        self.diag = _Diag(detalle)
+
+
+def test_sqlite_distingue_unique_de_not_null():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE papeletas (codigo TEXT UNIQUE, area TEXT NOT NULL)")
+    conn.execute("INSERT INTO papeletas VALUES ('A', 'TI')")
+    errores = []
+    for fila in (("A", "TI"), ("B", None)):
+        try:
+            conn.execute("INSERT INTO papeletas VALUES (?, ?)", fila)
+        except sqlite3.IntegrityError as e:
+            errores.append(e)
+    duplicado, nulo = errores
+    assert violacion_unica(duplicado, "papeletas", "codigo")
+    assert not violacion_unica(duplicado, "papeletas", "dni")
+    assert not violacion_unica(nulo, "papeletas", "codigo")
+
+
+def test_postgresql_por_sqlstate_y_columna():
+    assert violacion_unica(_ErrorPg("23505", "Key (codigo)=(A) already exists."), "papeletas", "codigo")
+    assert not violacion_unica(_ErrorPg("23505", "Key (dni)=(1) already exists."), "usuarios", "usuario")
+    assert not violacion_unica(_ErrorPg("23502", None), "papeletas", "codigo")
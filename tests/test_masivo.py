@@ -0,0 +1,131 @@
+import random
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import select, update
+
+from app.controllers import masivo_controller
+from app.controllers.masivo_controller import _condiciones, _lotes, _rango
+from app.database import SessionLocal, create_tables
+from app.models.papeleta_model import Papeleta, PapeletaEliminada
+from app.schemas.papeleta_schema import CambiosMasivos, FiltroPapeletas
+
+
+@pytest.fixture
+def db():
+    create_tables()
+    sesion = SessionLocal()
+    yield sesion
+    sesion.close()
+
+
+@pytest.fixture
+def publicados(monkeypatch):
+    eventos = []
+    monkeypatch.setattr(masivo_controller.eventos, "publicar", lambda tipo, datos: eventos.append((tipo, datos)))
+    return eventos
+
+
+@pytest.fixture
+def papeletas(db):
+    """Siete papeletas de un DNI propio de la prueba; devuelve (dni, ids)"""
+    dni = f"{random.randrange(10 ** 8):08d}"
+    hace_un_rato = datetime.now() - timedelta(hours=1)
+    filas = [
+        Papeleta(
+            nombre="Ana Pérez", dni=dni, codigo=f"T{dni}-{i}", area="TI", cargo="Analista",
+            motivo="Comisión", oficina_entidad="SUNAT", fundamentacion="Comisión de servicio",
+            fecha=date(2025, 5, 1) + timedelta(days=i), hora_salida=time(9), hora_retorno=time(10),
+            regimen="CAS", fecha_actualizacion=hace_un_rato
+        )
+        for i in range(7)
+    ]
+    db.add_all(filas)
+    db.commit()
+    return dni, [p.id for p in filas]
+
+
+def test_cambios_rechazan_null():
+    with pytest.raises(ValidationError):
+        CambiosMasivos(area=None)
+    assert CambiosMasivos(area="Finanzas").model_dump(exclude_unset=True) == {"area": "Finanzas"}
+
+
+def test_evento_de_lote_lleva_solo_el_rango():
+    assert _rango(list(range(1000, 2000))) == {"desde_id": 1000, "hasta_id": 1999, "cantidad": 1000}
+
+
+def test_actualizacion_por_lotes(db, papeletas, publicados):
+    dni, ids = papeletas
+    antes = datetime.now() - timedelta(minutes=1)
+
+    resumen = masivo_controller.actualizar_papeletas_masivo(
+        FiltroPapeletas(dni=dni), CambiosMasivos(area="Finanzas"), False, db, tamano_lote=3
+    )
+
+    assert (resumen["afectadas"], resumen["lotes"]) == (7, 3)
+    db.expire_all()
+    filas = db.execute(
+        select(Papeleta.area, Papeleta.version, Papeleta.fecha_actualizacion).where(Papeleta.dni == dni)
+    ).all()
+    assert {f.area for f in filas} == {"Finanzas"}
+    assert {f.version for f in filas} == {2}
+    assert all(f.fecha_actualizacion > antes for f in filas)
+    assert [datos for _, datos in publicados] == [
+        {"desde_id": ids[0], "hasta_id": ids[2], "cantidad": 3, "cambios": {"area": "Finanzas"}},
+        {"desde_id": ids[3], "hasta_id": ids[5], "cantidad": 3, "cambios": {"area": "Finanzas"}},
+        {"desde_id": ids[6], "hasta_id": ids[6], "cantidad": 1, "cambios": {"area": "Finanzas"}},
+    ]
+
+
+def test_dry_run_no_modifica(db, papeletas, publicados):
+    dni, _ = papeletas
+    resumen = masivo_controller.actualizar_papeletas_masivo(
+        FiltroPapeletas(dni=dni), CambiosMasivos(area="Finanzas"), True, db
+    )
+    assert (resumen["coincidencias"], resumen["afectadas"]) == (7, 0)
+    assert db.scalars(select(Papeleta.area).where(Papeleta.dni == dni)).all() == ["TI"] * 7
+    assert publicados == []
+
+
+def test_cada_lote_se_confirma_por_separado(db, papeletas):
+    dni, ids = papeletas
+    llamadas = []
+
+    def aplicar(condiciones_lote):
+        llamadas.append(1)
+        if len(llamadas) == 2:
+            raise RuntimeError("falla el segundo lote")
+        return db.scalars(
+            update(Papeleta).where(*condiciones_lote).values(area="Finanzas").returning(Papeleta.id)
+        ).all()
+
+    lotes = _lotes(_condiciones(FiltroPapeletas(dni=dni)), db, 3, aplicar)
+    with pytest.raises(RuntimeError):
+        for _ in lotes:
+            pass
+
+    # El primer lote quedó confirmado; el segundo se revirtió y el tercero no se ejecutó
+    areas = dict(db.execute(select(Papeleta.id, Papeleta.area).where(Papeleta.dni == dni)).all())
+    assert [areas[i] for i in ids] == ["Finanzas"] * 3 + ["TI"] * 4
+
+
+def test_eliminacion_deja_lapidas(db, papeletas, publicados):
+    dni, ids = papeletas
+
+    resumen = masivo_controller.eliminar_papeletas_masivo(FiltroPapeletas(dni=dni), False, db, tamano_lote=4)
+
+    assert (resumen["afectadas"], resumen["lotes"]) == (7, 2)
+    assert db.scalars(select(Papeleta.id).where(Papeleta.dni == dni)).all() == []
+    lapidas = db.scalars(select(PapeletaEliminada.papeleta_id).where(PapeletaEliminada.papeleta_id.in_(ids))).all()
+    assert sorted(lapidas) == ids
+    assert [tipo for tipo, _ in publicados] == ["papeletas.eliminadas", "stats"] * 2
+    assert publicados[2][1] == {"desde_id": ids[4], "hasta_id": ids[6], "cantidad": 3}
+
+
+def test_filtro_vacio_se_rechaza(db):
+    with pytest.raises(HTTPException) as error:
+        masivo_controller.eliminar_papeletas_masivo(FiltroPapeletas(), False, db)
+    assert error.value.status_code == 400
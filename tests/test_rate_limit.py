@@ -0,0 +1,248 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+
+from app.core import rate_limit
+from app.core.rate_limit import InMemoryBackend, Politica, RateLimitMiddleware, RedisBackend
+
+
+# --- InMemoryBackend ----------------------------------------------------------
+
+def test_bucket_agota_y_recarga(monkeypatch):
+    reloj = [100.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: reloj[0])
+    backend = InMemoryBackend()
+
+    assert backend.consumir("k", 2, 1.0) == 0
+    assert backend.consumir("k", 2, 1.0) == 0
+    assert backend.consumir("k", 2, 1.0) == pytest.approx(1.0)
+    reloj[0] += 1
+    assert backend.consumir("k", 2, 1.0) == 0
+
+
+def test_purga_usa_los_parametros_de_cada_bucket(monkeypatch):
+    reloj = [0.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: reloj[0])
+    backend = InMemoryBackend()
+
+    # Bucket lento: tarda 100 s en recargarse
+    backend.consumir("lento", 10, 0.1)
+    reloj[0] += 5
+    # Una política rápida no debe dar por lleno al bucket lento
+    backend.consumir("rapido", 10, 100.0)
+    assert "lento" in backend._buckets
+
+    reloj[0] += 100
+    backend.consumir("otro", 10, 100.0)
+    assert "lento" not in backend._buckets
+
+
+def test_purga_acotada_por_llamada(monkeypatch):
+    reloj = [0.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: reloj[0])
+    backend = InMemoryBackend()
+    for i in range(100):
+        backend.consumir(f"k{i}", 1, 1.0)
+    reloj[0] += 10
+    backend.consumir("nuevo", 1, 1.0)
+    assert len(backend._buckets) == 100 - InMemoryBackend.PURGA_POR_LLAMADA + 1
+
+
+def test_tope_de_claves():
+    backend = InMemoryBackend(max_claves=3)
+    for i in range(10):
+        backend.consumir(f"k{i}", 5, 0.001)
+    assert list(backend._buckets) == ["k7", "k8", "k9"]
+
+
+# --- RedisBackend -------------------------------------------------------------
+
+class ClienteRegistrador:
+    def __init__(self, respuesta):
+        self.respuesta = respuesta
+        self.llamadas = []
+
+    def eval(self, script, numkeys, *args):
+        self.llamadas.append((script, numkeys, args))
+        return self.respuesta
+
+
+def test_redis_backend_argumentos():
+    cliente = ClienteRegistrador(b"0.25")
+    backend = RedisBackend(cliente, prefijo="p:")
+    assert backend.consumir("login-ip:1.2.3.4", 10, 0.5, 2) == 0.25
+    script, numkeys, args = cliente.llamadas[0]
+    assert script == RedisBackend.SCRIPT
+    assert numkeys == 1
+    assert args == ("p:login-ip:1.2.3.4", 10, 0.5, 2)
+
+
+class RedisLua:
+    """Ejecuta el script Lua real con lupa sobre un diccionario en memoria"""
+
+    def __init__(self, lupa):
+        self.lua = lupa.LuaRuntime(unpack_returned_tuples=True)
+        self.hashes = {}
+        self.expiraciones = {}
+        self.ahora = 1000.0
+
+    def _call(self, comando, *args):
+        comando = comando.upper()
+        if comando == "TIME":
+            segundos = int(self.ahora)
+            return self.lua.table(str(segundos), str(int((self.ahora - segundos) * 1_000_000)))
+        if comando == "HMGET":
+            valores = self.hashes.get(args[0], {})
+            return self.lua.table(*[valores.get(campo, False) for campo in args[1:]])
+        if comando == "HSET":
+            campos = self.hashes.setdefault(args[0], {})
+            for i in range(1, len(args), 2):
+                campos[args[i]] = str(args[i + 1])
+            return 0
+        if comando == "EXPIRE":
+            self.expiraciones[args[0]] = args[1]
+            return 1
+        raise NotImplementedError(comando)
+
+    def eval(self, script, numkeys, *args):
+        funcion = self.lua.eval(
+            "function(call, keys, argv) local redis = {call = call}; "
+            "local KEYS, ARGV = keys, argv; " + script.replace("\nlocal", "\n local") + " end"
+        )
+        claves = self.lua.table(*args[:numkeys])
+        argv = self.lua.table(*[str(a) for a in args[numkeys:]])
+        return funcion(self._call, claves, argv)
+
+
+def test_redis_backend_script_lua():
+    lupa = pytest.importorskip("lupa")
+    cliente = RedisLua(lupa)
+    backend = RedisBackend(cliente)
+
+    assert backend.consumir("k", 2, 1.0) == 0
+    assert backend.consumir("k", 2, 1.0) == 0
+    assert backend.consumir("k", 2, 1.0) == pytest.approx(1.0)
+    cliente.ahora += 1
+    assert backend.consumir("k", 2, 1.0) == 0
+    assert cliente.expiraciones["sdps:rl:k"] == 3
+
+
+@pytest.mark.skipif(not os.getenv("REDIS_URL_PRUEBAS"), reason="REDIS_URL_PRUEBAS no configurada")
+def test_redis_backend_servidor_real():
+    redis = pytest.importorskip("redis")
+    cliente = redis.Redis.from_url(os.environ["REDIS_URL_PRUEBAS"])
+    prefijo = f"sdps:rl:prueba:{time.time_ns()}:"
+    backend = RedisBackend(cliente, prefijo=prefijo)
+    try:
+        assert backend.consumir("k", 2, 0.01) == 0
+        assert backend.consumir("k", 2, 0.01) == 0
+        assert backend.consumir("k", 2, 0.01) > 0
+        assert 0 < cliente.ttl(prefijo + "k") <= 201
+    finally:
+        cliente.delete(prefijo + "k")
+
+
+# --- Middleware ---------------------------------------------------------------
+
+POLITICAS_PRUEBA = [
+    Politica("login-usuario", {"POST"}, "/api/auth/login", 1, 60, "ip-usuario"),
+    Politica("escritura-usuario", {"POST"}, "/api/", 1, 60, "autenticado"),
+]
+
+
+def _ejecutar(middleware, cuerpo_partes, ip="1.1.1.1", ruta="/api/auth/login"):
+    recibido = []
+    enviado = []
+    mensajes = [
+        {"type": "http.request", "body": parte, "more_body": i < len(cuerpo_partes) - 1}
+        for i, parte in enumerate(cuerpo_partes)
+    ]
+    leidos = []
+
+    async def receive():
+        mensaje = mensajes.pop(0)
+        leidos.append(mensaje)
+        return mensaje
+
+    async def send(mensaje):
+        enviado.append(mensaje)
+
+    async def app(scope, receive_, send_):
+        while True:
+            mensaje = await receive_()
+            recibido.append(mensaje.get("body", b""))
+            if not mensaje.get("more_body"):
+                break
+        await send_({"type": "http.response.start", "status": 200, "headers": []})
+        await send_({"type": "http.response.body", "body": b""})
+
+    middleware.app = app
+    scope = {"type": "http", "method": "POST", "path": ruta, "headers": [], "client": (ip, 1)}
+    asyncio.run(middleware(scope, receive, send))
+    return enviado[0]["status"], b"".join(recibido), leidos
+
+
+@pytest.fixture
+def middleware(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    return RateLimitMiddleware(None, InMemoryBackend(), POLITICAS_PRUEBA)
+
+
+def test_login_por_ip_y_usuario(middleware):
+    cuerpo = json.dumps({"usuario": "ana", "dni": "1"}).encode()
+    assert _ejecutar(middleware, [cuerpo])[0] == 200
+    assert _ejecutar(middleware, [cuerpo])[0] == 429
+    # Otra dirección con el mismo usuario no queda bloqueada
+    assert _ejecutar(middleware, [cuerpo], ip="2.2.2.2")[0] == 200
+
+
+def test_cuerpo_se_reentrega_completo(middleware):
+    partes = [b'{"usuario": ', b'"ana", "dni": "1"}']
+    estado, recibido, _ = _ejecutar(middleware, partes)
+    assert estado == 200
+    assert recibido == b"".join(partes)
+
+
+def test_cuerpo_grande_no_se_bufferiza(middleware):
+    partes = [b"x" * 3000] * 10
+    estado, recibido, _ = _ejecutar(middleware, partes)
+    assert estado == 200
+    assert recibido == b"".join(partes)
+
+    # El middleware deja de leer en cuanto pasa el límite
+    mensajes = [{"type": "http.request", "body": p, "more_body": True} for p in partes]
+    leidos = []
+
+    async def receive():
+        leidos.append(mensajes.pop(0))
+        return leidos[-1]
+
+    cuerpo, _ = asyncio.run(RateLimitMiddleware._leer_cuerpo(receive, RateLimitMiddleware.MAX_CUERPO_LOGIN))
+    assert cuerpo == b""
+    assert len(leidos) == 2
+
+
+def test_politica_autenticada_no_se_aplica_sin_token_verificado(middleware):
+    for _ in range(3):
+        assert _ejecutar(middleware, [b"{}"], ruta="/api/rrhh/papeletas")[0] == 200
+
+
+def test_limitar_autenticado(middleware):
+    from types import SimpleNamespace
+    from fastapi import HTTPException
+
+    def request(ip):
+        return SimpleNamespace(
+            state=SimpleNamespace(rate_limit=middleware), method="POST",
+            url=SimpleNamespace(path="/api/rrhh/papeletas"), scope={"client": (ip, 1)}
+        )
+
+    usuario = SimpleNamespace(id=7)
+    rate_limit.limitar_autenticado(request("1.1.1.1"), usuario)
+    with pytest.raises(HTTPException) as error:
+        rate_limit.limitar_autenticado(request("1.1.1.1"), usuario)
+    assert error.value.status_code == 429
+    rate_limit.limitar_autenticado(request("2.2.2.2"), usuario)
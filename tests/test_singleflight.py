@@ -0,0 +1,30 @@
+import threading
+
+from app.core.singleflight import SingleFlight
+
+
+def test_no_compartir_ignora_la_cache():
+    sf = SingleFlight("prueba_cache", ttl=60)
+    assert sf.ejecutar("k", lambda: "viejo") == "viejo"
+    assert sf.ejecutar("k", lambda: "nuevo") == "viejo"
+    assert sf.ejecutar("k", lambda: "nuevo", compartir=False) == "nuevo"
+    assert sf.metricas()["totales"] == {"solicitudes": 3, "ejecuciones": 1, "colapsadas": 0, "cache": 1, "directas": 1}
+
+
+def test_no_compartir_no_se_une_a_la_ejecucion_en_curso():
+    sf = SingleFlight("prueba_en_curso")
+    iniciada, liberar = threading.Event(), threading.Event()
+
+    def lenta():
+        iniciada.set()
+        liberar.wait(5)
+        return "previa"
+
+    hilo = threading.Thread(target=sf.ejecutar, args=("k", lenta))
+    hilo.start()
+    iniciada.wait(5)
+    try:
+        assert sf.ejecutar("k", lambda: "propia", compartir=False) == "propia"
+    finally:
+        liberar.set()
+        hilo.join()
@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+from app.core.snapshot import EscritorSnapshot, LectorSnapshot
+
+
+def test_escribe_y_lee(tmp_path):
+    ruta = str(tmp_path / "p.sdpscol")
+    escritor = EscritorSnapshot(ruta, {"id": ("numerica", "<i8"), "area": ("diccionario", None), "nombre": ("texto", None)})
+    escritor.agregar({"id": [1, 2], "area": ["TI", "RRHH"], "nombre": ["Ana", "Luis"]})
+    assert escritor.cerrar({"tabla": "papeletas"})["filas"] == 2
+    with LectorSnapshot(ruta) as lector:
+        assert lector.valores("area").tolist() == ["TI", "RRHH"]
+        assert lector.valores("nombre").tolist() == ["Ana", "Luis"]
+        assert lector.metadatos == {"tabla": "papeletas"}
+
+
+def test_error_al_cerrar_no_deja_temporal(tmp_path):
+    ruta = str(tmp_path / "p.sdpscol")
+    escritor = EscritorSnapshot(ruta, {"id": ("numerica", "<i8")})
+    escritor.agregar({"id": [1]})
+    with pytest.raises(TypeError):
+        escritor.cerrar({"no_serializable": object()})
+    assert os.listdir(tmp_path) == []